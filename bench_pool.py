@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark tool latency with and without the pooled client
+Runs against a local stub of the Common Room API
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Minimal keep-alive stub that answers every GET with an empty list"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    wbufsize = -1  # send headers and body in one segment
+    handshake_delay = 0.0
+
+    def setup(self):
+        # Called once per TCP connection; stands in for the TLS handshake cost
+        super().setup()
+        time.sleep(self.handshake_delay)
+
+    def do_GET(self):
+        body = json.dumps([]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub(handshake_ms: float) -> ThreadingHTTPServer:
+    """Start the stub API on a free local port"""
+    StubHandler.handshake_delay = handshake_ms / 1000
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+def percentile(samples, pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+async def measure(server, calls: int, pooled: bool) -> list:
+    """Time sequential tool calls through the MCP handler"""
+    import commonroom_client
+
+    samples = []
+    shared = commonroom_client.get_async_client
+    for _ in range(calls):
+        client = None
+        if not pooled:
+            # A fresh client (and connection) per tool call, as before pooling
+            client = commonroom_client.AsyncCommonRoomClient()
+            commonroom_client.get_async_client = lambda tenant=None: client
+        start = time.perf_counter()
+        await server.handle_call_tool("commonroom_get_activity_types", {})
+        samples.append((time.perf_counter() - start) * 1000)
+        if client is not None:
+            await client.aclose()
+    commonroom_client.get_async_client = shared
+    return samples
+
+def report(label: str, samples: list):
+    print(f"{label:<10} p50={statistics.median(samples):7.2f}ms  "
+          f"p99={percentile(samples, 99):7.2f}ms  mean={statistics.mean(samples):7.2f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200, help="Tool calls per run")
+    parser.add_argument("--handshake-ms", type=float, default=20.0,
+                        help="Simulated per-connection handshake latency")
+    args = parser.parse_args()
+
+    httpd = start_stub(args.handshake_ms)
+    os.environ["COMMONROOM_KEY"] = "bench"
+    os.environ["COMMONROOM_API_URL"] = f"http://127.0.0.1:{httpd.server_address[1]}/community/v1"
+
+    import server
+
+    unpooled = asyncio.run(measure(server, args.calls, pooled=False))
+    pooled = asyncio.run(measure(server, args.calls, pooled=True))
+
+    print(f"{args.calls} calls, simulated handshake {args.handshake_ms:.0f}ms")
+    report("no pool", unpooled)
+    report("pooled", pooled)
+    httpd.shutdown()
+
+if __name__ == "__main__":
+    main()
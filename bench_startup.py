@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark server cold start
+Spawns server.py the way an MCP client does and times the initialize and tools/list responses
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+INITIALIZE = {
+    "jsonrpc": "2.0", "id": 1, "method": "initialize",
+    "params": {"protocolVersion": "2025-06-18", "capabilities": {},
+               "clientInfo": {"name": "bench_startup", "version": "1.0"}},
+}
+INITIALIZED = {"jsonrpc": "2.0", "method": "notifications/initialized"}
+LIST_TOOLS = {"jsonrpc": "2.0", "id": 2, "method": "tools/list", "params": {}}
+
+def send(process: subprocess.Popen, message: dict):
+    process.stdin.write((json.dumps(message) + "\n").encode())
+    process.stdin.flush()
+
+def receive(process: subprocess.Popen, request_id: int) -> dict:
+    """Read stdout until the response to request_id arrives"""
+    while True:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"server exited before answering request {request_id}")
+        message = json.loads(line)
+        if message.get("id") == request_id:
+            return message
+
+def spawn_once(python: str, env: dict) -> dict:
+    """Milliseconds from spawn to the initialize and tools/list responses"""
+    start = time.perf_counter()
+    process = subprocess.Popen([python, os.path.join(HERE, "server.py")], cwd=HERE, env=env,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        send(process, INITIALIZE)
+        receive(process, 1)
+        initialized = time.perf_counter()
+        send(process, INITIALIZED)
+        send(process, LIST_TOOLS)
+        tools = receive(process, 2)["result"]["tools"]
+        listed = time.perf_counter()
+    finally:
+        process.kill()
+        process.wait()
+    return {"initialize": (initialized - start) * 1000, "tools_list": (listed - start) * 1000,
+            "tools": len(tools)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10, help="Server processes to spawn")
+    parser.add_argument("--python", default=sys.executable, help="Interpreter used to run server.py")
+    parser.add_argument("--max-ms", type=float,
+                        help="Exit with status 1 if the median time to tools/list exceeds this")
+    args = parser.parse_args()
+
+    # No credentials: startup must not need them
+    env = {k: v for k, v in os.environ.items() if not k.startswith("COMMONROOM_")}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Keep any state files out of the working tree
+        env["COMMONROOM_WRITE_QUEUE"] = os.path.join(tmp, "queue.db")
+        spawn_once(args.python, env)  # warm the OS file cache and bytecode
+        runs = [spawn_once(args.python, env) for _ in range(args.runs)]
+
+    print(f"{args.runs} cold starts, {runs[0]['tools']} tools listed")
+    for key in ("initialize", "tools_list"):
+        samples = [run[key] for run in runs]
+        print(f"{key:<11} p50={statistics.median(samples):7.1f}ms  "
+              f"min={min(samples):7.1f}ms  max={max(samples):7.1f}ms")
+    median = statistics.median(run["tools_list"] for run in runs)
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"Regression: median time to tools/list {median:.1f}ms exceeds {args.max_ms:.1f}ms")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+In-process caching for Common Room API responses
+Size-bounded LRU with per-entry TTL and hit/miss counters
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+MISSING = object()
+
+class TTLCache:
+    def __init__(self, max_entries: int = 256, default_ttl: float = 300.0,
+                 per_key_stats: bool = False, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.per_key_stats = per_key_stats
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._key_stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, key: Hashable, outcome: str):
+        """Update total and (optionally) per-key counters"""
+        if outcome == 'hits':
+            self.hits += 1
+        else:
+            self.misses += 1
+        if self.per_key_stats:
+            counts = self._key_stats.setdefault(str(key), {'hits': 0, 'misses': 0})
+            counts[outcome] += 1
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Return a fresh cached value, or default on miss/expiry"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > self.clock():
+                self._entries.move_to_end(key)
+                self._count(key, 'hits')
+                return value
+            del self._entries[key]
+        self._count(key, 'misses')
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store a value, evicting the least recently used entry when full"""
+        ttl = self.default_ttl if ttl is None else ttl
+        self._entries[key] = (value, self.clock() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Drop one entry; returns True if it was cached"""
+        return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for sizing TTLs"""
+        lookups = self.hits + self.misses
+        result = {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+        }
+        if self.per_key_stats:
+            result['keys'] = {key: dict(counts) for key, counts in self._key_stats.items()}
+        return result
@@ -4,140 +4,416 @@ Common Room API Client for MCP Server
 Clean implementation based on latest OpenAPI spec
 """
 
+import asyncio
 import json
-import requests
-import os
-from typing import List, Dict, Any, Optional
-
-# Load .env file if it exists
-def load_env():
-    # Get the directory where this script is located
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    env_path = os.path.join(script_dir, '.env')
-    
-    try:
-        with open(env_path, 'r') as f:
-            for line in f:
-                if '=' in line and not line.startswith('#'):
-                    key, value = line.strip().split('=', 1)
-                    os.environ[key] = value
-    except FileNotFoundError:
-        pass
-
-load_env()
-
-class CommonRoomClient:
-    def __init__(self):
-        self.api_key = os.getenv('COMMONROOM_KEY')
+import httpx
+import logging
+import random
+import sqlite3
+import sys
+import time
+import uuid
+from urllib.parse import unquote
+from typing import TYPE_CHECKING, List, Dict, Any, Callable, Optional, Tuple
+from cache import MISSING, TTLCache
+from config import env_bool, env_float, env_int, getenv, load_env
+from contact_store import get_contact_store
+from identity_index import IdentityIndex, contact_aliases
+from logs import get_logger
+from metrics import endpoint, get_metrics
+from rate_limiter import get_rate_limiter, parse_reset
+from sent_index import get_sent_index, payload_digest
+from tag_index import TagIndex, tag_key
+from tenants import DEFAULT_API_URL, ENV_TENANT, Tenant, get_tenants
+
+if TYPE_CHECKING:
+    import requests
+
+log = get_logger("client")
+
+# Reference data that rarely changes: path -> (TTL env var, default TTL in seconds)
+REFERENCE_TTLS = {
+    '/activityTypes': ('COMMONROOM_CACHE_TTL_ACTIVITY_TYPES', 3600.0),
+    '/segments': ('COMMONROOM_CACHE_TTL_SEGMENTS', 300.0),
+    '/tags': ('COMMONROOM_CACHE_TTL_TAGS', 300.0),
+    '/members/customFields': ('COMMONROOM_CACHE_TTL_CUSTOM_FIELDS', 3600.0),
+}
+
+# User fields that identify a person, used for deterministic IDs
+USER_IDENTITY_FIELDS = ('email', 'twitterUsername', 'githubUsername', 'linkedinUrl',
+                        'discordUsername', 'slackUserId', 'username')
+
+def id_mode() -> str:
+    """'random' (default) or 'deterministic' content-addressed IDs"""
+    return getenv('COMMONROOM_ID_MODE', 'random').strip().lower()
+
+def generate_id(prefix: str) -> str:
+    """Unique, human-readable ID in the format {prefix}_{timestamp}_{uuid8}"""
+    return f"{prefix}_{int(time.time())}_{str(uuid.uuid4())[:8]}"
+
+def content_id(prefix: str, fields: Dict) -> str:
+    """ID derived from a stable hash of identifying fields"""
+    return f"{prefix}_{payload_digest(fields)[:20]}"
+
+def user_identity(user: Dict) -> Dict[str, str]:
+    """Normalized identifying fields of a user"""
+    return {field: str(user[field]).strip().lower() for field in USER_IDENTITY_FIELDS if user.get(field)}
+
+def generate_user_id(user: Dict, mode: Optional[str] = None) -> str:
+    """User ID for the configured ID mode"""
+    if (mode or id_mode()) == 'deterministic':
+        identity = user_identity(user)
+        if identity:
+            return content_id("user", identity)
+    return generate_id("user")
+
+def generate_activity_id(activity: Dict, mode: Optional[str] = None) -> str:
+    """Activity ID for the configured ID mode"""
+    if (mode or id_mode()) == 'deterministic':
+        title = activity.get("activityTitle")
+        return content_id("activity", {
+            "activityType": activity.get("activityType"),
+            "user": user_identity(activity.get("user") or {}),
+            "url": activity.get("url"),
+            "title": title.get("value") if isinstance(title, dict) else title,
+            "timestamp": activity.get("timestamp"),
+        })
+    return generate_id("activity")
+
+def with_generated_ids(activity: Dict, mode: Optional[str] = None) -> Dict:
+    """Copy of an activity with auto-generated activity and user IDs
+    
+    IDs already present are kept, so re-sending a previous payload updates
+    the same records instead of creating duplicates.
+    """
+    activity_data = activity.copy()
+    activity_data["id"] = activity_data.get("id") or generate_activity_id(activity_data, mode)
+    
+    user_data = activity_data["user"].copy()
+    user_data["id"] = user_data.get("id") or generate_user_id(user_data, mode)
+    activity_data["user"] = user_data
+    return activity_data
+
+def log_request(method: str, path: str, response: Any, started: float, attempt: int):
+    """Debug record of one HTTP attempt (templated endpoint, so no contact details)"""
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("api request", extra={"fields": {
+            "method": method, "endpoint": endpoint(path), "attempt": attempt,
+            "status": response.status_code if response is not None else None,
+            "ms": round((time.perf_counter() - started) * 1000, 2)}})
+
+def is_retryable_error(error: Exception) -> bool:
+    """Network failures, rate limiting and server errors are worth retrying"""
+    if isinstance(error, httpx.TransportError):
+        return True
+    # requests is only imported by the sync client; without it no error can come from it
+    requests = sys.modules.get('requests')
+    if requests is not None and isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    return status is not None and is_retryable_status(status)
+
+def is_retryable_status(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for transient API failures"""
+    
+    def __init__(self, max_attempts: int = 3, backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 jitter: bool = True, respect_retry_after: bool = True):
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.respect_retry_after = respect_retry_after
+    
+    @classmethod
+    def from_env(cls) -> 'RetryPolicy':
+        return cls(
+            max_attempts=env_int('COMMONROOM_RETRY_MAX_ATTEMPTS', 3),
+            backoff_base=env_float('COMMONROOM_RETRY_BACKOFF', 0.5),
+            backoff_max=env_float('COMMONROOM_RETRY_BACKOFF_MAX', 30.0),
+            jitter=env_bool('COMMONROOM_RETRY_JITTER', True),
+            respect_retry_after=env_bool('COMMONROOM_RETRY_RESPECT_RETRY_AFTER', True),
+        )
+    
+    def delay(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """Seconds to wait before the attempt after `attempt` (1-based)"""
+        backoff = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        if self.jitter:
+            backoff = random.uniform(0, backoff)
+        if self.respect_retry_after and error is not None:
+            response = getattr(error, 'response', None)
+            headers = getattr(response, 'headers', None) or {}
+            now = time.time()
+            retry_at = parse_reset(headers.get('Retry-After'), now)
+            if retry_at is not None:
+                backoff = max(backoff, retry_at - now)
+        return backoff
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+def describe_error(error: Exception) -> str:
+    """Short error description including the API response body when there is one"""
+    response = getattr(error, 'response', None)
+    if response is not None and getattr(response, 'text', None):
+        return f"{response.status_code}: {response.text[:200]}"
+    return str(error) or type(error).__name__
+
+SEGMENT_SOCIAL_TYPES = ('email', 'twitter', 'github', 'linkedin')
+
+# Record types a tag can be assigned to (ApiTagCreationProperties.entityTypes)
+TAG_ENTITY_TYPES = ('member', 'activity', 'company')
+
+def chunked(items: List, size: int) -> List[List]:
+    """Split items into lists of at most size"""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+class ContactNotFound(LookupError):
+    """No Common Room contact matches the identifier"""
+
+# Cached marker for a lookup the API answered with 404
+NOT_FOUND = object()
+
+class BaseCommonRoomClient:
+    """Configuration and URL helpers shared by the sync and async clients"""
+    
+    def __init__(self, pool_connections: Optional[int] = None, pool_maxsize: Optional[int] = None,
+                 timeout: Optional[Tuple[float, float]] = None, tenant: Optional[Tenant] = None):
+        # One community's settings; COMMONROOM_KEY & co. unless a tenant is given
+        self.tenant = tenant or Tenant.from_env()
+        self.api_key = self.tenant.api_key
         if not self.api_key:
+            if self.tenant.name != ENV_TENANT:
+                raise ValueError(f"No API key configured for tenant {self.tenant.name!r}")
             raise ValueError("COMMONROOM_KEY environment variable required")
         
-        self.base_url = "https://api.commonroom.io/community/v1"
-        self.dashboard_base_url = os.getenv('COMMONROOM_BASE_URL')
-        self.signal_id = os.getenv('COMMONROOM_SIGNAL_ID')
-        self.destination_id = os.getenv('COMMONROOM_DESTINATION_ID', '138683')
+        self.credentials = self.tenant.credentials()
+        self.base_url = self.tenant.api_url.rstrip('/')
+        self.dashboard_base_url = self.tenant.base_url
+        self.signal_id = self.tenant.signal_id
+        self.destination_id = self.tenant.destination_id
         self.headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
         }
+        
+        # pool_connections is the number of hosts kept, pool_maxsize the connections per host
+        self.pool_connections = pool_connections or env_int('COMMONROOM_POOL_CONNECTIONS', 4)
+        self.pool_maxsize = pool_maxsize or env_int('COMMONROOM_POOL_MAXSIZE', 16)
+        self.timeout = timeout or (
+            env_float('COMMONROOM_CONNECT_TIMEOUT', 5.0),
+            env_float('COMMONROOM_READ_TIMEOUT', 30.0),
+        )
+        
+        self.retry_policy = RetryPolicy.from_env()
+        
+        # Shared by every client using this API key, so quota is tracked process-wide
+        # (and one tenant's requests never spend another tenant's quota)
+        reserve = self.tenant.rate_limit_reserve
+        self.rate_limiter = get_rate_limiter(
+            self.api_key, reserve=env_int('COMMONROOM_RATE_LIMIT_RESERVE', 0) if reserve is None else reserve,
+            name=self.tenant.name)
+        
+        # Skip writes already acknowledged; only meaningful with deterministic IDs
+        self.sent_index = get_sent_index() if id_mode() == 'deterministic' and \
+            env_bool('COMMONROOM_SENT_INDEX_ENABLED', True) else None
+        
+        # Every contact the API returns, kept on disk for commonroom_search_local (opt-in: it holds PII)
+        self.contact_store = get_contact_store() if env_bool('COMMONROOM_CONTACT_STORE_ENABLED', False) else None
+        
+        self.cache_ttls = {path: env_float(var, default) for path, (var, default) in REFERENCE_TTLS.items()}
+        self.reference_cache = TTLCache(
+            max_entries=env_int('COMMONROOM_CACHE_MAX_ENTRIES', 64),
+            per_key_stats=True,
+        )
+        # Contacts by lowercased email; 404s are cached for a shorter time
+        self.user_cache = TTLCache(
+            max_entries=env_int('COMMONROOM_USER_CACHE_MAX_ENTRIES', 1000),
+            default_ttl=env_float('COMMONROOM_USER_CACHE_TTL', 600.0),
+        )
+        self.user_negative_ttl = env_float('COMMONROOM_USER_CACHE_NEGATIVE_TTL', 120.0)
+        # Any known identifier (email, GitHub, Twitter, LinkedIn, id) -> the same contact record
+        self.identity_index = IdentityIndex(max_records=self.user_cache.max_entries, ttl=self.user_cache.default_ttl)
+        # Tag name -> tag, so name-based tagging needs no GET /tags per item
+        self.tag_index = TagIndex()
+        # /members is deprecated; stop calling it once the API says it is gone
+        self.members_endpoint_available = env_bool('COMMONROOM_USE_MEMBERS_ENDPOINT', True)
     
-    def get_api_sources_url(self) -> str:
-        """Get the API sources configuration URL for this community"""
-        if not self.dashboard_base_url:
-            return "https://app.commonroom.io/community/YOUR-COMMUNITY-ID/settings/sources/api"
-        return f"{self.dashboard_base_url}/settings/sources/api"
+    def _cached_reference(self, path: str, refresh: bool) -> Any:
+        """Cached reference data for path, or MISSING when it must be fetched"""
+        if refresh:
+            self.reference_cache.invalidate(path)
+            return MISSING
+        return self.reference_cache.get(path)
     
-    def get_api_tokens_url(self) -> str:
-        """Get the API tokens configuration URL for this community"""
-        if not self.dashboard_base_url:
-            return "https://app.commonroom.io/community/YOUR-COMMUNITY-ID/settings/api-tokens"
-        return f"{self.dashboard_base_url}/settings/api-tokens"
+    def _store_reference(self, path: str, value: Any) -> Any:
+        """Cache freshly fetched reference data with its resource TTL"""
+        self.reference_cache.set(path, value, self.cache_ttls[path])
+        return value
     
-    def get_sources_url(self) -> str:
-        """Get the sources configuration URL for this community"""
-        if not self.dashboard_base_url:
-            return "https://app.commonroom.io/community/YOUR-COMMUNITY-ID/settings/sources"
-        return f"{self.dashboard_base_url}/settings/sources"
+    def _invalidate_after_write(self, method: str, path: str):
+        """Drop cached reference data that a successful write may have changed"""
+        if method == 'GET':
+            return
+        for prefix in self.cache_ttls:
+            if path == prefix or path.startswith(prefix + '/'):
+                self.reference_cache.invalidate(prefix)
+        if path.startswith('/user/'):
+            email = unquote(path[len('/user/'):])
+            self._forget_user({'email': email})
+            if method == 'DELETE' and self.contact_store is not None:
+                # An anonymized contact must not outlive the request in the local mirror
+                self.contact_store.delete(self.tenant.name, email)
     
-    def get_token_status(self) -> Dict:
-        """Get API token status"""
-        response = requests.get(f"{self.base_url}/api-token-status", headers=self.headers)
-        response.raise_for_status()
-        return response.json()
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for the reference data cache"""
+        stats = self.reference_cache.stats()
+        stats['ttls'] = dict(self.cache_ttls)
+        stats['user_cache'] = self.user_cache.stats()
+        stats['user_cache']['ttl'] = self.user_cache.default_ttl
+        stats['user_cache']['negative_ttl'] = self.user_negative_ttl
+        stats['identity_index'] = self.identity_index.stats()
+        stats['tag_index'] = self.tag_index.stats()
+        if self.sent_index is not None:
+            stats['sent_index'] = self.sent_index.stats()
+        if self.contact_store is not None:
+            stats['contact_store'] = self.contact_store.stats()
+        return stats
     
-    def get_activity_types(self) -> List[Dict]:
-        """Get all activity types"""
-        response = requests.get(f"{self.base_url}/activityTypes", headers=self.headers)
-        response.raise_for_status()
-        return response.json()
+    def _cached_user(self, email: str, refresh: bool) -> Any:
+        """Cached contact for email, or MISSING; raises for a cached 404"""
+        key = email.strip().lower()
+        if refresh:
+            self.user_cache.invalidate(key)
+            return MISSING
+        user = self.user_cache.get(key)
+        if user is NOT_FOUND:
+            raise ContactNotFound(f"No Common Room contact found for {email}")
+        return user
     
-    def get_segments(self) -> List[Dict]:
-        """Get all segments"""
-        response = requests.get(f"{self.base_url}/segments", headers=self.headers)
-        response.raise_for_status()
-        return response.json()
+    def _store_user(self, email: str, user_data: Optional[Dict]) -> Dict:
+        """Enrich and cache a fetched contact (None caches a 404 and raises)"""
+        key = email.strip().lower()
+        if user_data is None:
+            self.user_cache.set(key, NOT_FOUND, self.user_negative_ttl)
+            raise ContactNotFound(f"No Common Room contact found for {email}")
+        # dashboard_url is computed once here, not on every cache hit
+        user_data = self._enrich_user(user_data)
+        self.user_cache.set(key, user_data)
+        members = self._members(user_data)
+        for member in members:
+            # The looked-up email only names the contact when it matched exactly one member
+            self.identity_index.add(member, {'email': email} if len(members) == 1 else None)
+        self._mirror(user_data, email)
+        return user_data
     
-    def get_segment(self, segment_id: str) -> Dict:
-        """Get specific segment"""
-        response = requests.get(f"{self.base_url}/segments/{segment_id}", headers=self.headers)
-        response.raise_for_status()
-        return response.json()
+    @staticmethod
+    def _members(user_data: Any) -> List[Dict]:
+        """Contact records in a /user/{email} response (an array of members) or a single record"""
+        members = user_data if isinstance(user_data, list) else [user_data]
+        return [member for member in members if isinstance(member, dict)]
     
-    def get_tags(self) -> List[Dict]:
-        """Get all tags"""
-        response = requests.get(f"{self.base_url}/tags", headers=self.headers)
-        response.raise_for_status()
-        return response.json()
+    def _mirror(self, contacts: Any, email: Optional[str] = None):
+        """Upsert API contacts (one record or a list) into the local contact store"""
+        if self.contact_store is None or not contacts:
+            return
+        try:
+            self.contact_store.upsert(contacts if isinstance(contacts, list) else [contacts],
+                                      self.tenant.name, email)
+        except sqlite3.Error as e:
+            # The mirror is a convenience; never fail the lookup that fed it
+            log.warning("contact store upsert failed", extra={"fields": {"error": str(e)}})
     
-    def get_user_by_email(self, email: str) -> Dict:
-        """Get user by email"""
-        response = requests.get(f"{self.base_url}/user/{email}", headers=self.headers)
-        response.raise_for_status()
-        user_data = response.json()
-        
-        # Add dashboard URL if we have the base URL configured and user IDs
-        if self.dashboard_base_url and 'ids' in user_data and user_data['ids']:
-            user_id = user_data['ids'][0]  # Use first ID
-            user_data['dashboard_url'] = self.get_member_url(str(user_id))
-        
-        return user_data
+    def _tag_written(self, tag: Optional[Dict] = None, deleted_id: Optional[str] = None):
+        """Apply the server's own tag write to the index and the cached tag list, instead of refetching"""
+        if deleted_id is not None:
+            self.tag_index.remove(deleted_id)
+        else:
+            self.tag_index.add(tag)
+        if self.tag_index.loaded:
+            # Keeps the list's original expiry, so tags made elsewhere still show up on time
+            ttl = self.cache_ttls['/tags'] - self.tag_index.age()
+            if ttl > 0:
+                self.reference_cache.set('/tags', self.tag_index.snapshot(), ttl)
     
-    def add_activity(self, destination_source_id: str, activity_data: Dict) -> Dict:
-        """Add activity to destination source"""
+    def _forget_user(self, user_data: Dict):
+        """Drop the cached contact (or cached 404) after writing to it"""
+        if not isinstance(user_data, dict):
+            return
+        email = user_data.get('email')
+        if email:
+            self.user_cache.invalidate(email.strip().lower())
+        for kind, value in contact_aliases(user_data):
+            if kind != 'id':
+                self.identity_index.forget({kind: value})
+    
+    def _skip_if_sent(self, destination_source_id: str, payload: Dict) -> Optional[Dict]:
+        """Result to return instead of posting, if this exact payload was already sent"""
+        if self.sent_index is None or not payload.get('id'):
+            return None
+        if self.sent_index.contains(destination_source_id, payload['id'], payload_digest(payload)):
+            return {"status": "skipped", "reason": "identical payload already sent", "id": payload['id']}
+        return None
+    
+    def _mark_sent(self, destination_source_id: str, kind: str, payload: Dict):
+        """Record an acknowledged write in the sent index"""
+        if self.sent_index is not None and payload.get('id'):
+            self.sent_index.add(destination_source_id, payload['id'], kind, payload_digest(payload))
+    
+    @staticmethod
+    def _json(response) -> Any:
+        """Parsed response body; write endpoints answer 202 with no body"""
+        return response.json() if response.content else {}
+    
+    def _resolve_destination(self, destination_source_id: Optional[str]) -> str:
+        """Fall back to the configured destination source"""
         if not destination_source_id:
             destination_source_id = self.destination_id
             
         if not destination_source_id:
             raise ValueError("destination_source_id required (set COMMONROOM_DESTINATION_ID or pass as parameter)")
-        
-        # Add signal to activity data if configured
+        return destination_source_id
+    
+    def _prepare_activity(self, activity_data: Dict) -> Dict:
+        """Add signal to activity data if configured"""
         if self.signal_id and activity_data:
             activity_data = activity_data.copy()  # Don't modify original
             activity_data['signal'] = self.signal_id
-        
-        url = f"{self.base_url}/source/{destination_source_id}/activity"
-        response = requests.post(url, headers=self.headers, json=activity_data)
-        response.raise_for_status()
-        return response.json()
+        return activity_data
     
-    def add_user(self, destination_source_id: str, user_data: Dict) -> Dict:
-        """Add user to destination source"""
-        if not destination_source_id:
-            destination_source_id = self.destination_id
-            
-        if not destination_source_id:
-            raise ValueError("destination_source_id required (set COMMONROOM_DESTINATION_ID or pass as parameter)")
-            
-        url = f"{self.base_url}/source/{destination_source_id}/user"
-        response = requests.post(url, headers=self.headers, json=user_data)
-        response.raise_for_status()
-        return response.json()
+    def _enrich_user(self, user_data: Any) -> Any:
+        """Add dashboard URLs to a contact, or to each member of a /user/{email} list"""
+        if isinstance(user_data, list):
+            for member in user_data:
+                self._enrich_user(member)
+            return user_data
+        if not self.dashboard_base_url or not isinstance(user_data, dict):
+            return user_data
+        ids = user_data.get('ids')
+        user_id = ids[0] if isinstance(ids, list) and ids else user_data.get('id')  # Use first ID
+        if user_id is not None:
+            user_data['dashboard_url'] = self.get_member_url(str(user_id))
+        return user_data
     
-    def get_custom_fields(self) -> List[Dict]:
-        """Get custom fields"""
-        response = requests.get(f"{self.base_url}/members/customFields", headers=self.headers)
-        response.raise_for_status()
-        return response.json()
+    def get_api_sources_url(self) -> str:
+        """Get the API sources configuration URL for this community"""
+        if not self.dashboard_base_url:
+            return "https://app.commonroom.io/community/YOUR-COMMUNITY-ID/settings/sources/api"
+        return f"{self.dashboard_base_url}/settings/sources/api"
+    
+    def get_api_tokens_url(self) -> str:
+        """Get the API tokens configuration URL for this community"""
+        if not self.dashboard_base_url:
+            return "https://app.commonroom.io/community/YOUR-COMMUNITY-ID/settings/api-tokens"
+        return f"{self.dashboard_base_url}/settings/api-tokens"
+    
+    def get_sources_url(self) -> str:
+        """Get the sources configuration URL for this community"""
+        if not self.dashboard_base_url:
+            return "https://app.commonroom.io/community/YOUR-COMMUNITY-ID/settings/sources"
+        return f"{self.dashboard_base_url}/settings/sources"
     
     def get_dashboard_urls(self) -> Dict[str, str]:
         """Get dashboard URLs for all sections"""
@@ -181,3 +457,641 @@ class CommonRoomClient:
         if not self.dashboard_base_url:
             raise ValueError("COMMONROOM_BASE_URL not configured. Add it to your .env file")
         return f"{self.dashboard_base_url}/segment/{segment_id}"
+
+class CommonRoomClient(BaseCommonRoomClient):
+    """Blocking client, used by scripts such as debug_activity.py"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Imported here so the MCP server, which only uses the async client, never loads requests
+        import requests
+        from requests.adapters import HTTPAdapter
+        # Keep-alive connection pool shared by every request this client makes
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=env_bool('COMMONROOM_POOL_BLOCK', False),
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(self.headers)
+    
+    def close(self):
+        """Close pooled connections"""
+        self.session.close()
+    
+    def _request(self, method: str, path: str, retry_policy: Optional[RetryPolicy] = None,
+                 **kwargs) -> 'requests.Response':
+        """Send a request through the pooled session, retrying transient failures
+        
+        Every attempt re-sends the same payload, so writes with IDs stay idempotent.
+        """
+        import requests
+        policy = retry_policy or self.retry_policy
+        kwargs.setdefault('timeout', self.timeout)
+        metrics = get_metrics()
+        attempt = 0
+        while True:
+            attempt += 1
+            response = None
+            waited = time.perf_counter()
+            started = waited
+            try:
+                self.rate_limiter.acquire_sync()
+                started = time.perf_counter()
+                response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+                self.rate_limiter.update(response.headers, response.status_code)
+                response.raise_for_status()
+                break
+            except requests.RequestException as e:
+                if attempt >= policy.max_attempts or not is_retryable_error(e):
+                    raise
+                time.sleep(policy.delay(attempt, e))
+            finally:
+                metrics.observe_request(
+                    method, path, response.status_code if response is not None else None,
+                    time.perf_counter() - started, started - waited, 0.0,
+                    len(response.request.body or b'') if response is not None else 0,
+                    len(response.content) if response is not None else 0, retry=attempt > 1)
+                log_request(method, path, response, started, attempt)
+        self._invalidate_after_write(method, path)
+        return response
+    
+    def _get_reference(self, path: str, refresh: bool = False) -> Any:
+        """GET reference data through the TTL cache"""
+        value = self._cached_reference(path, refresh)
+        if value is MISSING:
+            value = self._store_reference(path, self._request("GET", path).json())
+        return value
+    
+    def get_token_status(self) -> Dict:
+        """Get API token status"""
+        response = self._request("GET", "/api-token-status")
+        return response.json()
+    
+    def get_activity_types(self, refresh: bool = False) -> List[Dict]:
+        """Get all activity types"""
+        return self._get_reference("/activityTypes", refresh)
+    
+    def get_segments(self, refresh: bool = False) -> List[Dict]:
+        """Get all segments"""
+        return self._get_reference("/segments", refresh)
+    
+    def get_segment(self, segment_id: str) -> Dict:
+        """Get specific segment"""
+        response = self._request("GET", f"/segments/{segment_id}")
+        return response.json()
+    
+    def get_tags(self, refresh: bool = False) -> List[Dict]:
+        """Get all tags"""
+        return self._get_reference("/tags", refresh)
+    
+    def get_user_by_email(self, email: str, refresh: bool = False) -> Dict:
+        """Get user by email (cached, including misses)"""
+        import requests
+        user = self._cached_user(email, refresh)
+        if user is not MISSING:
+            return user
+        try:
+            response = self._request("GET", f"/user/{email}")
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return self._store_user(email, None)
+            raise
+        return self._store_user(email, response.json())
+    
+    def add_activity(self, destination_source_id: str, activity_data: Dict) -> Dict:
+        """Add activity to destination source"""
+        destination_source_id = self._resolve_destination(destination_source_id)
+        activity_data = self._prepare_activity(activity_data)
+        skipped = self._skip_if_sent(destination_source_id, activity_data)
+        if skipped:
+            return skipped
+        response = self._request("POST", f"/source/{destination_source_id}/activity", json=activity_data)
+        self._mark_sent(destination_source_id, "activity", activity_data)
+        self._forget_user(activity_data.get("user"))
+        return self._json(response)
+    
+    def add_user(self, destination_source_id: str, user_data: Dict) -> Dict:
+        """Add user to destination source"""
+        destination_source_id = self._resolve_destination(destination_source_id)
+        skipped = self._skip_if_sent(destination_source_id, user_data)
+        if skipped:
+            return skipped
+        response = self._request("POST", f"/source/{destination_source_id}/user", json=user_data)
+        self._mark_sent(destination_source_id, "user", user_data)
+        self._forget_user(user_data)
+        return self._json(response)
+    
+    def get_custom_fields(self, refresh: bool = False) -> List[Dict]:
+        """Get custom fields"""
+        return self._get_reference("/members/customFields", refresh)
+    
+    def call_api(self, method: str, path: str, params: Optional[Dict] = None, body: Any = None) -> Any:
+        """Call any API operation (used by tools generated from openapi.json)"""
+        result = self._json(self._request(method, path, params=params, json=body))
+        if method == 'GET' and (path == '/members' or path.startswith('/user/')):
+            self._mirror(result, unquote(path[len('/user/'):]) if path.startswith('/user/') else None)
+        return result
+
+class AsyncCommonRoomClient(BaseCommonRoomClient):
+    """Non-blocking client used by the MCP server"""
+    
+    def __init__(self, *args, max_concurrency: Optional[int] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_concurrency = max_concurrency or self.tenant.max_concurrency or \
+            env_int('COMMONROOM_MAX_CONCURRENCY', 8)
+        try:
+            self.loop: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+        except RuntimeError:
+            self.loop = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # (path, query) -> GET in flight, joined by identical concurrent reads
+        self._in_flight: Dict[Tuple[str, Tuple], asyncio.Future] = {}
+        # Tag name -> lock held while that tag is created, so it is created once
+        self._tag_creates: Dict[str, asyncio.Lock] = {}
+        self.coalesce_reads = env_bool('COMMONROOM_COALESCE_READS', True)
+        connect_timeout, read_timeout = self.timeout
+        self.http = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.headers,
+            limits=httpx.Limits(
+                max_connections=self.pool_maxsize,
+                max_keepalive_connections=self.pool_maxsize,
+            ),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            transport=transport,
+        )
+    
+    async def aclose(self):
+        """Close pooled connections"""
+        await self.http.aclose()
+    
+    async def _request(self, method: str, path: str, retry_policy: Optional[RetryPolicy] = None,
+                       **kwargs) -> httpx.Response:
+        """Send a request; concurrent identical GETs share one in-flight request (single flight)
+        
+        Every caller gets the shared response. Nothing is kept once the request
+        finishes, and a completed write stops sharing of reads started before it,
+        so a read never returns data from before a write this client has made.
+        """
+        if method != 'GET' or not self.coalesce_reads:
+            return await self._send(method, path, retry_policy, **kwargs)
+        params = kwargs.get('params') or {}
+        key = (path, tuple(sorted((str(name), str(value)) for name, value in params.items())))
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._send(method, path, retry_policy, **kwargs))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget_in_flight(key, done))
+        else:
+            get_metrics().observe_coalesced(method, path)
+        # A cancelled caller does not cancel the request the others are waiting on
+        return await asyncio.shield(task)
+    
+    def _forget_in_flight(self, key: Tuple, task: asyncio.Future):
+        """Stop sharing a finished read (unless a write already replaced it)"""
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+    
+    async def _send(self, method: str, path: str, retry_policy: Optional[RetryPolicy] = None,
+                    **kwargs) -> httpx.Response:
+        """Send a request, holding one of max_concurrency slots while in flight
+        
+        Transient failures are retried with backoff. Every attempt re-sends the
+        same payload, so writes with IDs stay idempotent.
+        """
+        policy = retry_policy or self.retry_policy
+        metrics = get_metrics()
+        attempt = 0
+        while True:
+            attempt += 1
+            response = None
+            waited = time.perf_counter()
+            queued = started = waited
+            try:
+                await self.rate_limiter.acquire()
+                queued = time.perf_counter()
+                async with self._semaphore:
+                    started = time.perf_counter()
+                    response = await self.http.request(method, path, **kwargs)
+                self.rate_limiter.update(response.headers, response.status_code)
+                response.raise_for_status()
+                break
+            except httpx.HTTPError as e:
+                if attempt >= policy.max_attempts or not is_retryable_error(e):
+                    raise
+                await asyncio.sleep(policy.delay(attempt, e))
+            finally:
+                metrics.observe_request(
+                    method, path, response.status_code if response is not None else None,
+                    time.perf_counter() - started, queued - waited, started - queued,
+                    len(response.request.content) if response is not None else 0,
+                    len(response.content) if response is not None else 0, retry=attempt > 1)
+                log_request(method, path, response, started, attempt)
+        self._invalidate_after_write(method, path)
+        if method != 'GET':
+            # Reads started before this write must not answer reads issued after it
+            self._in_flight.clear()
+        return response
+    
+    async def _get_reference(self, path: str, refresh: bool = False) -> Any:
+        """GET reference data through the TTL cache"""
+        value = self._cached_reference(path, refresh)
+        if value is MISSING:
+            value = self._store_reference(path, (await self._request("GET", path)).json())
+        return value
+    
+    async def get_token_status(self) -> Dict:
+        """Get API token status"""
+        response = await self._request("GET", "/api-token-status")
+        return response.json()
+    
+    async def get_activity_types(self, refresh: bool = False) -> List[Dict]:
+        """Get all activity types"""
+        return await self._get_reference("/activityTypes", refresh)
+    
+    async def get_segments(self, refresh: bool = False) -> List[Dict]:
+        """Get all segments"""
+        return await self._get_reference("/segments", refresh)
+    
+    async def get_segment(self, segment_id: str) -> Dict:
+        """Get specific segment"""
+        response = await self._request("GET", f"/segments/{segment_id}")
+        return response.json()
+    
+    async def get_tags(self, refresh: bool = False) -> List[Dict]:
+        """Get all tags"""
+        tags = await self._get_reference("/tags", refresh)
+        self.tag_index.load(tags)
+        return tags
+    
+    async def find_tag(self, name: str, refresh: bool = False) -> Optional[Dict]:
+        """Tag by name (case-insensitive) from the tag index, or None"""
+        if refresh or not self.tag_index.loaded:
+            await self.get_tags(refresh)
+        tag = self.tag_index.lookup(name)
+        if tag is None and not refresh:
+            # Reloads only once the cached list has expired, picking up tags made elsewhere
+            await self.get_tags()
+            tag = self.tag_index.lookup(name)
+        return tag
+    
+    async def create_tag(self, name: str, entity_types: Optional[List[str]] = None,
+                         description: Optional[str] = None) -> Dict:
+        """Create a tag; use get_or_create_tag to reuse an existing tag with the same name"""
+        body = {"name": name, "entityTypes": entity_types or list(TAG_ENTITY_TYPES)}
+        if description is not None:
+            body["description"] = description
+        tag = self._json(await self._request("POST", "/tags", json=body))
+        self._tag_written(tag)
+        return tag
+    
+    async def update_tag(self, tag_id: str, name: Optional[str] = None,
+                         description: Optional[str] = None) -> Dict:
+        """Rename a tag or change its description"""
+        if name is None:
+            known = self.tag_index.get(tag_id) or self._json(await self._request("GET", f"/tags/{tag_id}"))
+            name = known["name"]
+        body = {"name": name}
+        if description is not None:
+            body["description"] = description
+        tag = self._json(await self._request("POST", f"/tags/{tag_id}", json=body))
+        self._tag_written(tag if isinstance(tag, dict) and tag.get("id") else {**body, "id": tag_id})
+        return tag
+    
+    async def delete_tag(self, tag_id: str) -> Dict:
+        """Delete a tag, removing it from every record it was assigned to"""
+        await self._request("DELETE", f"/tags/{tag_id}")
+        self._tag_written(deleted_id=tag_id)
+        return {"status": "deleted", "id": tag_id}
+    
+    async def get_or_create_tag(self, name: str, entity_types: Optional[List[str]] = None,
+                                description: Optional[str] = None) -> Dict:
+        """Existing tag by name, or a new one; concurrent calls for one new name create it once"""
+        tag = await self.find_tag(name)
+        if tag is not None:
+            return {"status": "existing", "tag": tag}
+        key = tag_key(name)
+        lock = self._tag_creates.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                tag = self.tag_index.lookup(name)
+                if tag is not None:
+                    return {"status": "existing", "tag": tag}
+                return {"status": "created", "tag": await self.create_tag(name, entity_types, description)}
+        finally:
+            if not lock.locked() and self._tag_creates.get(key) is lock:
+                del self._tag_creates[key]
+    
+    async def tag_users(self, destination_source_id: Optional[str], emails: List[str], tags: List[str],
+                        create_missing: bool = True, concurrency: Optional[int] = None) -> Dict:
+        """Assign tags by name to many contacts; names are resolved to ids once, from the tag index"""
+        destination_source_id = self._resolve_destination(destination_source_id)
+        names = list(dict.fromkeys(name.strip() for name in tags if name and name.strip()))
+        resolved, missing = [], []
+        for name in names:
+            if create_missing:
+                resolved.append(await self.get_or_create_tag(name, ["member"]))
+            else:
+                tag = await self.find_tag(name)
+                if tag is None:
+                    missing.append(name)
+                else:
+                    resolved.append({"status": "existing", "tag": tag})
+        if missing:
+            raise LookupError(f"Unknown tags: {', '.join(missing)} (pass create_missing: true to create them)")
+        assignments = [{"type": "id", "id": str(item["tag"]["id"])} for item in resolved]
+        limiter = asyncio.Semaphore(min(concurrency or self.max_concurrency, self.max_concurrency))
+        unique = list(dict.fromkeys(email.strip() for email in emails if email and email.strip()))
+        
+        async def tag(email: str) -> Dict:
+            user = {"email": email, "tags": assignments}
+            # Content-addressed, as in importer.prepare: tagging the same email again updates one source user
+            user["id"] = generate_user_id(user, mode='deterministic')
+            async with limiter:
+                try:
+                    result = await self.add_user(destination_source_id, user)
+                except Exception as e:
+                    return {"email": email, "status": "failed", "reason": describe_error(e)}
+            skipped = isinstance(result, dict) and result.get("status") == "skipped"
+            return {"email": email, "status": "skipped" if skipped else "tagged"}
+        
+        results = await asyncio.gather(*(tag(email) for email in unique))
+        summary = {"tags": [item["tag"] for item in resolved],
+                   "created_tags": [item["tag"]["name"] for item in resolved if item["status"] == "created"],
+                   "total": len(results), "tagged": 0, "skipped": 0, "failed": 0}
+        for item in results:
+            summary[item["status"]] += 1
+        summary["results"] = results
+        return summary
+    
+    async def get_user_by_email(self, email: str, refresh: bool = False) -> Dict:
+        """Get user by email (cached, including misses)"""
+        user = self._cached_user(email, refresh)
+        if user is not MISSING:
+            return user
+        try:
+            response = await self._request("GET", f"/user/{email}")
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return self._store_user(email, None)
+            raise
+        return self._store_user(email, response.json())
+    
+    async def resolve_contact(self, email: Optional[str] = None, github: Optional[str] = None,
+                              twitter: Optional[str] = None, linkedin: Optional[str] = None,
+                              refresh: bool = False) -> Dict:
+        """Find a contact by any mix of identifiers, answering from the identity index when possible"""
+        identifiers = {kind: value for kind, value in
+                       (('email', email), ('github', github), ('twitter', twitter), ('linkedin', linkedin))
+                       if value}
+        if not identifiers:
+            raise ValueError("Provide at least one of email, github, twitter or linkedin")
+        
+        if not refresh:
+            contact = self.identity_index.lookup(identifiers)
+            if contact is not None:
+                return {"source": "index", "contact": contact}
+        
+        if self.members_endpoint_available:
+            try:
+                response = await self._request("GET", "/members", params=identifiers)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 404:
+                    raise ContactNotFound(f"No Common Room contact found for {identifiers}")
+                if e.response.status_code not in (405, 410, 501):
+                    raise
+                self.members_endpoint_available = False
+            else:
+                matches = self._json(response)
+                contacts = [c for c in (matches if isinstance(matches, list) else [matches]) if c]
+                if not contacts:
+                    raise ContactNotFound(f"No Common Room contact found for {identifiers}")
+                self._mirror(contacts, email)
+                contact = self.identity_index.add(contacts[0], identifiers)
+                return {"source": "members", "contact": contact, "matches": len(contacts)}
+        
+        # Email is the one lookup that does not depend on /members
+        if email:
+            members = self._members(await self.get_user_by_email(email, refresh))
+            if not members:
+                raise ContactNotFound(f"No Common Room contact found for {email}")
+            contact = self.identity_index.add(members[0], identifiers)
+            return {"source": "user", "contact": contact, "matches": len(members)}
+        raise ContactNotFound(f"No cached contact for {identifiers}, and /members is unavailable "
+                              "so only email lookups are possible")
+    
+    async def search_local(self, query: Optional[str] = None, refresh_stale: bool = True,
+                           max_results: int = 50, **filters) -> Dict:
+        """Search the local contact store, re-fetching stale matches by email first"""
+        if self.contact_store is None:
+            raise ValueError("The local contact store is off; set COMMONROOM_CONTACT_STORE_ENABLED=true")
+        started = time.perf_counter()
+        total, results = self.contact_store.search(self.tenant.name, query, limit=max_results, **filters)
+        stale = [row['email'] for row in results if row['stale'] and row['email']]
+        refreshed = 0
+        if refresh_stale and stale:
+            limiter = asyncio.Semaphore(self.max_concurrency)
+            
+            async def refresh(email: str) -> bool:
+                async with limiter:
+                    try:
+                        await self.get_user_by_email(email, refresh=True)
+                        return True
+                    except Exception:
+                        # Keep serving the stale row; it is marked as such
+                        return False
+            
+            refreshed = sum(await asyncio.gather(*(refresh(email) for email in stale)))
+            total, results = self.contact_store.search(self.tenant.name, query, limit=max_results, **filters)
+        return {"total": total, "returned": len(results), "refreshed": refreshed,
+                "ms": round((time.perf_counter() - started) * 1000, 1), "results": results}
+    
+    async def get_segment_statuses(self, segment_id: str) -> List[Dict]:
+        """Get the statuses a contact can have in a segment"""
+        response = await self._request("GET", f"/segments/{segment_id}/status")
+        return response.json()
+    
+    async def add_contacts_to_segment(self, segment_id: str, values: List[str], social_type: str = "email",
+                                      status_id: Optional[int] = None, chunk_size: Optional[int] = None,
+                                      concurrency: Optional[int] = None) -> Dict:
+        """Add any number of contacts to a segment in concurrent, request-sized chunks"""
+        if social_type not in SEGMENT_SOCIAL_TYPES:
+            raise ValueError(f"social_type must be one of {', '.join(SEGMENT_SOCIAL_TYPES)}")
+        unique = list(dict.fromkeys(v.strip() for v in values if v and v.strip()))
+        chunks = chunked(unique, chunk_size or env_int('COMMONROOM_SEGMENT_CHUNK_SIZE', 100))
+        limiter = asyncio.Semaphore(min(concurrency or self.max_concurrency, self.max_concurrency))
+        
+        async def post(index: int, chunk: List[str]) -> Dict:
+            body = {"socialType": social_type, "value": ",".join(chunk)}
+            if status_id is not None:
+                body["statusId"] = status_id
+            item = {"chunk": index, "size": len(chunk), "first": chunk[0], "last": chunk[-1]}
+            async with limiter:
+                try:
+                    await self._request("POST", f"/segments/{segment_id}", json=body)
+                    item["status"] = "added"
+                except Exception as e:
+                    item["status"] = "failed"
+                    item["reason"] = describe_error(e)
+                    item["values"] = chunk
+            return item
+        
+        results = await asyncio.gather(*(post(i, c) for i, c in enumerate(chunks)))
+        failed = [item for item in results if item["status"] == "failed"]
+        return {
+            "segment_id": segment_id,
+            "contacts": len(unique),
+            "chunks": len(chunks),
+            "added": sum(item["size"] for item in results if item["status"] == "added"),
+            "failed": sum(item["size"] for item in failed),
+            # Values from failed chunks, ready to pass back in for another attempt
+            "failed_values": [value for item in failed for value in item.pop("values")],
+            "results": results,
+        }
+    
+    async def get_users(self, emails: List[str], concurrency: Optional[int] = None,
+                        refresh: bool = False) -> Dict:
+        """Look up many emails concurrently, reporting found / not_found / failed per email"""
+        limiter = asyncio.Semaphore(min(concurrency or self.max_concurrency, self.max_concurrency))
+        # One lookup per address, matching the case-insensitive cache key
+        unique = {}
+        for email in emails:
+            if email and email.strip():
+                unique.setdefault(email.strip().lower(), email.strip())
+        
+        async def lookup(email: str) -> Dict:
+            async with limiter:
+                try:
+                    return {"email": email, "status": "found",
+                            "user": await self.get_user_by_email(email, refresh)}
+                except ContactNotFound:
+                    return {"email": email, "status": "not_found"}
+                except Exception as e:
+                    return {"email": email, "status": "failed", "reason": describe_error(e)}
+        
+        results = await asyncio.gather(*(lookup(email) for email in unique.values()))
+        summary = {"total": len(results), "found": 0, "not_found": 0, "failed": 0}
+        for item in results:
+            summary[item["status"]] += 1
+        summary["results"] = results
+        return summary
+    
+    async def add_activity(self, destination_source_id: str, activity_data: Dict) -> Dict:
+        """Add activity to destination source"""
+        destination_source_id = self._resolve_destination(destination_source_id)
+        activity_data = self._prepare_activity(activity_data)
+        skipped = self._skip_if_sent(destination_source_id, activity_data)
+        if skipped:
+            return skipped
+        response = await self._request("POST", f"/source/{destination_source_id}/activity", json=activity_data)
+        self._mark_sent(destination_source_id, "activity", activity_data)
+        self._forget_user(activity_data.get("user"))
+        return self._json(response)
+    
+    async def add_user(self, destination_source_id: str, user_data: Dict) -> Dict:
+        """Add user to destination source"""
+        destination_source_id = self._resolve_destination(destination_source_id)
+        skipped = self._skip_if_sent(destination_source_id, user_data)
+        if skipped:
+            return skipped
+        response = await self._request("POST", f"/source/{destination_source_id}/user", json=user_data)
+        self._mark_sent(destination_source_id, "user", user_data)
+        self._forget_user(user_data)
+        return self._json(response)
+    
+    async def get_custom_fields(self, refresh: bool = False) -> List[Dict]:
+        """Get custom fields"""
+        return await self._get_reference("/members/customFields", refresh)
+    
+    async def call_api(self, method: str, path: str, params: Optional[Dict] = None, body: Any = None) -> Any:
+        """Call any API operation (used by tools generated from openapi.json)"""
+        result = self._json(await self._request(method, path, params=params, json=body))
+        if method == 'GET' and (path == '/members' or path.startswith('/user/')):
+            self._mirror(result, unquote(path[len('/user/'):]) if path.startswith('/user/') else None)
+        return result
+    
+    async def add_activities_bulk(self, destination_source_id: Optional[str], activities: List[Dict],
+                                  concurrency: Optional[int] = None, max_retries: int = 1,
+                                  validate: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Add many activities in parallel, reporting a status for each one
+        
+        validate(activity) may raise ValueError to fail an item without posting it.
+        """
+        destination_source_id = self._resolve_destination(destination_source_id)
+        # Never more parallel than the client-wide limit allows
+        limiter = asyncio.Semaphore(min(concurrency or self.max_concurrency, self.max_concurrency))
+        
+        async def post(index: int, activity: Dict) -> Dict:
+            try:
+                activity_data = with_generated_ids(activity)
+            except (KeyError, AttributeError, TypeError) as e:
+                return {"index": index, "status": "failed", "attempts": 0,
+                        "reason": f"invalid activity: missing or malformed {e}"}
+            if validate is not None:
+                try:
+                    validate(activity_data)
+                except ValueError as e:
+                    return {"index": index, "id": activity_data["id"], "status": "failed", "attempts": 0,
+                            "reason": f"invalid activity: {e}"}
+            
+            item = {"index": index, "id": activity_data["id"]}
+            payload = self._prepare_activity(activity_data)
+            if self._skip_if_sent(destination_source_id, payload):
+                item.update(status="skipped", attempts=0)
+                return item
+            async with limiter:
+                attempts = 0
+                while True:
+                    attempts += 1
+                    try:
+                        # Retries re-post the same payload, so IDs stay stable
+                        await self._request("POST", f"/source/{destination_source_id}/activity",
+                                            retry_policy=NO_RETRY, json=payload)
+                        self._mark_sent(destination_source_id, "activity", payload)
+                        self._forget_user(payload.get("user"))
+                        item["status"] = "created" if attempts == 1 else "retried"
+                        break
+                    except Exception as e:
+                        if attempts > max_retries or not is_retryable_error(e):
+                            item["status"] = "failed"
+                            item["reason"] = describe_error(e)
+                            break
+                        await asyncio.sleep(self.retry_policy.delay(attempts, e))
+            item["attempts"] = attempts
+            return item
+        
+        results = await asyncio.gather(*(post(i, a) for i, a in enumerate(activities)))
+        summary = {"total": len(results), "created": 0, "retried": 0, "skipped": 0, "failed": 0}
+        for item in results:
+            summary[item["status"]] += 1
+        summary["results"] = results
+        return summary
+
+# Tenant name -> that tenant's client, with its own connection pool, caches and concurrency limit
+_shared_async_clients: Dict[str, AsyncCommonRoomClient] = {}
+
+def get_async_client(tenant: Optional[str] = None) -> AsyncCommonRoomClient:
+    """Event-loop-wide async client for a tenant (the default one when omitted)
+    
+    Rebuilt only when the tenant's credentials change.
+    """
+    settings = get_tenants().get(tenant)
+    loop = asyncio.get_running_loop()
+    client = _shared_async_clients.get(settings.name)
+    if client is None or client.credentials != settings.credentials() or client.loop is not loop:
+        if client is not None and client.loop is loop:
+            loop.create_task(client.aclose())
+        client = AsyncCommonRoomClient(tenant=settings)
+        _shared_async_clients[settings.name] = client
+    return client
+
+async def close_async_client():
+    """Close every tenant's async client connections (server shutdown)"""
+    clients = list(_shared_async_clients.values())
+    _shared_async_clients.clear()
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(client.aclose() for client in clients if client.loop is loop))
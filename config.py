@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Environment configuration for the Common Room MCP server
+The .env file is read on the first settings lookup instead of at import, keeping startup fast
+"""
+
+import os
+from typing import Optional
+
+_env_loaded = False
+
+# Load .env file if it exists
+def load_env():
+    global _env_loaded
+    if _env_loaded:
+        return
+    _env_loaded = True
+    # Get the directory where this script is located
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    env_path = os.path.join(script_dir, '.env')
+
+    try:
+        with open(env_path, 'r') as f:
+            for line in f:
+                if '=' in line and not line.startswith('#'):
+                    key, value = line.strip().split('=', 1)
+                    os.environ[key] = value
+    except FileNotFoundError:
+        pass
+
+def getenv(name: str, default: Optional[str] = None) -> Optional[str]:
+    """os.getenv, after loading .env on first use"""
+    load_env()
+    return os.getenv(name, default)
+
+def env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment"""
+    value = getenv(name)
+    return int(value) if value else default
+
+def env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment"""
+    value = getenv(name)
+    return float(value) if value else default
+
+def env_bool(name: str, default: bool) -> bool:
+    """Read a boolean setting from the environment"""
+    value = getenv(name)
+    if not value:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
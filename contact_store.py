@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Persistent local mirror of Common Room contacts
+Every contact the API returns is upserted into SQLite, with indexed and full-text search
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from config import env_float, getenv
+from identity_index import CONTACT_FIELDS, normalize
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.commonroom_contacts.db')
+
+# Columns copied to the FTS index, in order
+SEARCH_COLUMNS = ('full_name', 'email', 'organization', 'title', 'segments', 'tags', 'bio')
+
+def _first(contact: Dict, *fields: str) -> Any:
+    for field in fields:
+        value = contact.get(field)
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if isinstance(value, dict):
+            value = value.get('name') or value.get('email') or value.get('value')
+        if value not in (None, ''):
+            return value
+    return None
+
+def _names(values: Any) -> List[str]:
+    """Names from a list of strings or {name: ...} objects"""
+    names = []
+    for value in values if isinstance(values, list) else []:
+        name = value.get('name') if isinstance(value, dict) else value
+        if name not in (None, ''):
+            names.append(str(name))
+    return names
+
+def contact_key(contact: Dict) -> Optional[str]:
+    """Stable row key from what the record carries: Common Room id, member URL, email or a social handle
+
+    /members rows have no id or email, only common_room_member_url and handles.
+    """
+    contact_id = _first(contact, 'id', 'ids')
+    if contact_id is not None:
+        return f"id:{contact_id}"
+    url = _first(contact, 'common_room_member_url')
+    if url:
+        return f"url:{url}"
+    for kind in ('email', 'github', 'twitter', 'linkedin'):
+        value = normalize(kind, _first(contact, *CONTACT_FIELDS[kind]))
+        if value:
+            return f"{kind}:{value}"
+    return None
+
+def summarize(contact: Dict, email: Optional[str] = None) -> Dict[str, Any]:
+    """Indexed fields of a contact, from /user/{email}, /members or ApiUser shapes
+
+    email is the address the contact was looked up by, used when the record has no identifier of its own.
+    """
+    key = contact_key(contact)
+    own_email = normalize('email', _first(contact, 'email', 'emails'))
+    email = own_email or normalize('email', email)
+    return {
+        'key': key or (f"email:{email}" if email else None),
+        'email': email,
+        'full_name': _first(contact, 'fullName', 'full_name', 'name'),
+        'organization': _first(contact, 'organization', 'companyName', 'company'),
+        'title': _first(contact, 'title', 'titleAtCompany'),
+        'last_active': _first(contact, 'last_active', 'lastActive', 'lastActivityDate'),
+        'segments': _names(contact.get('segments')),
+        'tags': _names(contact.get('member_tags') or contact.get('tags')),
+        'bio': _first(contact, 'bio'),
+    }
+
+def fts_query(text: str) -> str:
+    """User text as an FTS5 query: every word must match, as a prefix"""
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+class ContactStore:
+    def __init__(self, path: str = DEFAULT_STORE_PATH, max_age: float = 7 * 86400.0):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS contacts (
+                tenant TEXT NOT NULL,
+                key TEXT NOT NULL,
+                email TEXT,
+                full_name TEXT,
+                organization TEXT,
+                title TEXT,
+                last_active TEXT,
+                segments TEXT NOT NULL,
+                tags TEXT NOT NULL,
+                bio TEXT,
+                data TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (tenant, key)
+            )
+        """)
+        for column in ('email', 'organization COLLATE NOCASE', 'last_active'):
+            name = column.split()[0]
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS contacts_{name} ON contacts (tenant, {column})")
+        # Full-text index keyed by the contacts rowid; LIKE matching when SQLite lacks FTS5
+        try:
+            self._db.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5({', '.join(SEARCH_COLUMNS)})")
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+        self.upserts = 0
+
+    def upsert(self, contacts: Iterable[Dict], tenant: str = 'default', email: Optional[str] = None) -> int:
+        """Insert or replace contacts; email fills in for records that do not carry one
+
+        The looked-up email only identifies a record when it is the sole result, so several
+        members found by one address are never merged into one row.
+        """
+        now = time.time()
+        contacts = [contact for contact in contacts if isinstance(contact, dict)]
+        if len(contacts) != 1:
+            email = None
+        rows = []
+        for contact in contacts:
+            summary = summarize(contact, email)
+            if summary['key'] is None:
+                continue
+            rows.append((summary, json.dumps(contact, default=str)))
+        if not rows:
+            return 0
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for summary, data in rows:
+                    if summary['email'] and not summary['key'].startswith('email:'):
+                        # A record first seen by email only is now known by a stronger key
+                        self._delete(tenant, f"email:{summary['email']}")
+                    self._delete(tenant, summary['key'])
+                    cursor = self._db.execute(
+                        "INSERT INTO contacts (tenant, key, email, full_name, organization, title, last_active, "
+                        "segments, tags, bio, data, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (tenant, summary['key'], summary['email'], summary['full_name'], summary['organization'],
+                         summary['title'], summary['last_active'], json.dumps(summary['segments']),
+                         json.dumps(summary['tags']), summary['bio'], data, now))
+                    if self.fts:
+                        self._db.execute(
+                            f"INSERT INTO contacts_fts (rowid, {', '.join(SEARCH_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (cursor.lastrowid, summary['full_name'], summary['email'], summary['organization'],
+                             summary['title'], ' '.join(summary['segments']), ' '.join(summary['tags']),
+                             summary['bio']))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self.upserts += len(rows)
+        return len(rows)
+
+    def delete(self, tenant: str, email: str) -> int:
+        """Remove every stored record of an address, e.g. after the contact is anonymized"""
+        email = normalize('email', email)
+        if not email:
+            return 0
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                rows = self._db.execute("SELECT rowid FROM contacts WHERE tenant = ? AND (email = ? OR key = ?)",
+                                        (tenant, email, f"email:{email}")).fetchall()
+                for row in rows:
+                    self._db.execute("DELETE FROM contacts WHERE rowid = ?", row)
+                    if self.fts:
+                        self._db.execute("DELETE FROM contacts_fts WHERE rowid = ?", row)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def _delete(self, tenant: str, key: str):
+        row = self._db.execute("SELECT rowid FROM contacts WHERE tenant = ? AND key = ?", (tenant, key)).fetchone()
+        if row is not None:
+            self._db.execute("DELETE FROM contacts WHERE rowid = ?", row)
+            if self.fts:
+                self._db.execute("DELETE FROM contacts_fts WHERE rowid = ?", row)
+
+    def search(self, tenant: str = 'default', query: Optional[str] = None, email: Optional[str] = None,
+               organization: Optional[str] = None, segment: Optional[str] = None, tag: Optional[str] = None,
+               active_since: Optional[str] = None, limit: int = 20, offset: int = 0) -> Tuple[int, List[Dict]]:
+        """(total matches, one page of contacts), most recently active first"""
+        where, params = ["c.tenant = ?"], [tenant]
+        join = ""
+        if query and fts_query(query) and self.fts:
+            join = "JOIN contacts_fts f ON f.rowid = c.rowid"
+            where.append("contacts_fts MATCH ?")
+            params.append(fts_query(query))
+        elif query:
+            for word in re.findall(r'\w+', query):
+                where.append("(" + " OR ".join(f"c.{column} LIKE ?" for column in SEARCH_COLUMNS) + ")")
+                params.extend([f"%{word}%"] * len(SEARCH_COLUMNS))
+        if email:
+            where.append("c.email = ?")
+            params.append(normalize('email', email))
+        if organization:
+            where.append("c.organization = ? COLLATE NOCASE")
+            params.append(organization)
+        for column, name in (('segments', segment), ('tags', tag)):
+            if name:
+                where.append(f"EXISTS (SELECT 1 FROM json_each(c.{column}) WHERE value = ? COLLATE NOCASE)")
+                params.append(name)
+        if active_since:
+            where.append("c.last_active >= ?")
+            params.append(active_since)
+        sql = f"FROM contacts c {join} WHERE {' AND '.join(where)}"
+        now = time.time()
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) {sql}", params).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT c.email, c.full_name, c.organization, c.title, c.last_active, c.segments, c.tags, "
+                f"c.data, c.fetched_at {sql} ORDER BY c.last_active IS NULL, c.last_active DESC, c.rowid DESC "
+                f"LIMIT ? OFFSET ?", params + [limit, offset]).fetchall()
+        return total, [{
+            'email': r[0],
+            'full_name': r[1],
+            'organization': r[2],
+            'title': r[3],
+            'last_active': r[4],
+            'segments': json.loads(r[5]),
+            'tags': json.loads(r[6]),
+            'fetched_at': datetime.fromtimestamp(r[8], timezone.utc).isoformat(),
+            'stale': now - r[8] > self.max_age,
+            'contact': json.loads(r[7]),
+        } for r in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            contacts = self._db.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+        return {'path': self.path, 'contacts': contacts, 'full_text': self.fts,
+                'max_age_seconds': self.max_age, 'upserts_this_process': self.upserts}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+_stores: Dict[str, ContactStore] = {}
+_stores_lock = threading.Lock()
+
+def get_contact_store(path: Optional[str] = None) -> ContactStore:
+    """One store per database file, shared by every client in the process"""
+    path = path or getenv('COMMONROOM_CONTACT_STORE', DEFAULT_STORE_PATH)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = ContactStore(path, max_age=env_float('COMMONROOM_CONTACT_STORE_MAX_AGE', 7 * 86400.0))
+        return store
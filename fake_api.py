@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Common Room v1 API
+Routes and response bodies come from openapi.json; latency, error rate and rate limiting are configurable
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from tool_registry import DEFAULT_SPEC_PATH, HTTP_METHODS, operation_key
+
+API_PREFIX = "/community/v1"
+STATS_PATH = "/__fake__/stats"
+
+def sample(schema: Any, spec: Dict, list_size: int = 3, seen: Tuple[str, ...] = ()) -> Any:
+    """Example value for a schema: its example if it has one, else a value of the right type"""
+    if not isinstance(schema, dict):
+        return None
+    ref = schema.get('$ref')
+    if isinstance(ref, str) and ref.startswith('#/'):
+        if ref in seen:
+            return {}
+        target = spec
+        for part in ref[2:].split('/'):
+            target = target.get(part, {}) if isinstance(target, dict) else {}
+        return sample(target, spec, list_size, seen + (ref,))
+    if 'example' in schema:
+        return schema['example']
+    if schema.get('enum'):
+        return schema['enum'][0]
+    for key in ('oneOf', 'anyOf'):
+        if schema.get(key):
+            return sample(schema[key][0], spec, list_size, seen)
+    if schema.get('allOf'):
+        merged: Dict[str, Any] = {}
+        for part in schema['allOf']:
+            value = sample(part, spec, list_size, seen)
+            if isinstance(value, dict):
+                merged.update(value)
+        return merged
+    kind = schema.get('type')
+    if kind == 'array':
+        items = [sample(schema.get('items', {}), spec, list_size, seen) for _ in range(list_size)]
+        # Distinct ids, so list results look like real collections
+        for index, item in enumerate(items[1:], 1):
+            if isinstance(item, dict) and isinstance(item.get('id'), (int, float)):
+                item['id'] = item['id'] + index
+            elif isinstance(item, dict) and isinstance(item.get('id'), str):
+                item['id'] = f"{item['id']}_{index}"
+        return items
+    if kind == 'object' or 'properties' in schema:
+        return {name: sample(prop, spec, list_size, seen)
+                for name, prop in (schema.get('properties') or {}).items()}
+    if kind == 'integer' or kind == 'number':
+        return schema.get('minimum', 1)
+    if kind == 'boolean':
+        return True
+    if kind == 'string':
+        fmt = schema.get('format')
+        if fmt == 'email':
+            return "user@example.com"
+        if fmt == 'date-time':
+            return datetime.now(timezone.utc).isoformat()
+        return "string"
+    return None
+
+class Route:
+    def __init__(self, method: str, path: str, operation: Dict, spec: Dict, list_size: int):
+        self.method = method.upper()
+        self.key = operation_key(method, path)
+        template = self.key.split(' ', 1)[1]
+        self.pattern = re.compile('^' + re.sub(r'\\\{(\w+)\\\}', r'(?P<\1>[^/]+)', re.escape(template)) + '$')
+        responses = operation.get('responses') or {}
+        self.status = int(next((code for code in responses if code.startswith('2')), '200'))
+        content = ((responses.get(str(self.status)) or {}).get('content') or {}).get('application/json') or {}
+        if 'example' in content:
+            self.body = content['example']
+        elif 'schema' in content:
+            self.body = sample(content['schema'], spec, list_size)
+        else:
+            self.body = None  # e.g. the empty 202 of write operations
+
+class FakeCommonRoom:
+    """Routes, state and fault injection shared by all request threads
+
+    Contacts created with POST /source/{id}/user can be read back with
+    GET /user/{email}, and tags support create/read/update/delete; every
+    other operation answers with an example built from its response schema.
+    """
+
+    def __init__(self, spec_path: str = DEFAULT_SPEC_PATH, latency_ms: float = 0.0,
+                 jitter_ms: float = 0.0, error_rate: float = 0.0, error_status: int = 503,
+                 rate_limit: int = 0, window: float = 60.0, contacts: int = 100,
+                 list_size: int = 3, seed: Optional[int] = None):
+        with open(spec_path) as f:
+            self.spec = json.load(f)
+        self.routes: List[Route] = [
+            Route(method, path, operation, self.spec, list_size)
+            for path, item in (self.spec.get('paths') or {}).items() if isinstance(item, dict)
+            for method, operation in item.items() if method in HTTP_METHODS
+        ]
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rate_limit = rate_limit  # requests per window; 0 is unlimited
+        self.window = window
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window_start = time.time()
+        self._window_used = 0
+        self.requests: Counter = Counter()   # "METHOD /path" -> requests
+        self.statuses: Counter = Counter()   # "METHOD /path STATUS" -> responses
+        self.throttled = 0
+        self.injected_errors = 0
+        self.users: Dict[str, Dict] = {}
+        for index in range(contacts):
+            self.add_user({"id": f"seed-{index}", "email": f"user{index}@example.com",
+                           "fullName": f"User {index}"})
+        self.tags: Dict[str, Dict] = {}
+        self._next_id = 1
+
+    def add_user(self, user: Dict):
+        member = {"id": len(self.users) + 1, "fullName": user.get("fullName") or user.get("email"),
+                  "emails": [user["email"]] if user.get("email") else [], **user}
+        if user.get("email"):
+            self.users[user["email"].lower()] = member
+
+    def match(self, method: str, path: str) -> Tuple[Optional[Route], Dict[str, str]]:
+        for route in self.routes:
+            if route.method == method:
+                found = route.pattern.match(path)
+                if found:
+                    return route, {name: unquote(value) for name, value in found.groupdict().items()}
+        return None, {}
+
+    def take_slot(self) -> Tuple[Optional[Dict[str, str]], bool]:
+        """Rate limit headers for one request, and whether it is allowed"""
+        if self.rate_limit <= 0:
+            return None, True
+        with self._lock:
+            now = time.time()
+            if now - self._window_start >= self.window:
+                self._window_start, self._window_used = now, 0
+            allowed = self._window_used < self.rate_limit
+            if allowed:
+                self._window_used += 1
+            else:
+                self.throttled += 1
+            reset = max(1, int(round(self._window_start + self.window - now)))
+            remaining = self.rate_limit - self._window_used
+        headers = {
+            "X-RateLimit-Limit": str(self.rate_limit), "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": str(reset),
+            "RateLimit-Limit": str(self.rate_limit), "RateLimit-Remaining": str(remaining),
+            "RateLimit-Reset": str(reset),
+        }
+        if not allowed:
+            headers["Retry-After"] = str(reset)
+        return headers, allowed
+
+    def respond(self, route: Route, params: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        """Status and JSON body for a matched operation"""
+        if route.key == "GET /user/{email}":
+            member = self.users.get(params["email"].lower())
+            return (200, [member]) if member else (404, {"message": "Not Found"})
+        if route.key == "DELETE /user/{email}":
+            return (200, {"status": "success"}) if self.users.pop(params["email"].lower(), None) \
+                else (404, {"message": "Not Found"})
+        if route.key == "POST /source/{destinationSourceId}/user" and isinstance(body, dict):
+            with self._lock:
+                self.add_user(body)
+        elif route.key == "POST /source/{destinationSourceId}/activity" and isinstance(body, dict):
+            if isinstance(body.get("user"), dict):
+                with self._lock:
+                    self.add_user(body["user"])
+        elif route.key == "GET /tags":
+            return 200, {"labels": list(self.tags.values())}
+        elif route.key == "POST /tags":
+            with self._lock:
+                tag = {**(body or {}), "id": str(self._next_id)}
+                self._next_id += 1
+                self.tags[tag["id"]] = tag
+            return 200, tag
+        elif route.key in ("GET /tags/{id}", "POST /tags/{id}", "DELETE /tags/{id}"):
+            tag = self.tags.get(params["id"])
+            if tag is None:
+                return 404, {"message": "Not Found"}
+            if route.method == "POST":
+                tag.update({**(body or {}), "id": params["id"]})
+            elif route.method == "DELETE":
+                self.tags.pop(params["id"], None)
+                return 200, None
+            return 200, tag
+        return route.status, route.body
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"requests": dict(self.requests), "responses": dict(self.statuses),
+                    "total": sum(self.requests.values()), "throttled": self.throttled,
+                    "injected_errors": self.injected_errors}
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    wbufsize = -1
+    fake: FakeCommonRoom
+
+    def _send(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None):
+        data = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        if data:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        fake = self.fake
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        path = urlsplit(self.path).path
+        if path == STATS_PATH:
+            return self._send(200, fake.stats())
+        if fake.latency or fake.jitter:
+            time.sleep(fake.latency + fake.random.uniform(0, fake.jitter))
+
+        route, params = fake.match(self.command, path[len(API_PREFIX):]) \
+            if path.startswith(API_PREFIX) else (None, {})
+        if route is None:
+            return self._send(404, {"message": f"No route for {self.command} {path}"})
+        key = route.key
+        with fake._lock:
+            fake.requests[key] += 1
+
+        headers, allowed = fake.take_slot()
+        if not allowed:
+            status, body = 429, {"message": "Too Many Requests"}
+        elif not self.headers.get("Authorization", "").startswith("Bearer "):
+            status, body = 403, {"message": "Forbidden"}
+        elif fake.error_rate and fake.random.random() < fake.error_rate:
+            with fake._lock:
+                fake.injected_errors += 1
+            status, body = fake.error_status, {"message": "Injected failure"}
+        else:
+            try:
+                payload = json.loads(raw) if raw else None
+            except ValueError:
+                status, body = 400, {"message": "Invalid JSON body"}
+            else:
+                status, body = fake.respond(route, params, payload)
+        with fake._lock:
+            fake.statuses[f"{key} {status}"] += 1
+        self._send(status, body, headers)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+def start(fake: FakeCommonRoom, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Serve fake in a background thread; the API base URL is httpd.api_url"""
+    handler = type("BoundFakeHandler", (FakeHandler,), {"fake": fake})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    httpd.api_url = f"http://{host}:{httpd.server_address[1]}{API_PREFIX}"
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Fault injection options, shared with load_test.py"""
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Extra random latency, 0..jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failed with --error-status")
+    parser.add_argument("--error-status", type=int, default=503, help="Status of injected failures")
+    parser.add_argument("--rate-limit", type=int, default=0, help="Requests allowed per window (0: unlimited)")
+    parser.add_argument("--window", type=float, default=60.0, help="Rate limit window in seconds")
+    parser.add_argument("--contacts", type=int, default=100, help="Seeded contacts user0..N-1@example.com")
+    parser.add_argument("--seed", type=int, help="Random seed for latency and failures")
+
+def from_arguments(args: argparse.Namespace, spec_path: str = DEFAULT_SPEC_PATH) -> FakeCommonRoom:
+    return FakeCommonRoom(spec_path, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                          error_rate=args.error_rate, error_status=args.error_status,
+                          rate_limit=args.rate_limit, window=args.window,
+                          contacts=args.contacts, seed=args.seed)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--spec", default=DEFAULT_SPEC_PATH, help="OpenAPI spec to serve")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    httpd = start(from_arguments(args, args.spec), args.host, args.port)
+    print(f"Fake Common Room API on {httpd.api_url} (stats at {STATS_PATH})")
+    print(f"Point the server at it: COMMONROOM_API_URL={httpd.api_url} COMMONROOM_KEY=test")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        httpd.shutdown()
+
+if __name__ == "__main__":
+    main()
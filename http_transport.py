@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Network transports for the Common Room MCP server
+Streamable HTTP (/mcp) and legacy SSE (/sse, /messages/) sessions served by one process
+"""
+
+import contextlib
+import hmac
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional
+
+from config import getenv
+from logs import get_logger
+
+log = get_logger("http")
+
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+def security_settings(host: str, port: int, token: Optional[str] = None) -> Any:
+    """DNS rebinding protection: loopback names by default, or COMMONROOM_HTTP_ALLOWED_HOSTS
+
+    A non-loopback bind needs allowed hosts or a bearer token; without either it is refused.
+    """
+    from mcp.server.transport_security import TransportSecuritySettings
+    allowed = [name.strip() for name in getenv('COMMONROOM_HTTP_ALLOWED_HOSTS', '').split(',') if name.strip()]
+    if not allowed:
+        if host not in LOOPBACK_HOSTS:
+            if not token:
+                raise ValueError(f"Refusing to serve on {host} without COMMONROOM_HTTP_ALLOWED_HOSTS or "
+                                 "COMMONROOM_HTTP_TOKEN; bind to 127.0.0.1 or set one of them")
+            # Browsers cannot attach the bearer token, so rebinding gains nothing
+            return TransportSecuritySettings(enable_dns_rebinding_protection=False)
+        allowed = [f"{name}:{port}" for name in ("127.0.0.1", "localhost", "[::1]")]
+    if host not in LOOPBACK_HOSTS and not token:
+        log.warning("serving without authentication on a non-loopback address; set COMMONROOM_HTTP_TOKEN",
+                    extra={"fields": {"host": host, "allowed_hosts": allowed}})
+    origins = [f"http://{name}" for name in allowed] + [f"https://{name}" for name in allowed]
+    return TransportSecuritySettings(enable_dns_rebinding_protection=True,
+                                     allowed_hosts=allowed, allowed_origins=origins)
+
+def require_token(app: Any, token: str) -> Any:
+    """ASGI wrapper answering 401 unless the request carries "Authorization: Bearer <token>" (/healthz is open)"""
+    from starlette.responses import JSONResponse
+    expected = f"Bearer {token}".encode()
+
+    async def guarded(scope, receive, send):
+        if scope["type"] == "http" and scope["path"] != "/healthz":
+            supplied = dict(scope["headers"]).get(b"authorization", b"")
+            if not hmac.compare_digest(supplied, expected):
+                response = JSONResponse({"error": "unauthorized"}, status_code=401,
+                                        headers={"WWW-Authenticate": "Bearer"})
+                await response(scope, receive, send)
+                return
+        await app(scope, receive, send)
+
+    return guarded
+
+def create_app(server: Any, startup: Callable[[], Any], shutdown: Callable[[Any], Awaitable[None]],
+               host: str = "127.0.0.1", port: int = 8000, stateless: bool = False,
+               json_response: bool = False, max_sessions: Optional[int] = None) -> Any:
+    """Starlette app running every session on the one MCP server, client, cache and rate limiter
+
+    startup() runs once the event loop is up and returns state handed to
+    shutdown(state) when the server stops, before open sessions are closed.
+    """
+    from mcp.server.sse import SseServerTransport
+    from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, Response
+    from starlette.routing import Mount, Route
+
+    token = getenv('COMMONROOM_HTTP_TOKEN') or None
+    security = security_settings(host, port, token)
+    manager_options = {"max_sessions": max_sessions} if max_sessions else {}
+    manager = StreamableHTTPSessionManager(app=server, stateless=stateless, json_response=json_response,
+                                           security_settings=security, **manager_options)
+    sse = SseServerTransport("/messages/", security_settings=security)
+    sessions: List[int] = [0]
+
+    async def handle_mcp(scope, receive, send):
+        await manager.handle_request(scope, receive, send)
+
+    async def handle_sse(request):
+        sessions[0] += 1
+        try:
+            async with sse.connect_sse(request.scope, request.receive, request._send) as (read, write):
+                await server.run(read, write, server.create_initialization_options())
+        finally:
+            sessions[0] -= 1
+        return Response()
+
+    async def health(request):
+        return JSONResponse({"status": "ok", "sse_sessions": sessions[0]})
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app) -> AsyncIterator[None]:
+        state = startup()
+        async with manager.run():
+            log.info("serving MCP on http://%s:%s/mcp and /sse", host, port)
+            try:
+                yield
+            finally:
+                # Before the manager cancels its sessions, so running tool calls can finish
+                await shutdown(state)
+
+    app = Starlette(routes=[
+        Route("/healthz", health, methods=["GET"]),
+        Route("/sse", handle_sse, methods=["GET"]),
+        Mount("/messages/", app=sse.handle_post_message),
+        Mount("/mcp", app=handle_mcp),
+    ], lifespan=lifespan)
+    return require_token(app, token) if token else app
+
+def serve(server: Any, startup: Callable[[], Any], shutdown: Callable[[Any], Awaitable[None]],
+          host: str = "127.0.0.1", port: int = 8000, stateless: bool = False, json_response: bool = False,
+          max_sessions: Optional[int] = None, shutdown_timeout: float = 30.0):
+    """Run the HTTP transport until SIGINT/SIGTERM
+
+    On a signal, uvicorn stops accepting connections and waits up to
+    shutdown_timeout seconds for open requests before the app shuts down.
+    """
+    import uvicorn
+    app = create_app(server, startup, shutdown, host, port, stateless, json_response, max_sessions)
+    uvicorn.run(app, host=host, port=port, log_level="info", access_log=False, lifespan="on",
+                timeout_graceful_shutdown=shutdown_timeout)
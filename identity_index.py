@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+In-memory identity index for Common Room contacts
+Maps every known identifier (email, GitHub, Twitter, LinkedIn, Common Room id) to one cached record
+"""
+
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Contact fields (from /members, /user/{email} and ApiUser payloads) holding each identifier
+CONTACT_FIELDS = {
+    'email': ('email', 'emails'),
+    'github': ('github', 'githubUsername'),
+    'twitter': ('twitter', 'twitterUsername'),
+    'linkedin': ('linkedin', 'linkedinUrl'),
+    'id': ('id', 'ids'),
+}
+
+_URL_PREFIX = re.compile(r'^(https?://)?(www\.)?(github\.com|twitter\.com|x\.com|linkedin\.com)/', re.I)
+
+def normalize(kind: str, value: Any) -> Optional[str]:
+    """Canonical form of an identifier so different spellings share one alias"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    if kind in ('github', 'twitter', 'linkedin'):
+        value = _URL_PREFIX.sub('', value).lstrip('@').rstrip('/')
+        if kind == 'linkedin' and not value.lower().startswith('in/'):
+            value = f"in/{value}"
+    return value.lower()
+
+def contact_aliases(contact: Dict) -> List[Tuple[str, str]]:
+    """Every (type, normalized value) identifier found on a contact record"""
+    aliases = []
+    for kind, fields in CONTACT_FIELDS.items():
+        for field in fields:
+            values = contact.get(field)
+            if values is None:
+                continue
+            for value in values if isinstance(values, list) else [values]:
+                if isinstance(value, dict):
+                    value = value.get('handle') or value.get('email') or value.get('id')
+                normalized = normalize(kind, value)
+                if normalized:
+                    aliases.append((kind, normalized))
+    return aliases
+
+class IdentityIndex:
+    def __init__(self, max_records: int = 1000, ttl: float = 600.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_records = max_records
+        self.ttl = ttl
+        self.clock = clock
+        self._aliases: Dict[Tuple[str, str], int] = {}
+        self._records: "OrderedDict[int, Tuple[Dict, float, List[Tuple[str, str]]]]" = OrderedDict()
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, identifiers: Dict[str, Any]) -> Optional[Dict]:
+        """Cached contact matching any of the given identifiers"""
+        for kind, value in identifiers.items():
+            record_id = self._aliases.get((kind, normalize(kind, value)))
+            if record_id is None:
+                continue
+            contact, expires_at, _ = self._records[record_id]
+            if expires_at <= self.clock():
+                self._drop(record_id)
+                continue
+            self._records.move_to_end(record_id)
+            self.hits += 1
+            return contact
+        self.misses += 1
+        return None
+
+    def add(self, contact: Dict, identifiers: Optional[Dict[str, Any]] = None) -> Dict:
+        """Index a contact under its own identifiers plus those it was looked up by"""
+        aliases = contact_aliases(contact)
+        for kind, value in (identifiers or {}).items():
+            normalized = normalize(kind, value)
+            if normalized:
+                aliases.append((kind, normalized))
+        # Merge with any record already known under one of these aliases
+        for alias in aliases:
+            existing = self._aliases.get(alias)
+            if existing is not None and existing in self._records:
+                aliases.extend(self._records[existing][2])
+                self._drop(existing)
+        record_id = self._next_id
+        self._next_id += 1
+        aliases = list(dict.fromkeys(aliases))
+        self._records[record_id] = (contact, self.clock() + self.ttl, aliases)
+        for alias in aliases:
+            self._aliases[alias] = record_id
+        while len(self._records) > self.max_records:
+            self._drop(next(iter(self._records)))
+        return contact
+
+    def forget(self, identifiers: Dict[str, Any]):
+        """Drop the record known under any of these identifiers"""
+        for kind, value in identifiers.items():
+            record_id = self._aliases.get((kind, normalize(kind, value)))
+            if record_id is not None:
+                self._drop(record_id)
+
+    def _drop(self, record_id: int):
+        _, _, aliases = self._records.pop(record_id, (None, None, ()))
+        for alias in aliases:
+            if self._aliases.get(alias) == record_id:
+                del self._aliases[alias]
+
+    def stats(self) -> Dict[str, Any]:
+        return {'records': len(self._records), 'aliases': len(self._aliases),
+                'max_records': self.max_records, 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Streaming CSV/JSONL import of activities and users
+Rows flow through parse, map, ID assignment, validation and posting one at a time, with a
+bounded number of requests in flight and a checkpoint so an interrupted import resumes
+"""
+
+import asyncio
+import copy
+import csv
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from commonroom_client import describe_error, generate_user_id, with_generated_ids
+from config import getenv
+from sent_index import payload_digest
+
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+KINDS = ('activity', 'user')
+
+# Failure details returned in the summary; the rest are in the rejects file
+MAX_REPORTED_FAILURES = 10
+
+def detect_format(path: str, fmt: Optional[str] = None) -> str:
+    """csv or jsonl, from the argument or the file extension"""
+    fmt = fmt or FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt not in ('csv', 'jsonl'):
+        raise ValueError(f"Cannot tell the format of {path}; pass format 'csv' or 'jsonl'")
+    return fmt
+
+def import_root() -> str:
+    """COMMONROOM_IMPORT_DIR; imports are refused until it is set, since the tool can run over HTTP"""
+    root = getenv('COMMONROOM_IMPORT_DIR')
+    if not root:
+        raise ValueError("File import is disabled; set COMMONROOM_IMPORT_DIR to the directory to import from")
+    return os.path.realpath(os.path.expanduser(root))
+
+def check_path(path: str) -> str:
+    """Absolute path of an import file, which must be inside COMMONROOM_IMPORT_DIR"""
+    root = import_root()
+    path = os.path.realpath(os.path.join(root, os.path.expanduser(path)))
+    if os.path.commonpath([path, root]) != root:
+        raise ValueError(f"Import files must be inside COMMONROOM_IMPORT_DIR ({root})")
+    if not os.path.isfile(path):
+        raise ValueError(f"No such file: {path}")
+    return path
+
+def state_path(path: str, suffix: str) -> str:
+    """Checkpoint or rejects file for an import, kept in COMMONROOM_IMPORT_STATE_DIR rather than beside the file"""
+    root = import_root()
+    state_dir = os.path.realpath(getenv('COMMONROOM_IMPORT_STATE_DIR') or os.path.join(root, '.import_state'))
+    os.makedirs(state_dir, exist_ok=True)
+    name = os.path.relpath(path, root).replace(os.sep, '__')
+    digest = hashlib.sha256(path.encode()).hexdigest()[:8]
+    return os.path.join(state_dir, f"{name}.{digest}.{suffix}")
+
+def read_rows(path: str, fmt: str) -> Iterator[Tuple[Optional[Dict], Optional[str]]]:
+    """(row, None) per record, or (None, error) for a line that does not parse; reads one row at a time"""
+    if fmt == 'csv':
+        with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                yield row, None
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield None, f"line {number}: {e}"
+                continue
+            yield (row, None) if isinstance(row, dict) else (None, f"line {number}: not a JSON object")
+
+def lookup(row: Dict, source: str) -> Any:
+    """A column, or a dotted path into a nested JSONL record"""
+    if source in row:
+        return row[source]
+    value: Any = row
+    for part in source.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+# "{First} {Last}" placeholders; the name inside the braces is a column or dotted path
+PLACEHOLDER = re.compile(r'\{([^{}]+)\}')
+
+def expand(template: str, row: Dict) -> str:
+    """Template with each placeholder replaced by its value; missing values expand to empty"""
+    def value(match) -> str:
+        found = lookup(row, match.group(1))
+        return '' if found is None else str(found)
+    return PLACEHOLDER.sub(value, template)
+
+def map_row(row: Dict, mapping: Optional[Dict[str, str]], defaults: Optional[Dict]) -> Dict:
+    """Payload built from defaults plus mapped fields ("user.email": "Email" or "{First} {Last}")
+
+    Without a mapping every column is used as a dotted payload path. Empty values are left out.
+    """
+    payload = copy.deepcopy(defaults) if defaults else {}
+    # Extra cells of a ragged CSV row are keyed None by csv.DictReader; they map to nothing
+    fields = mapping or {column: column for column in row
+                         if isinstance(column, str) and not column.startswith('_')}
+    for target, source in fields.items():
+        if '{' in source:
+            value = expand(source, row).strip()
+        else:
+            value = lookup(row, source)
+        if value is None or value == '':
+            continue
+        node = payload
+        *parents, leaf = target.split('.')
+        for part in parents:
+            node = node.setdefault(part, {})
+            if not isinstance(node, dict):
+                raise ValueError(f"{target}: {part} is not an object")
+        node[leaf] = value
+    return payload
+
+def prepare(kind: str, payload: Dict) -> Dict:
+    """Assign content-addressed IDs, so a row sent again after a resume updates the same record"""
+    if kind == 'activity':
+        if not isinstance(payload.get('user'), dict):
+            raise ValueError("user: required")
+        return with_generated_ids(payload, mode='deterministic')
+    payload['id'] = payload.get('id') or generate_user_id(payload, mode='deterministic')
+    return payload
+
+class Progress:
+    """Low-water mark of finished rows; rows finish out of order but resume from the first unfinished one
+
+    counts only covers rows below the mark, so a checkpoint never counts a row that is sent again on resume.
+    """
+
+    def __init__(self, done: int = 0, counts: Optional[Dict[str, int]] = None):
+        self.done = done
+        self.counts = counts if counts is not None else {}
+        self._finished: Dict[int, str] = {}
+
+    def finish(self, index: int, outcome: str):
+        self._finished[index] = outcome
+        while self.done in self._finished:
+            outcome = self._finished.pop(self.done)
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+            self.done += 1
+
+class Checkpoint:
+    """Import state in a JSON file, replaced atomically"""
+
+    def __init__(self, path: str, fingerprint: Dict[str, Any]):
+        self.path = path
+        self.fingerprint = fingerprint
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        if state.get('fingerprint') != self.fingerprint:
+            raise ValueError(f"Checkpoint {self.path} belongs to a different file, mapping or destination; "
+                             "pass restart: true to start over")
+        return state
+
+    def save(self, rows_done: int, counts: Dict[str, int], complete: bool):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'fingerprint': self.fingerprint, 'rows_done': rows_done, 'counts': counts,
+                       'complete': complete, 'updated_at': time.time()}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+async def import_file(client, path: str, kind: str = 'activity', mapping: Optional[Dict[str, str]] = None,
+                      defaults: Optional[Dict] = None, destination_source_id: Optional[str] = None,
+                      fmt: Optional[str] = None, concurrency: Optional[int] = None,
+                      max_rows: Optional[int] = None, restart: bool = False, dry_run: bool = False,
+                      checkpoint_every: int = 500,
+                      validate: Optional[Callable[[str, Dict], None]] = None) -> Dict[str, Any]:
+    """Import a CSV/JSONL file of activities or users, resuming from its checkpoint
+
+    validate(kind, payload) may raise ValueError to reject a row. Rows that are
+    rejected or fail to post are appended to a rejects file in the state directory with _row and
+    _error fields, so the file can be fixed and imported again with the same mapping.
+    max_rows stops after that many rows; the next call continues from there.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+    path = check_path(path)
+    fmt = detect_format(path, fmt)
+    destination = client._resolve_destination(destination_source_id)
+    stat = os.stat(path)
+    checkpoint = Checkpoint(state_path(path, 'checkpoint.json'), {
+        'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime, 'kind': kind, 'format': fmt,
+        'destination': destination, 'tenant': client.tenant.name,
+        'mapping': payload_digest([mapping, defaults]),
+    })
+    rejects_path = state_path(path, 'rejects.jsonl')
+    if restart and not dry_run:
+        checkpoint.clear()
+        if os.path.exists(rejects_path):
+            os.remove(rejects_path)
+    state = None if dry_run else checkpoint.load()
+    start = state['rows_done'] if state else 0
+    counts = dict(state['counts']) if state else {'created': 0, 'skipped': 0, 'invalid': 0, 'failed': 0}
+    summary: Dict[str, Any] = {'path': path, 'kind': kind, 'format': fmt, 'destination': destination,
+                               'dry_run': dry_run, 'resumed_from': start}
+    if state and state.get('complete'):
+        summary.update(rows_done=start, complete=True, counts=counts, checkpoint=checkpoint.path,
+                       note="already imported; pass restart: true to import again")
+        return summary
+
+    progress = Progress(start, counts)
+    failures: List[Dict[str, Any]] = []
+    rejects = None
+    slots = asyncio.Semaphore(min(concurrency or client.max_concurrency, client.max_concurrency))
+    pending = set()
+    send = client.add_activity if kind == 'activity' else client.add_user
+    started = time.perf_counter()
+    saved = start
+    complete = False
+
+    def reject(index: int, row: Optional[Dict], error: str, outcome: str):
+        nonlocal rejects
+        if len(failures) < MAX_REPORTED_FAILURES:
+            failures.append({'row': index, 'status': outcome, 'error': error})
+        if dry_run:
+            return
+        if rejects is None:
+            rejects = open(rejects_path, 'a', encoding='utf-8')
+        rejects.write(json.dumps(dict(row or {}, _row=index, _error=error), default=str) + '\n')
+
+    async def post(index: int, row: Dict, payload: Dict):
+        try:
+            result = await send(destination, payload)
+        except asyncio.CancelledError:
+            raise  # not finished: sent again on resume
+        except Exception as e:
+            reject(index, row, describe_error(e), 'failed')
+            outcome = 'failed'
+        else:
+            outcome = 'skipped' if isinstance(result, dict) and result.get('status') == 'skipped' else 'created'
+        finally:
+            slots.release()
+        progress.finish(index, outcome)
+
+    try:
+        for index, (row, error) in enumerate(read_rows(path, fmt)):
+            if index < start:
+                continue
+            if max_rows is not None and index >= start + max_rows:
+                break
+            try:
+                if error is not None:
+                    raise ValueError(error)
+                payload = prepare(kind, map_row(row, mapping, defaults))
+                if validate is not None:
+                    validate(kind, payload)
+            except Exception as e:
+                # Any mapping or validation error rejects the row, so a resume never stops on it again
+                reject(index, row, describe_error(e), 'invalid')
+                progress.finish(index, 'invalid')
+                continue
+            if dry_run:
+                progress.finish(index, 'created')
+                continue
+            # Waits here when `concurrency` rows are in flight, so memory stays flat
+            await slots.acquire()
+            task = asyncio.create_task(post(index, row, payload))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            if progress.done - saved >= checkpoint_every:
+                checkpoint.save(progress.done, counts, False)
+                saved = progress.done
+        else:
+            complete = True
+        await asyncio.gather(*pending)
+        pending.clear()
+    finally:
+        for task in pending:
+            task.cancel()
+        if rejects is not None:
+            rejects.close()
+        if not dry_run:
+            checkpoint.save(progress.done, counts, complete and not pending)
+
+    elapsed = time.perf_counter() - started
+    if dry_run:
+        counts['valid'] = counts.pop('created')
+        del counts['skipped'], counts['failed']
+    summary.update(
+        rows_done=progress.done,
+        complete=complete,
+        counts=counts,
+        elapsed_seconds=round(elapsed, 3),
+        rows_per_second=round((progress.done - start) / elapsed, 1) if elapsed > 0 else None,
+        failures=failures,
+    )
+    if not dry_run:
+        summary['checkpoint'] = checkpoint.path
+        if os.path.exists(rejects_path):
+            summary['rejects'] = rejects_path
+    return summary
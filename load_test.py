@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test
+Drives server.py over MCP stdio with concurrent tool calls against the local fake API (fake_api.py)
+and reports throughput, latency percentiles and errors per tool
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import fake_api
+from bench_pool import percentile
+from bench_startup import INITIALIZE, INITIALIZED
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Default tool mix: tool -> relative weight
+DEFAULT_MIX = {
+    "commonroom_get_activity_types": 2,
+    "commonroom_get_segments": 2,
+    "commonroom_get_tags": 1,
+    "commonroom_get_custom_fields": 1,
+    "commonroom_get_user": 3,
+    "commonroom_get_users": 1,
+    "commonroom_add_activity": 2,
+}
+
+def _email(rng: random.Random, contacts: int) -> str:
+    # Half of the addresses are seeded contacts, half are unknown (404)
+    return f"user{rng.randrange(max(1, contacts) * 2)}@example.com"
+
+# Tool -> arguments(rng, call index, seeded contacts)
+ARGUMENTS: Dict[str, Callable[[random.Random, int, int], Dict]] = {
+    "commonroom_get_user": lambda rng, i, contacts: {"email": _email(rng, contacts)},
+    "commonroom_get_users": lambda rng, i, contacts: {"emails": [_email(rng, contacts) for _ in range(5)]},
+    "commonroom_resolve_contact": lambda rng, i, contacts: {"email": _email(rng, contacts)},
+    "commonroom_add_activity": lambda rng, i, contacts: {"activity": {
+        "activityType": "started_training",
+        "activityTitle": {"type": "text", "value": f"Load test activity {i}"},
+        "content": {"type": "text", "value": "Generated by load_test.py"},
+        "user": {"email": f"load{i}@example.com", "fullName": f"Load {i}"},
+    }},
+    "commonroom_add_user": lambda rng, i, contacts: {"user": {"email": f"load{i}@example.com"}},
+}
+
+def classify(message: Dict) -> Optional[str]:
+    """Error category of a tools/call response, or None for success"""
+    if "error" in message:
+        return "rpc_error"
+    result = message.get("result") or {}
+    text = "".join(item.get("text", "") for item in result.get("content") or [])
+    if text.startswith("Unknown tool"):
+        return "unknown_tool"
+    if text.startswith("Invalid arguments"):
+        return "invalid_arguments"
+    if text.startswith("Common Room API Error:"):
+        if re.search(r"\bnot found\b|\bno .* found\b", text, re.IGNORECASE):
+            return "not_found"
+        status = re.search(r"\b([45]\d\d)\b", text)
+        return f"http_{status.group(1)}" if status else "api_error"
+    if result.get("isError"):
+        return "tool_error"
+    return None
+
+class StdioSession:
+    """JSON-RPC over a server subprocess's stdin/stdout, with many requests in flight"""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.next_id = 100
+        self.reader = asyncio.create_task(self._read())
+
+    @classmethod
+    async def start(cls, python: str, env: Dict[str, str], stderr: Any) -> "StdioSession":
+        process = await asyncio.create_subprocess_exec(
+            python, os.path.join(HERE, "server.py"), cwd=HERE, env=env,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=stderr,
+            limit=64 * 1024 * 1024)
+        return cls(process)
+
+    async def _read(self):
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            future = self.pending.pop(message.get("id"), None)
+            if future is not None and not future.done():
+                future.set_result(message)
+        for future in self.pending.values():
+            future.set_exception(RuntimeError("server exited"))
+
+    def send(self, message: Dict):
+        self.process.stdin.write((json.dumps(message) + "\n").encode())
+
+    async def request(self, method: str, params: Dict, timeout: float) -> Dict:
+        self.next_id += 1
+        request_id = self.next_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.send({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+        await self.process.stdin.drain()
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def initialize(self):
+        future = asyncio.get_running_loop().create_future()
+        self.pending[INITIALIZE["id"]] = future
+        self.send(INITIALIZE)
+        await future
+        self.send(INITIALIZED)
+        await self.process.stdin.drain()
+
+    async def close(self):
+        self.process.stdin.close()
+        try:
+            await asyncio.wait_for(self.process.wait(), 5)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+        self.reader.cancel()
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """"tool=weight,tool" -> {tool: weight}; the commonroom_ prefix is optional"""
+    mix = {}
+    for part in filter(None, (item.strip() for item in value.split(","))):
+        name, _, weight = part.partition("=")
+        name = name if name.startswith("commonroom_") else f"commonroom_{name}"
+        mix[name] = float(weight or 1)
+    return mix
+
+def plan(mix: Dict[str, float], calls: int, contacts: int, seed: Optional[int]) -> List[Tuple[str, Dict]]:
+    """The sequence of (tool, arguments) to send"""
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    calls_plan = []
+    for index in range(calls):
+        name = rng.choices(names, weights)[0]
+        arguments = ARGUMENTS.get(name, lambda rng, i, contacts: {})(rng, index, contacts)
+        calls_plan.append((name, arguments))
+    return calls_plan
+
+async def drive(session: StdioSession, calls: List[Tuple[str, Dict]], concurrency: int,
+                timeout: float) -> Tuple[List[Tuple[str, float, Optional[str]]], float]:
+    """Send calls with at most concurrency in flight; (tool, ms, error) per call and wall seconds"""
+    queue = iter(calls)
+    samples = []
+
+    async def worker():
+        for name, arguments in queue:
+            start = time.perf_counter()
+            try:
+                message = await session.request("tools/call", {"name": name, "arguments": arguments}, timeout)
+                error = classify(message)
+            except asyncio.TimeoutError:
+                error = "timeout"
+            except RuntimeError:
+                error = "server_exited"
+            samples.append((name, (time.perf_counter() - start) * 1000, error))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+def summarize(samples: List[Tuple[str, float, Optional[str]]], wall: float) -> Dict[str, Any]:
+    by_tool: Dict[str, List[Tuple[float, Optional[str]]]] = defaultdict(list)
+    for name, ms, error in samples:
+        by_tool[name].append((ms, error))
+    tools = {}
+    for name, results in sorted(by_tool.items()):
+        latencies = [ms for ms, _ in results]
+        errors = Counter(error for _, error in results if error)
+        tools[name] = {
+            "calls": len(results), "errors": sum(errors.values()), "error_kinds": dict(errors),
+            "p50_ms": statistics.median(latencies), "p90_ms": percentile(latencies, 90),
+            "p99_ms": percentile(latencies, 99), "max_ms": max(latencies),
+            "mean_ms": statistics.mean(latencies),
+        }
+    latencies = [ms for _, ms, _ in samples]
+    return {
+        "calls": len(samples), "wall_seconds": wall, "throughput": len(samples) / wall if wall else 0.0,
+        "errors": sum(1 for _, _, error in samples if error),
+        "p50_ms": statistics.median(latencies), "p99_ms": percentile(latencies, 99),
+        "tools": tools,
+    }
+
+def _delta(current: float, baseline: Optional[float]) -> str:
+    if not baseline:
+        return ""
+    return f" ({(current - baseline) / baseline * 100:+.0f}%)"
+
+def report(summary: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    base_tools = (baseline or {}).get("tools", {})
+    print(f"{summary['calls']} calls in {summary['wall_seconds']:.2f}s: "
+          f"{summary['throughput']:.1f} calls/s{_delta(summary['throughput'], (baseline or {}).get('throughput'))}, "
+          f"{summary['errors']} errors, p50={summary['p50_ms']:.1f}ms p99={summary['p99_ms']:.1f}ms")
+    print(f"{'tool':<34}{'calls':>6}{'errors':>7}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for name, stats in summary["tools"].items():
+        base = base_tools.get(name, {})
+        print(f"{name:<34}{stats['calls']:>6}{stats['errors']:>7}{stats['p50_ms']:>9.1f}{stats['p90_ms']:>9.1f}"
+              f"{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}"
+              f"{_delta(stats['p50_ms'], base.get('p50_ms'))}")
+    errors = {name: stats["error_kinds"] for name, stats in summary["tools"].items() if stats["error_kinds"]}
+    if errors:
+        print("errors:")
+        for name, kinds in errors.items():
+            print(f"  {name}: " + ", ".join(f"{kind}={count}" for kind, count in sorted(kinds.items())))
+    api = summary.get("api")
+    if api:
+        print(f"API: {api['total']} requests, {api['throttled']} throttled (429), "
+              f"{api['injected_errors']} injected failures")
+
+def server_env(api_url: str, workdir: str, extra: List[str]) -> Dict[str, str]:
+    """Server environment: the fake API, throwaway local databases, no spec check"""
+    env = {k: v for k, v in os.environ.items() if not k.startswith("COMMONROOM_")}
+    env.update({
+        "COMMONROOM_KEY": "load-test",
+        "COMMONROOM_API_URL": api_url,
+        "COMMONROOM_SPEC_CHECK": "false",
+        "COMMONROOM_SENT_INDEX": os.path.join(workdir, "sent.db"),
+        "COMMONROOM_WRITE_QUEUE": os.path.join(workdir, "queue.db"),
+    })
+    for item in extra:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    fake = httpd = None
+    api_url = args.api_url
+    if api_url is None:
+        fake = fake_api.from_arguments(args)
+        httpd = fake_api.start(fake)
+        api_url = httpd.api_url
+    calls = plan(parse_mix(args.mix) if args.mix else DEFAULT_MIX, args.calls, args.contacts, args.seed)
+    with tempfile.TemporaryDirectory() as workdir:
+        stderr = open(args.server_log, "w") if args.server_log else asyncio.subprocess.DEVNULL
+        try:
+            session = await StdioSession.start(args.python, server_env(api_url, workdir, args.env), stderr)
+            await session.initialize()
+            samples, wall = await drive(session, calls, args.concurrency, args.timeout)
+            await session.close()
+        finally:
+            if args.server_log:
+                stderr.close()
+    summary = summarize(samples, wall)
+    summary["config"] = {"calls": args.calls, "concurrency": args.concurrency, "mix": args.mix or DEFAULT_MIX,
+                         "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+                         "error_rate": args.error_rate, "rate_limit": args.rate_limit, "env": args.env}
+    if fake is not None:
+        summary["api"] = fake.stats()
+        httpd.shutdown()
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=500, help="Tool calls to send")
+    parser.add_argument("--concurrency", type=int, default=16, help="Tool calls in flight at once")
+    parser.add_argument("--mix", help="Tools and weights, e.g. get_user=3,get_segments=1 (default: a read-heavy mix)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds before a call counts as timed out")
+    parser.add_argument("--python", default=sys.executable, help="Interpreter used to run server.py")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra server environment, e.g. COMMONROOM_MAX_CONCURRENCY=4 (repeatable)")
+    parser.add_argument("--api-url", help="Use an already running fake API instead of starting one")
+    parser.add_argument("--server-log", help="Write the server's stderr to this file")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results file from an earlier run to compare against")
+    fake_api.add_arguments(parser)
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(summary, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+if __name__ == "__main__":
+    main()
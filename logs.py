@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Structured logging for the Common Room MCP server
+Level-gated JSON or text records on stderr, with request IDs, sampling and field redaction
+"""
+
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+import zlib
+from typing import Any, Dict, Optional
+
+import config
+from config import getenv
+
+LOGGER_NAME = "commonroom"
+
+# Contact details and credentials; their values never reach the log
+REDACTED_FIELDS = frozenset({
+    'email', 'emails', 'fullname', 'firstname', 'lastname', 'phone', 'phonenumber',
+    'twitterusername', 'linkedinurl', 'githubusername', 'discordusername', 'slackuserid',
+    # ApiUser fields from the spec: social handles are {type, value} objects
+    'github', 'twitter', 'linkedin', 'discord', 'youtube', 'externalprofiles', 'username', 'avatarurl',
+    'bio', 'companyname', 'rawlocation', 'city', 'region',
+    'location', 'content', 'authorization', 'api_key', 'token', 'commonroom_key',
+})
+REDACTED = "[redacted]"
+
+# ID of the tool call being handled; copied into tasks it starts, so HTTP calls carry it too
+request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('request_id', default=None)
+
+def new_request_id() -> contextvars.Token:
+    """Start a request; reset the returned token when it ends"""
+    return request_id.set(uuid.uuid4().hex[:12])
+
+def redact(value: Any, fields: frozenset = REDACTED_FIELDS) -> Any:
+    """Copy of value with sensitive keys masked at any depth"""
+    if isinstance(value, dict):
+        return {key: REDACTED if str(key).lower() in fields else redact(item, fields)
+                for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item, fields) for item in value]
+    return value
+
+class RequestContext(logging.Filter):
+    """Adds the request ID and drops a share of sub-warning records
+
+    Sampling is decided per request ID, so a kept request keeps all its records.
+    """
+
+    def __init__(self, sample_rate: float = 1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        if self.sample_rate >= 1.0 or record.levelno >= logging.WARNING:
+            return True
+        if record.request_id is None:
+            return random.random() < self.sample_rate
+        return zlib.crc32(record.request_id.encode()) % 10000 < self.sample_rate * 10000
+
+class StructuredFormatter(logging.Formatter):
+    """One JSON object (or key=value line) per record; fields are redacted here, only when emitted"""
+
+    def __init__(self, fmt: str = "json", fields: frozenset = REDACTED_FIELDS):
+        super().__init__()
+        self.fmt = fmt
+        self.fields = fields
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        entry.update(redact(getattr(record, 'fields', None) or {}, self.fields))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        if self.fmt == "json":
+            return json.dumps(entry, ensure_ascii=False, default=str)
+        stamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created))
+        extra = ' '.join(f"{key}={json.dumps(value, default=str)}" for key, value in entry.items()
+                         if key not in ('ts', 'level', 'logger', 'event'))
+        return f"{stamp} {record.levelname:<7} {record.name} {entry['event']} {extra}".rstrip()
+
+# None until configured, then whether .env had been loaded at the time
+_configured: Optional[bool] = None
+
+def configure_logging(force: bool = False) -> logging.Logger:
+    """Set up the commonroom logger from COMMONROOM_LOG_* (stderr; stdout carries the MCP protocol)
+
+    Until the first settings lookup loads .env only the process environment is read, so startup
+    stays light; calling again once .env is loaded applies any COMMONROOM_LOG_* it sets.
+    """
+    global _configured
+    logger = logging.getLogger(LOGGER_NAME)
+    if _configured is config._env_loaded and not force:
+        return logger
+    read = getenv if config._env_loaded else os.getenv
+    level = (read('COMMONROOM_LOG_LEVEL') or 'WARNING').strip().upper()
+    fields = REDACTED_FIELDS | {name.strip().lower() for name in
+                                (read('COMMONROOM_LOG_REDACT') or '').split(',') if name.strip()}
+    sample_rate = float(read('COMMONROOM_LOG_SAMPLE_RATE') or 1.0)
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(StructuredFormatter((read('COMMONROOM_LOG_FORMAT') or 'json').strip().lower(), fields))
+    handler.addFilter(RequestContext(min(max(sample_rate, 0.0), 1.0)))
+    logger.handlers = [handler]
+    logger.setLevel(getattr(logging, level, logging.WARNING))
+    logger.propagate = False
+    _configured = config._env_loaded
+    return logger
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the commonroom hierarchy
+
+    Pass data as extra={'fields': {...}}, guarded by isEnabledFor for anything
+    costly to build; messages use %-style arguments so they are only formatted
+    when a record is emitted.
+    """
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Server and API call metrics
+Per-tool and per-endpoint counters and latency histograms, exported as JSON or Prometheus text
+"""
+
+import asyncio
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import env_bool, env_float, env_int, getenv
+from logs import get_logger
+from rate_limiter import rate_limiters
+
+log = get_logger("metrics")
+
+# Histogram bucket upper bounds in seconds (Prometheus "le")
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Path segments after these collections are identifiers; keeps endpoint labels bounded
+PATH_PARAMETERS = {'user': '{email}', 'source': '{destinationSourceId}', 'segments': '{id}', 'tags': '{id}'}
+
+def endpoint(path: str) -> str:
+    """API path with identifiers replaced by their spec parameter, e.g. /user/{email}"""
+    parts = path.split('?', 1)[0].split('/')
+    for index in range(2, len(parts)):
+        parameter = PATH_PARAMETERS.get(parts[index - 1])
+        if parameter and parts[index]:
+            parts[index] = parameter
+        elif re.search(r'[\d@%]', parts[index]):
+            parts[index] = '{id}'
+    return '/'.join(parts)
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and two additions"""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate, interpolating linearly inside the bucket that holds the quantile"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        """Count and millisecond percentiles"""
+        def ms(value: Optional[float]) -> Optional[float]:
+            return round(value * 1000, 2) if value is not None else None
+        return {
+            'count': self.count,
+            'mean_ms': ms(self.sum / self.count) if self.count else None,
+            'p50_ms': ms(self.quantile(0.5)),
+            'p90_ms': ms(self.quantile(0.9)),
+            'p99_ms': ms(self.quantile(0.99)),
+            'max_ms': ms(self.max) if self.count else None,
+        }
+
+def _labels(**labels: str) -> str:
+    escaped = {name: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for name, value in labels.items()}
+    return ','.join(f'{name}="{value}"' for name, value in escaped.items())
+
+class Metrics:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.started = time.time()
+        self._lock = threading.Lock()
+        # tool -> outcome (ok, invalid, error) -> calls
+        self.tool_calls: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.tool_latency: Dict[str, Histogram] = defaultdict(Histogram)
+        self.tool_encode: Dict[str, Histogram] = defaultdict(Histogram)
+        self.tool_bytes: Dict[str, int] = defaultdict(int)
+        # (method, endpoint) -> ...
+        self.api_statuses: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.api_latency: Dict[Tuple[str, str], Histogram] = defaultdict(Histogram)
+        self.api_bytes_out: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.api_bytes_in: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.api_retries: Dict[Tuple[str, str], int] = defaultdict(int)
+        # Reads answered by joining an identical request already in flight
+        self.api_coalesced: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.rate_limit_wait = Histogram()
+        self.concurrency_wait = Histogram()
+
+    def observe_tool(self, tool: str, outcome: str, seconds: float, encode_seconds: float = 0.0,
+                     response_bytes: int = 0):
+        """One tools/call: total time, time spent encoding the result, result size"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.tool_calls[tool][outcome] += 1
+            self.tool_latency[tool].observe(seconds)
+            if outcome == 'ok':
+                self.tool_encode[tool].observe(encode_seconds)
+            self.tool_bytes[tool] += response_bytes
+
+    def observe_request(self, method: str, path: str, status: Optional[int], seconds: float,
+                        rate_limit_wait: float = 0.0, concurrency_wait: float = 0.0,
+                        bytes_out: int = 0, bytes_in: int = 0, retry: bool = False):
+        """One HTTP attempt; status None for a network error without a response"""
+        if not self.enabled:
+            return
+        key = (method, endpoint(path))
+        with self._lock:
+            self.api_statuses[key][str(status) if status is not None else 'error'] += 1
+            self.api_latency[key].observe(seconds)
+            self.api_bytes_out[key] += bytes_out
+            self.api_bytes_in[key] += bytes_in
+            if retry:
+                self.api_retries[key] += 1
+            self.rate_limit_wait.observe(rate_limit_wait)
+            self.concurrency_wait.observe(concurrency_wait)
+
+    def observe_coalesced(self, method: str, path: str):
+        """A read that shared an identical in-flight request instead of sending its own"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.api_coalesced[(method, endpoint(path))] += 1
+
+    def reset(self):
+        """Drop everything recorded so far"""
+        with self._lock:
+            for values in (self.tool_calls, self.tool_latency, self.tool_encode, self.tool_bytes,
+                           self.api_statuses, self.api_latency, self.api_bytes_out, self.api_bytes_in,
+                           self.api_retries, self.api_coalesced):
+                values.clear()
+            self.rate_limit_wait = Histogram()
+            self.concurrency_wait = Histogram()
+            self.started = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Everything recorded, as JSON-friendly data for the stats tool"""
+        with self._lock:
+            tools = {
+                tool: {
+                    'calls': sum(outcomes.values()),
+                    'outcomes': dict(outcomes),
+                    'latency': self.tool_latency[tool].summary(),
+                    'encode': self.tool_encode[tool].summary(),
+                    'response_bytes': self.tool_bytes[tool],
+                }
+                for tool, outcomes in sorted(self.tool_calls.items())
+            }
+            api = {
+                f"{method} {path}": {
+                    'requests': sum(statuses.values()),
+                    'statuses': dict(statuses),
+                    'retries': self.api_retries.get((method, path), 0),
+                    'coalesced': self.api_coalesced.get((method, path), 0),
+                    'latency': self.api_latency[(method, path)].summary(),
+                    'bytes_out': self.api_bytes_out[(method, path)],
+                    'bytes_in': self.api_bytes_in[(method, path)],
+                }
+                for (method, path), statuses in sorted(self.api_statuses.items())
+            }
+            waits = {'rate_limit': self.rate_limit_wait.summary(),
+                     'concurrency': self.concurrency_wait.summary()}
+        return {
+            'enabled': self.enabled,
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'tools': tools,
+            'api': api,
+            'waits': waits,
+            'rate_limits': [limiter.headroom() for limiter in rate_limiters()],
+        }
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name: str, histogram: Histogram, labels: str):
+            prefix = f"{labels}," if labels else ""
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{name}_sum{suffix} {histogram.sum}")
+            lines.append(f"{name}_count{suffix} {histogram.count}")
+
+        with self._lock:
+            metric("commonroom_tool_calls_total", "counter", "MCP tool calls by outcome")
+            for tool, outcomes in sorted(self.tool_calls.items()):
+                for outcome, count in sorted(outcomes.items()):
+                    lines.append(f"commonroom_tool_calls_total{{{_labels(tool=tool, outcome=outcome)}}} {count}")
+            metric("commonroom_tool_duration_seconds", "histogram", "MCP tool call latency")
+            for tool, hist in sorted(self.tool_latency.items()):
+                histogram("commonroom_tool_duration_seconds", hist, _labels(tool=tool))
+            metric("commonroom_tool_encode_seconds", "histogram", "Time spent shaping and encoding tool results")
+            for tool, hist in sorted(self.tool_encode.items()):
+                histogram("commonroom_tool_encode_seconds", hist, _labels(tool=tool))
+            metric("commonroom_tool_response_bytes_total", "counter", "Bytes of tool result text")
+            for tool, count in sorted(self.tool_bytes.items()):
+                lines.append(f"commonroom_tool_response_bytes_total{{{_labels(tool=tool)}}} {count}")
+
+            metric("commonroom_api_requests_total", "counter", "Common Room API requests by HTTP status")
+            for (method, path), statuses in sorted(self.api_statuses.items()):
+                for status, count in sorted(statuses.items()):
+                    lines.append(f"commonroom_api_requests_total"
+                                 f"{{{_labels(method=method, endpoint=path, status=status)}}} {count}")
+            metric("commonroom_api_request_duration_seconds", "histogram", "Common Room API request latency")
+            for (method, path), hist in sorted(self.api_latency.items()):
+                histogram("commonroom_api_request_duration_seconds", hist, _labels(method=method, endpoint=path))
+            for name, values, help_text in (
+                    ("commonroom_api_request_bytes_total", self.api_bytes_out, "Request body bytes sent"),
+                    ("commonroom_api_response_bytes_total", self.api_bytes_in, "Response body bytes received"),
+                    ("commonroom_api_retries_total", self.api_retries, "Retried API requests"),
+                    ("commonroom_api_coalesced_total", self.api_coalesced,
+                     "Reads that joined an identical request already in flight")):
+                metric(name, "counter", help_text)
+                for (method, path), count in sorted(values.items()):
+                    lines.append(f"{name}{{{_labels(method=method, endpoint=path)}}} {count}")
+
+            metric("commonroom_rate_limit_wait_seconds", "histogram", "Time requests waited for rate limit quota")
+            histogram("commonroom_rate_limit_wait_seconds", self.rate_limit_wait, "")
+            metric("commonroom_concurrency_wait_seconds", "histogram", "Time requests waited for a concurrency slot")
+            histogram("commonroom_concurrency_wait_seconds", self.concurrency_wait, "")
+
+        limits = [limiter.headroom() for limiter in rate_limiters()]
+        for name, key, help_text in (
+                ("commonroom_rate_limit_limit", "limit", "Request quota per interval reported by the API"),
+                ("commonroom_rate_limit_remaining", "remaining", "Requests left in the current interval"),
+                ("commonroom_rate_limit_throttled_total", "throttled_responses", "429 responses received")):
+            metric(name, "counter" if name.endswith("_total") else "gauge", help_text)
+            for index, headroom in enumerate(limits):
+                if headroom[key] is not None:
+                    labels = _labels(limiter=str(index), tenant=headroom['tenant'] or '')
+                    lines.append(f'{name}{{{labels}}} {headroom[key]}')
+        metric("commonroom_process_start_time_seconds", "gauge", "Server start time")
+        lines.append(f"commonroom_process_start_time_seconds {self.started}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """Atomically write the Prometheus text (for node_exporter's textfile collector)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus())
+        os.replace(tmp_path, path)
+
+_metrics: Optional[Metrics] = None
+
+def get_metrics() -> Metrics:
+    """Process-wide metrics (COMMONROOM_METRICS=false turns recording off)"""
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics(enabled=env_bool('COMMONROOM_METRICS', True))
+    return _metrics
+
+def serve_http(port: int, host: str = "127.0.0.1"):
+    """Serve /metrics from a daemon thread"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = get_metrics().prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, port), MetricsHandler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+async def export_metrics():
+    """Start the optional Prometheus exporters (COMMONROOM_METRICS_PORT, COMMONROOM_METRICS_FILE)"""
+    port = env_int('COMMONROOM_METRICS_PORT', 0)
+    if port:
+        try:
+            serve_http(port, getenv('COMMONROOM_METRICS_HOST', '127.0.0.1'))
+        except OSError as e:
+            log.error("metrics endpoint failed", extra={"fields": {"port": port, "error": str(e)}})
+    path = getenv('COMMONROOM_METRICS_FILE')
+    if not path:
+        return
+    interval = max(env_float('COMMONROOM_METRICS_INTERVAL', 15.0), 1.0)
+    while True:
+        try:
+            await asyncio.to_thread(get_metrics().write_textfile, path)
+        except OSError as e:
+            log.error("metrics file write failed", extra={"fields": {"path": path, "error": str(e)}})
+        await asyncio.sleep(interval)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tool result shaping and serialization
+Projection (fields), paging (limit/offset) and compact, pretty or tabular output
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+from config import getenv
+
+try:
+    import orjson  # optional, much faster encoder
+except ImportError:
+    orjson = None
+
+FORMATS = ('compact', 'pretty', 'table')
+
+# Extra tool arguments for list results; records (a single object) only take fields and format
+OUTPUT_PROPERTIES = {
+    "fields": {
+        "type": "array",
+        "description": "Only return these fields of each item (dotted paths such as user.email are allowed)",
+        "items": {"type": "string"},
+        "minItems": 1
+    },
+    "limit": {
+        "type": "integer",
+        "description": "Return at most this many items",
+        "minimum": 1
+    },
+    "offset": {
+        "type": "integer",
+        "description": "Skip this many items first",
+        "minimum": 0,
+        "default": 0
+    },
+    "format": {
+        "type": "string",
+        "description": "compact JSON, pretty (indented) JSON, or table (tab-separated text, smallest); default from COMMONROOM_OUTPUT_FORMAT or pretty",
+        "enum": list(FORMATS)
+    }
+}
+RECORD_PROPERTIES = {name: OUTPUT_PROPERTIES[name] for name in ("fields", "format")}
+
+def default_format() -> str:
+    value = getenv('COMMONROOM_OUTPUT_FORMAT', 'pretty').strip().lower()
+    return value if value in FORMATS else 'pretty'
+
+def dumps(value: Any, pretty: bool = False) -> str:
+    """JSON text, using orjson when it is installed"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(value, option=option, default=str).decode()
+    if pretty:
+        return json.dumps(value, indent=2, ensure_ascii=False, default=str)
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=str)
+
+def project(record: Any, fields: Optional[List[str]]) -> Any:
+    """Copy of a record with only the given (dotted) fields"""
+    if not fields or not isinstance(record, dict):
+        return record
+    projected: Dict[str, Any] = {}
+    for field in fields:
+        value = record
+        parts = field.split('.')
+        for part in parts:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            target = projected
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+    return projected
+
+def shape(result: Any, kind: Optional[str], arguments: Dict) -> Any:
+    """Apply fields/limit/offset to a result
+
+    kind is "record" for a single object, "list" for a list, or the key of
+    the list inside an envelope object (e.g. "labels" for /tags).
+    """
+    fields = arguments.get("fields")
+    if kind is None:
+        return result
+    if kind == "record":
+        return project(result, fields)
+    items = result if kind == "list" else result.get(kind) if isinstance(result, dict) else None
+    if not isinstance(items, list):
+        return project(result, fields)
+    offset = arguments.get("offset", 0)
+    limit = arguments.get("limit")
+    paged = "limit" in arguments or "offset" in arguments
+    page = items[offset:offset + limit] if limit is not None else items[offset:]
+    page = [project(item, fields) for item in page]
+    if kind == "list":
+        return {"total": len(items), "offset": offset, "returned": len(page), "items": page} if paged else page
+    result = dict(result)
+    result[kind] = page
+    if paged:
+        result.update({f"{kind}_total": len(items), "offset": offset, "returned": len(page)})
+    return result
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return dumps(value)
+    return str(value).replace('\t', ' ').replace('\n', ' ')
+
+def table(value: Any) -> str:
+    """Terse tab-separated text: a header row and one row per item"""
+    if isinstance(value, list):
+        if not all(isinstance(item, dict) for item in value):
+            return '\n'.join(_cell(item) for item in value)
+        columns = list(dict.fromkeys(key for item in value for key in item))
+        rows = ['\t'.join(columns)]
+        rows.extend('\t'.join(_cell(item.get(column)) for column in columns) for item in value)
+        return '\n'.join(rows)
+    if isinstance(value, dict):
+        lines = [f"{key}\t{_cell(item)}" for key, item in value.items() if not isinstance(item, list)]
+        for key, item in value.items():
+            if isinstance(item, list):
+                lines.extend(['', f"{key}:", table(item)])
+        return '\n'.join(lines)
+    return _cell(value)
+
+def render(result: Any, arguments: Dict, kind: Optional[str] = None) -> str:
+    """Tool result as text in the requested format"""
+    result = shape(result, kind, arguments)
+    fmt = arguments.get("format") or default_format()
+    if fmt == 'table':
+        return table(result)
+    return dumps(result, pretty=fmt == 'pretty')
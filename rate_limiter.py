@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Rate limit scheduler for the Common Room API
+Tracks quota from X-RateLimit-* response headers and paces requests to stay under it
+"""
+
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+# Reset values below this are relative seconds, above it epoch seconds
+EPOCH_THRESHOLD = 1_000_000_000
+
+def parse_reset(value: Optional[str], now: float) -> Optional[float]:
+    """Parse a reset/Retry-After header (seconds, epoch seconds or a date) to an epoch time"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+        return seconds if seconds > EPOCH_THRESHOLD else now + seconds
+    except ValueError:
+        pass
+    try:
+        when = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.timestamp()
+
+def _header_int(headers: Mapping[str, str], name: str) -> Optional[int]:
+    value = headers.get(name)
+    try:
+        return int(float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+class RateLimiter:
+    def __init__(self, reserve: int = 0, default_interval: float = 60.0,
+                 clock: Callable[[], float] = time.time, name: Optional[str] = None):
+        self.name = name
+        self.reserve = reserve
+        self.default_interval = default_interval
+        self.clock = clock
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[float] = None
+        self.throttled_responses = 0
+        self.waits = 0
+        self.total_wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, headers: Mapping[str, str], status_code: int):
+        """Record the quota reported by an API response"""
+        now = self.clock()
+        with self._lock:
+            limit = _header_int(headers, 'X-RateLimit-Limit')
+            remaining = _header_int(headers, 'X-RateLimit-Remaining')
+            reset_at = (parse_reset(headers.get('X-RateLimit-Reset'), now)
+                        or parse_reset(headers.get('RateLimit-Reset'), now))
+            if limit is not None:
+                self.limit = limit
+            if remaining is not None:
+                self.remaining = remaining
+            if reset_at is not None:
+                self.reset_at = reset_at
+
+            if status_code == 429:
+                self.throttled_responses += 1
+                self.remaining = 0
+                retry_at = parse_reset(headers.get('Retry-After'), now)
+                self.reset_at = max(filter(None, (self.reset_at, retry_at)), default=None)
+
+            # Exhausted without a known reset: wait out one default interval
+            if self.remaining is not None and self.remaining <= self.reserve and self.reset_at is None:
+                self.reset_at = now + self.default_interval
+
+    def reserve_slot(self) -> float:
+        """Take one request from the quota; returns seconds to wait when none is left"""
+        now = self.clock()
+        with self._lock:
+            if self.reset_at is not None and now >= self.reset_at:
+                # New interval: quota refills to the last known limit
+                self.remaining = self.limit
+                self.reset_at = None
+            if self.remaining is None:
+                return 0.0
+            if self.remaining > self.reserve:
+                self.remaining -= 1
+                return 0.0
+            return max(self.reset_at - now, 0.0) if self.reset_at is not None else 0.0
+
+    def _record_wait(self, delay: float):
+        with self._lock:
+            self.waits += 1
+            self.total_wait_seconds += delay
+
+    async def acquire(self):
+        """Wait (without blocking the event loop) until a request may be sent"""
+        while True:
+            delay = self.reserve_slot()
+            if delay <= 0:
+                return
+            self._record_wait(delay)
+            await asyncio.sleep(delay)
+
+    def acquire_sync(self):
+        """Blocking variant of acquire() for the sync client"""
+        while True:
+            delay = self.reserve_slot()
+            if delay <= 0:
+                return
+            self._record_wait(delay)
+            time.sleep(delay)
+
+    def headroom(self) -> Dict[str, Any]:
+        """Current quota as last reported by the API"""
+        now = self.clock()
+        with self._lock:
+            reset_in = max(self.reset_at - now, 0.0) if self.reset_at is not None else None
+            return {
+                'tenant': self.name,
+                'limit': self.limit,
+                'remaining': self.remaining,
+                'reserve': self.reserve,
+                'utilization': round(1 - self.remaining / self.limit, 3)
+                               if self.limit and self.remaining is not None else None,
+                'reset_at': datetime.fromtimestamp(self.reset_at, timezone.utc).isoformat()
+                            if self.reset_at is not None else None,
+                'reset_in_seconds': round(reset_in, 3) if reset_in is not None else None,
+                'throttled_responses': self.throttled_responses,
+                'waits': self.waits,
+                'total_wait_seconds': round(self.total_wait_seconds, 3),
+            }
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(api_key: str, reserve: int = 0, name: Optional[str] = None) -> RateLimiter:
+    """One limiter per API key, shared by every client using that key
+
+    The API counts quota per key, so each tenant's key has its own budget.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(api_key)
+        if limiter is None:
+            limiter = _limiters[api_key] = RateLimiter(reserve=reserve, name=name)
+        return limiter
+
+def rate_limiters() -> List[RateLimiter]:
+    """Every limiter created so far, one per API key"""
+    with _limiters_lock:
+        return list(_limiters.values())
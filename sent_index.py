@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Persistent index of records already acknowledged by the Common Room API
+Lets replays and overlapping imports skip writes that would change nothing
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from config import getenv
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.commonroom_sent.db')
+
+def payload_digest(payload: Any) -> str:
+    """Stable hash of a JSON payload (key order does not matter)"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+class SentIndex:
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS sent (
+                destination TEXT NOT NULL,
+                record_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                sent_at REAL NOT NULL,
+                PRIMARY KEY (destination, record_id)
+            )
+        """)
+        self.skipped = 0
+
+    def contains(self, destination: str, record_id: str, digest: str) -> bool:
+        """True if this exact payload was already acknowledged for this record"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT digest FROM sent WHERE destination = ? AND record_id = ?",
+                (str(destination), record_id),
+            ).fetchone()
+            if row is not None and row[0] == digest:
+                self.skipped += 1
+                return True
+            return False
+
+    def add(self, destination: str, record_id: str, kind: str, digest: str):
+        """Remember an acknowledged write (replaces an older payload for the same record)"""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sent (destination, record_id, kind, digest, sent_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (str(destination), record_id, kind, digest, time.time()),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._db.execute("SELECT kind, COUNT(*) FROM sent GROUP BY kind").fetchall()
+        return {'path': self.path, 'records': dict(rows), 'skipped_this_process': self.skipped}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+_indexes: Dict[str, SentIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_sent_index(path: Optional[str] = None) -> SentIndex:
+    """One index per database file, shared by every client in the process"""
+    path = path or getenv('COMMONROOM_SENT_INDEX', DEFAULT_INDEX_PATH)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = SentIndex(path)
+        return index
@@ -4,289 +4,1034 @@ Common Room MCP Server
 Compatible with Q CLI and Claude Code
 """
 
+import argparse
 import asyncio
-import json
+import logging
+import os
 import sys
-import uuid
 import time
-from typing import Sequence
+from typing import List, Optional, Sequence, Set
 from mcp.server import Server
 from mcp.server.models import InitializationOptions
 from mcp.server.stdio import stdio_server
-from mcp.types import Tool, TextContent
-from commonroom_client import CommonRoomClient
-from version_checker import background_version_check
+from mcp.types import TextContent
+from config import env_bool, env_float, env_int, getenv
+from logs import configure_logging, get_logger, new_request_id, request_id
+from metrics import export_metrics, get_metrics
+from output import render
+from tenants import UnknownTenant, get_tenants
+from tool_registry import ToolInputError, ToolRegistry
+from write_queue import enqueue_write, ensure_worker, get_write_queue, queue_path, stop_worker
+
+# commonroom_client (and with it the HTTP stack and .env) is imported on the first
+# tool call that needs it, so initialize and tools/list are answered without it
 
 app = Server("commonroom")
+registry = ToolRegistry()
+log = get_logger("server")
 
-@app.list_tools()
-async def handle_list_tools() -> list[Tool]:
-    return [
-        Tool(
-            name="commonroom_get_activity_types",
-            description="Get all available Common Room activity types (article, webinar, presentation, etc.)",
-            inputSchema={
-                "type": "object", 
-                "properties": {},
-                "additionalProperties": False
-            }
-        ),
-        Tool(
-            name="commonroom_get_api_sources_url",
-            description="Get URL for Common Room API sources configuration page",
-            inputSchema={
-                "type": "object", 
-                "properties": {},
-                "additionalProperties": False
-            }
-        ),
-        Tool(
-            name="commonroom_get_api_tokens_url",
-            description="Get URL for Common Room API tokens configuration page",
-            inputSchema={
-                "type": "object", 
-                "properties": {},
-                "additionalProperties": False
-            }
-        ),
-        Tool(
-            name="commonroom_get_sources_url", 
-            description="Get URL for Common Room sources configuration page",
-            inputSchema={
-                "type": "object", 
-                "properties": {},
-                "additionalProperties": False
-            }
-        ),
-        Tool(
-            name="commonroom_get_segments", 
-            description="Get all Common Room audience segments for targeting and analysis",
-            inputSchema={
-                "type": "object", 
-                "properties": {},
-                "additionalProperties": False
+# Tool calls running now, across every session; bounded by COMMONROOM_MAX_TOOL_CALLS
+_tool_slots: Optional[asyncio.Semaphore] = None
+_in_flight = 0
+
+ACTIVITY_OPERATION = "POST /source/{destinationSourceId}/activity"
+USER_OPERATION = "POST /source/{destinationSourceId}/user"
+
+def write_behind(arguments: dict) -> bool:
+    """Queue writes when asked to, or when COMMONROOM_WRITE_MODE=behind"""
+    default = getenv("COMMONROOM_WRITE_MODE", "direct").strip().lower() == "behind"
+    return arguments.get("write_behind", default)
+
+def queue_write(client, kind: str, arguments: dict, payload: dict) -> str:
+    """Persist a prepared write for the background worker and return its receipt"""
+    destination = client._resolve_destination(arguments.get("destination_source_id"))
+    return enqueue_write(kind, destination, payload, client.tenant.name)
+
+async def activity_type_ids(client, fetch: bool = True) -> Optional[Set[str]]:
+    """Accepted activityType values from the cached list, or None if it is not available
+    
+    With fetch=False only an already cached list is used, so queued writes never wait on the API.
+    """
+    try:
+        types = await client.get_activity_types() if fetch else client._cached_reference("/activityTypes", False)
+    except Exception:
+        return None  # let the API judge the activity type
+    if not isinstance(types, list):
+        return None
+    return {item.get("id") for item in types if isinstance(item, dict)}
+
+def validate_activity(activity: dict, known_types: Optional[Set[str]], root: str = ""):
+    """Check a prepared activity against the ApiActivity schema and the known activity types"""
+    registry.validate_body(ACTIVITY_OPERATION, activity, root)
+    if known_types and activity["activityType"] not in known_types:
+        path = f"{root}.activityType" if root else "activityType"
+        raise ToolInputError(f"{path}: {activity['activityType']!r} is not a known activity type "
+                             f"(one of: {', '.join(sorted(known_types))})")
+
+@registry.tool(
+    "commonroom_get_activity_types",
+    "Get all available Common Room activity types (article, webinar, presentation, etc.)",
+    properties={
+        "refresh": {
+            "type": "boolean",
+            "description": "Bypass the local cache and fetch fresh data from the API",
+            "default": False
+        }
+    },
+    operations=("GET /activityTypes",),
+    output="list",
+)
+async def get_activity_types(client, arguments: dict):
+    return await client.get_activity_types(arguments.get("refresh", False))
+
+@registry.tool(
+    "commonroom_get_api_sources_url",
+    "Get URL for Common Room API sources configuration page",
+)
+async def get_api_sources_url(client, arguments: dict):
+    return {"url": client.get_api_sources_url()}
+
+@registry.tool(
+    "commonroom_get_api_tokens_url",
+    "Get URL for Common Room API tokens configuration page",
+)
+async def get_api_tokens_url(client, arguments: dict):
+    return {"url": client.get_api_tokens_url()}
+
+@registry.tool(
+    "commonroom_get_sources_url",
+    "Get URL for Common Room sources configuration page",
+)
+async def get_sources_url(client, arguments: dict):
+    return {"url": client.get_sources_url()}
+
+@registry.tool(
+    "commonroom_get_segments",
+    "Get all Common Room audience segments for targeting and analysis",
+    properties={
+        "refresh": {
+            "type": "boolean",
+            "description": "Bypass the local cache and fetch fresh data from the API",
+            "default": False
+        }
+    },
+    operations=("GET /segments",),
+    output="list",
+)
+async def get_segments(client, arguments: dict):
+    return await client.get_segments(arguments.get("refresh", False))
+
+@registry.tool(
+    "commonroom_get_tags",
+    "Get all Common Room tags used for categorizing activities and users",
+    properties={
+        "refresh": {
+            "type": "boolean",
+            "description": "Bypass the local cache and fetch fresh data from the API",
+            "default": False
+        }
+    },
+    operations=("GET /tags",),
+    output="labels",
+)
+async def get_tags(client, arguments: dict):
+    return await client.get_tags(arguments.get("refresh", False))
+
+TAG_ENTITY_TYPES_PROPERTY = {
+    "type": "array",
+    "description": "Record types the tag may be assigned to (default: all)",
+    "items": {
+        "type": "string",
+        "enum": ["member", "activity", "company"]
+    },
+    "minItems": 1
+}
+
+@registry.tool(
+    "commonroom_create_tag",
+    "Create a Common Room tag (use commonroom_get_or_create_tag to reuse an existing tag with the same name)",
+    properties={
+        "name": {
+            "type": "string",
+            "description": "Tag name",
+            "minLength": 1
+        },
+        "entity_types": TAG_ENTITY_TYPES_PROPERTY,
+        "description": {
+            "type": "string",
+            "description": "Optional description"
+        }
+    },
+    required=["name"],
+    operations=("POST /tags",),
+    output="record",
+)
+async def create_tag(client, arguments: dict):
+    return await client.create_tag(arguments["name"], arguments.get("entity_types"), arguments.get("description"))
+
+@registry.tool(
+    "commonroom_get_or_create_tag",
+    "Get a Common Room tag by name (case-insensitive, answered from the local tag index), creating it if it does not exist",
+    properties={
+        "name": {
+            "type": "string",
+            "description": "Tag name",
+            "minLength": 1
+        },
+        "entity_types": TAG_ENTITY_TYPES_PROPERTY,
+        "description": {
+            "type": "string",
+            "description": "Description used if the tag is created"
+        }
+    },
+    required=["name"],
+    output="record",
+)
+async def get_or_create_tag(client, arguments: dict):
+    return await client.get_or_create_tag(arguments["name"], arguments.get("entity_types"),
+                                          arguments.get("description"))
+
+@registry.tool(
+    "commonroom_update_tag",
+    "Rename a Common Room tag or change its description (restores a deleted tag)",
+    properties={
+        "tag_id": {
+            "type": "string",
+            "description": "Tag ID"
+        },
+        "name": {
+            "type": "string",
+            "description": "New name (default: keep the current name)",
+            "minLength": 1
+        },
+        "description": {
+            "type": "string",
+            "description": "New description"
+        }
+    },
+    required=["tag_id"],
+    operations=("POST /tags/{id}",),
+    output="record",
+)
+async def update_tag(client, arguments: dict):
+    return await client.update_tag(arguments["tag_id"], arguments.get("name"), arguments.get("description"))
+
+@registry.tool(
+    "commonroom_delete_tag",
+    "Delete a Common Room tag, removing it from every record it is assigned to",
+    properties={
+        "tag_id": {
+            "type": "string",
+            "description": "Tag ID"
+        }
+    },
+    required=["tag_id"],
+    operations=("DELETE /tags/{id}",),
+)
+async def delete_tag(client, arguments: dict):
+    return await client.delete_tag(arguments["tag_id"])
+
+@registry.tool(
+    "commonroom_tag_users",
+    "Assign tags by name to many contacts at once; tag names are resolved to ids once from the local tag index (missing tags are created unless create_missing is false)",
+    properties={
+        "emails": {
+            "type": "array",
+            "description": "Email addresses of the contacts to tag",
+            "items": {
+                "type": "string"
+            },
+            "minItems": 1
+        },
+        "tags": {
+            "type": "array",
+            "description": "Tag names",
+            "items": {
+                "type": "string"
+            },
+            "minItems": 1
+        },
+        "destination_source_id": {
+            "type": "string",
+            "description": "Common Room destination source ID for the contacts"
+        },
+        "create_missing": {
+            "type": "boolean",
+            "description": "Create tags that do not exist yet",
+            "default": True
+        },
+        "concurrency": {
+            "type": "integer",
+            "description": "Maximum writes in flight at once (capped by COMMONROOM_MAX_CONCURRENCY)",
+            "minimum": 1
+        }
+    },
+    required=["emails", "tags"],
+    output="results",
+)
+async def tag_users(client, arguments: dict):
+    try:
+        return await client.tag_users(arguments.get("destination_source_id"), arguments["emails"],
+                                      arguments["tags"], arguments.get("create_missing", True),
+                                      arguments.get("concurrency"))
+    except LookupError as e:
+        raise ToolInputError(str(e))
+
+@registry.tool(
+    "commonroom_get_custom_fields",
+    "Get all Common Room contact custom fields",
+    properties={
+        "refresh": {
+            "type": "boolean",
+            "description": "Bypass the local cache and fetch fresh data from the API",
+            "default": False
+        }
+    },
+    operations=("GET /members/customFields",),
+    output="list",
+)
+async def get_custom_fields(client, arguments: dict):
+    return await client.get_custom_fields(arguments.get("refresh", False))
+
+@registry.tool(
+    "commonroom_get_cache_stats",
+    "Get hit/miss counters and TTLs for the local reference data cache",
+)
+async def get_cache_stats(client, arguments: dict):
+    return client.cache_stats()
+
+@registry.tool(
+    "commonroom_get_rate_limit",
+    "Get current Common Room API rate limit headroom (limit, remaining, reset time, throttling so far)",
+)
+async def get_rate_limit(client, arguments: dict):
+    return client.rate_limiter.headroom()
+
+@registry.tool(
+    "commonroom_list_tenants",
+    "List the Common Room communities (tenants) this server can act on, with their dashboard URL and default destination source; pass a name as the tenant argument of any tool",
+    output="list",
+)
+async def list_tenants(client, arguments: dict):
+    return get_tenants().list()
+
+@registry.tool(
+    "commonroom_get_write_queue_status",
+    "Get write-behind queue depth, recent failures and the status of given receipts",
+    properties={
+        "receipts": {
+            "type": "array",
+            "description": "Receipts returned by queued commonroom_add_activity / commonroom_add_user calls",
+            "items": {
+                "type": "string"
             }
-        ),
-        Tool(
-            name="commonroom_get_tags",
-            description="Get all Common Room tags used for categorizing activities and users", 
-            inputSchema={
-                "type": "object", 
-                "properties": {},
-                "additionalProperties": False
+        }
+    },
+)
+async def get_write_queue_status(client, arguments: dict):
+    return get_write_queue().status(arguments.get("receipts"))
+
+@registry.tool(
+    "commonroom_server_stats",
+    "Get server metrics: calls and latency percentiles per tool, requests, HTTP statuses, bytes and latency per API endpoint, time spent waiting on rate limits and concurrency slots, and rate limit headroom",
+    properties={
+        "reset": {
+            "type": "boolean",
+            "description": "Clear the counters after reading them",
+            "default": False
+        }
+    },
+    output="record",
+)
+async def server_stats(client, arguments: dict):
+    metrics = get_metrics()
+    stats = metrics.snapshot()
+    if arguments.get("reset"):
+        metrics.reset()
+    return stats
+
+@registry.tool(
+    "commonroom_add_contacts_to_segment",
+    "Add any number of contacts (e.g. event attendees from a CSV or earlier lookup) to a Common Room segment; sent in concurrent chunks with per-chunk results",
+    properties={
+        "segment_id": {
+            "type": "string",
+            "description": "Segment ID to add contacts to"
+        },
+        "contacts": {
+            "type": [
+                "array",
+                "string"
+            ],
+            "description": "Contact identifiers as a list, or as one comma/newline separated string",
+            "items": {
+                "type": "string"
             }
-        ),
-        Tool(
-            name="commonroom_get_user",
-            description="Get Common Room user profile and activity data by email address",
-            inputSchema={
+        },
+        "social_type": {
+            "type": "string",
+            "description": "Identifier type of the contacts",
+            "enum": [
+                "email",
+                "twitter",
+                "github",
+                "linkedin"
+            ],
+            "default": "email"
+        },
+        "status_id": {
+            "type": "integer",
+            "description": "Optional segment status ID (see commonroom_get_segment_statuses)"
+        },
+        "chunk_size": {
+            "type": "integer",
+            "description": "Contacts per API request (default COMMONROOM_SEGMENT_CHUNK_SIZE or 100)",
+            "minimum": 1
+        },
+        "concurrency": {
+            "type": "integer",
+            "description": "Maximum chunks in flight at once (capped by COMMONROOM_MAX_CONCURRENCY)",
+            "minimum": 1
+        }
+    },
+    required=["segment_id", "contacts"],
+    operations=("POST /segments/{id}",),
+)
+async def add_contacts_to_segment(client, arguments: dict):
+    contacts = arguments["contacts"]
+    if isinstance(contacts, str):
+        contacts = contacts.replace("\n", ",").split(",")
+    return await client.add_contacts_to_segment(
+        arguments["segment_id"],
+        contacts,
+        social_type=arguments.get("social_type", "email"),
+        status_id=arguments.get("status_id"),
+        chunk_size=arguments.get("chunk_size"),
+        concurrency=arguments.get("concurrency"),
+    )
+
+@registry.tool(
+    "commonroom_get_segment_statuses",
+    "Get the statuses a contact can be given in a Common Room segment",
+    properties={
+        "segment_id": {
+            "type": "string",
+            "description": "Segment ID"
+        }
+    },
+    required=["segment_id"],
+    operations=("GET /segments/{id}/status",),
+    output="list",
+)
+async def get_segment_statuses(client, arguments: dict):
+    return await client.get_segment_statuses(arguments["segment_id"])
+
+@registry.tool(
+    "commonroom_get_user",
+    "Get Common Room user profile and activity data by email address",
+    properties={
+        "email": {
+            "type": "string",
+            "description": "Email address of the user to look up"
+        },
+        "refresh": {
+            "type": "boolean",
+            "description": "Bypass the local contact cache",
+            "default": False
+        }
+    },
+    required=["email"],
+    operations=("GET /user/{email}",),
+    output="record",
+)
+async def get_user(client, arguments: dict):
+    return await client.get_user_by_email(arguments["email"], arguments.get("refresh", False))
+
+@registry.tool(
+    "commonroom_get_users",
+    "Get Common Room user profiles for many email addresses at once (looked up in parallel, cached)",
+    properties={
+        "emails": {
+            "type": "array",
+            "description": "Email addresses to look up",
+            "items": {
+                "type": "string"
+            },
+            "minItems": 1
+        },
+        "concurrency": {
+            "type": "integer",
+            "description": "Maximum lookups in flight at once (capped by COMMONROOM_MAX_CONCURRENCY)",
+            "minimum": 1
+        },
+        "refresh": {
+            "type": "boolean",
+            "description": "Bypass the local contact cache",
+            "default": False
+        }
+    },
+    required=["emails"],
+    output="results",
+)
+async def get_users(client, arguments: dict):
+    return await client.get_users(arguments["emails"], arguments.get("concurrency"),
+                                  arguments.get("refresh", False))
+
+@registry.tool(
+    "commonroom_resolve_contact",
+    "Find a Common Room contact by any mix of email, GitHub, Twitter or LinkedIn identifiers (repeat lookups by any known alias are answered locally)",
+    properties={
+        "email": {
+            "type": "string",
+            "description": "Email address"
+        },
+        "github": {
+            "type": "string",
+            "description": "GitHub username or profile URL"
+        },
+        "twitter": {
+            "type": "string",
+            "description": "Twitter/X handle or profile URL"
+        },
+        "linkedin": {
+            "type": "string",
+            "description": "LinkedIn handle (in/username) or profile URL"
+        },
+        "refresh": {
+            "type": "boolean",
+            "description": "Bypass the local identity index",
+            "default": False
+        }
+    },
+    minProperties=1,
+    operations=("GET /members",),
+    output="record",
+)
+async def resolve_contact(client, arguments: dict):
+    return await client.resolve_contact(
+        email=arguments.get("email"),
+        github=arguments.get("github"),
+        twitter=arguments.get("twitter"),
+        linkedin=arguments.get("linkedin"),
+        refresh=arguments.get("refresh", False),
+    )
+
+@registry.tool(
+    "commonroom_search_local",
+    "Search contacts already fetched from Common Room (user lookups, /members), by name/company/title text, organization, segment, tag or recent activity, without calling the API. Needs COMMONROOM_CONTACT_STORE_ENABLED=true",
+    properties={
+        "query": {
+            "type": "string",
+            "description": "Words matched (as prefixes) against name, email, organization, title, segments, tags and bio"
+        },
+        "organization": {
+            "type": "string",
+            "description": "Exact organization name (case-insensitive)"
+        },
+        "segment": {
+            "type": "string",
+            "description": "Segment name the contact is in"
+        },
+        "tag": {
+            "type": "string",
+            "description": "Tag name on the contact"
+        },
+        "email": {
+            "type": "string",
+            "description": "Email address"
+        },
+        "active_since": {
+            "type": "string",
+            "description": "ISO date; only contacts last active on or after it"
+        },
+        "max_results": {
+            "type": "integer",
+            "description": "Most matches returned, most recently active first",
+            "minimum": 1,
+            "maximum": 500,
+            "default": 50
+        },
+        "refresh_stale": {
+            "type": "boolean",
+            "description": "Re-fetch matches older than COMMONROOM_CONTACT_STORE_MAX_AGE before answering",
+            "default": True
+        }
+    },
+    output="results",
+)
+async def search_local(client, arguments: dict):
+    if client.contact_store is None:
+        raise ToolInputError("the local contact store is off; set COMMONROOM_CONTACT_STORE_ENABLED=true")
+    filters = {key: arguments[key] for key in ("organization", "segment", "tag", "email", "active_since")
+               if arguments.get(key)}
+    return await client.search_local(arguments.get("query"), arguments.get("refresh_stale", True),
+                                     arguments.get("max_results", 50), **filters)
+
+@registry.tool(
+    "commonroom_add_activity",
+    "Add a new activity record to Common Room (blog post, webinar, conference talk, etc.). IDs are generated unless activity.id / activity.user.id are given; pass back the returned IDs to retry without creating duplicates",
+    properties={
+        "destination_source_id": {
+            "type": "string",
+            "description": "Common Room destination source ID for the activity"
+        },
+        "activity": {
+            "type": "object",
+            "description": "Activity data including activityType, user info, title, content, url, timestamp",
+            "properties": {
+                "activityType": {"type": "string", "description": "Activity type ID (see commonroom_get_activity_types)"},
+                "user": {"type": "object", "description": "User who performed the activity (same fields as commonroom_add_user)"}
+            },
+            "required": ["activityType", "user"],
+            "additionalProperties": True
+        },
+        "write_behind": {
+            "type": "boolean",
+            "description": "Queue the write durably and return a receipt immediately instead of waiting for the API (default from COMMONROOM_WRITE_MODE)"
+        }
+    },
+    required=["activity"],
+    operations=("POST /source/{destinationSourceId}/activity",),
+)
+async def add_activity(client, arguments: dict):
+    from commonroom_client import with_generated_ids
+    # Auto-generate activity ID and user ID
+    activity_data = with_generated_ids(arguments["activity"])
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("add_activity prepared", extra={"fields": {
+            "activity": activity_data, "write_behind": write_behind(arguments)}})
+    validate_activity(activity_data, await activity_type_ids(client, fetch=not write_behind(arguments)), "activity")
+    # Return the IDs so a re-issued call can reuse them instead of duplicating the record
+    result = {"activity_id": activity_data["id"], "user_id": activity_data["user"]["id"]}
+    if write_behind(arguments):
+        result["receipt"] = queue_write(client, "activity", arguments, activity_data)
+        result["status"] = "queued"
+    else:
+        result["response"] = await client.add_activity(arguments.get("destination_source_id"), activity_data)
+    return result
+
+@registry.tool(
+    "commonroom_add_activities_bulk",
+    "Add many activity records to Common Room in one call (e.g. all attendees of an event), posted in parallel with per-item status (created, retried, skipped, failed)",
+    properties={
+        "destination_source_id": {
+            "type": "string",
+            "description": "Common Room destination source ID for the activities"
+        },
+        "activities": {
+            "type": "array",
+            "description": "Activity objects, each shaped like the commonroom_add_activity activity argument",
+            "items": {
                 "type": "object",
-                "properties": {
-                    "email": {
-                        "type": "string",
-                        "description": "Email address of the user to look up"
-                    }
-                },
-                "required": ["email"],
-                "additionalProperties": False
+                "additionalProperties": True
+            },
+            "minItems": 1
+        },
+        "concurrency": {
+            "type": "integer",
+            "description": "Maximum activities posted at once (capped by COMMONROOM_MAX_CONCURRENCY)",
+            "minimum": 1
+        },
+        "max_retries": {
+            "type": "integer",
+            "description": "Retries per activity for rate limiting, server and network errors",
+            "minimum": 0,
+            "maximum": 5,
+            "default": 1
+        }
+    },
+    required=["activities"],
+    operations=("POST /source/{destinationSourceId}/activity",),
+)
+async def add_activities_bulk(client, arguments: dict):
+    known_types = await activity_type_ids(client)
+    return await client.add_activities_bulk(
+        arguments.get("destination_source_id"),
+        arguments["activities"],
+        concurrency=arguments.get("concurrency"),
+        max_retries=arguments.get("max_retries", 1),
+        validate=lambda activity: validate_activity(activity, known_types),
+    )
+
+@registry.tool(
+    "commonroom_import_file",
+    "Import activities or users from a local CSV or JSONL file of any size (e.g. an event attendee export). Rows are streamed, mapped onto the commonroom_add_activity / commonroom_add_user payload, validated and posted with bounded concurrency; a checkpoint lets an interrupted import resume where it stopped, and rejected rows are written to a rejects file (returned in the summary). Requires COMMONROOM_IMPORT_DIR",
+    properties={
+        "path": {
+            "type": "string",
+            "description": "Path of the .csv or .jsonl file inside COMMONROOM_IMPORT_DIR (absolute, or relative to it)"
+        },
+        "kind": {
+            "type": "string",
+            "description": "Whether each row is an activity or a user",
+            "enum": [
+                "activity",
+                "user"
+            ],
+            "default": "activity"
+        },
+        "mapping": {
+            "type": "object",
+            "description": "Payload field (dotted path such as user.email or activityTitle.value) -> column name, or a template such as \"{First} {Last}\". Without it, column names are used as payload paths",
+            "additionalProperties": {
+                "type": "string"
             }
-        ),
-        Tool(
-            name="commonroom_add_activity",
-            description="Add a new activity record to Common Room (blog post, webinar, conference talk, etc.)",
-            inputSchema={
-                "type": "object", 
-                "properties": {
-                    "destination_source_id": {
-                        "type": "string",
-                        "description": "Common Room destination source ID for the activity"
-                    },
-                    "activity": {
-                        "type": "object",
-                        "description": "Activity data including activityType, user info, title, content, url, timestamp",
-                        "additionalProperties": True
-                    }
+        },
+        "defaults": {
+            "type": "object",
+            "description": "Fields set on every payload before mapping, e.g. {\"activityType\": \"webinar\", \"activityTitle\": {\"type\": \"text\"}}"
+        },
+        "file_format": {
+            "type": "string",
+            "description": "File format (default from the file extension)",
+            "enum": [
+                "csv",
+                "jsonl"
+            ]
+        },
+        "destination_source_id": {
+            "type": "string",
+            "description": "Common Room destination source ID"
+        },
+        "concurrency": {
+            "type": "integer",
+            "description": "Maximum rows posted at once (capped by COMMONROOM_MAX_CONCURRENCY)",
+            "minimum": 1
+        },
+        "max_rows": {
+            "type": "integer",
+            "description": "Stop after this many rows; call again to continue from the checkpoint",
+            "minimum": 1
+        },
+        "restart": {
+            "type": "boolean",
+            "description": "Ignore the checkpoint and import from the first row",
+            "default": False
+        },
+        "dry_run": {
+            "type": "boolean",
+            "description": "Map and validate every row without posting or checkpointing",
+            "default": False
+        }
+    },
+    required=["path"],
+)
+async def import_file(client, arguments: dict):
+    from importer import import_file as run_import
+    known_types = await activity_type_ids(client) if arguments.get("kind", "activity") == "activity" else None
+
+    def validate(kind: str, payload: dict):
+        if kind == "activity":
+            validate_activity(payload, known_types)
+        else:
+            registry.validate_body(USER_OPERATION, payload)
+
+    return await run_import(
+        client,
+        arguments["path"],
+        kind=arguments.get("kind", "activity"),
+        mapping=arguments.get("mapping"),
+        defaults=arguments.get("defaults"),
+        destination_source_id=arguments.get("destination_source_id"),
+        fmt=arguments.get("file_format"),
+        concurrency=arguments.get("concurrency"),
+        max_rows=arguments.get("max_rows"),
+        restart=arguments.get("restart", False),
+        dry_run=arguments.get("dry_run", False),
+        validate=validate,
+    )
+
+@registry.tool(
+    "commonroom_add_user",
+    "Add or update a user profile in Common Room. The ID is generated unless user.id is given; pass back the returned user_id to retry without creating duplicates",
+    properties={
+        "destination_source_id": {
+            "type": "string",
+            "description": "Common Room destination source ID"
+        },
+        "user": {
+            "type": "object",
+            "description": "User data - provide any combination of email, social handles, name, company, etc.",
+            "properties": {
+                "id": {
+                    "type": "string",
+                    "description": "Existing user ID from a previous call (omit to generate one)"
                 },
-                "required": ["activity"],
-                "additionalProperties": False
-            }
-        ),
-        Tool(
-            name="commonroom_add_user",
-            description="Add or update a user profile in Common Room",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "destination_source_id": {
-                        "type": "string",
-                        "description": "Common Room destination source ID"
-                    },
-                    "user": {
-                        "type": "object",
-                        "description": "User data - provide any combination of email, social handles, name, company, etc.",
-                        "properties": {
-                            "email": {"type": "string", "description": "User email address"},
-                            "fullName": {"type": "string", "description": "User's full name"},
-                            "companyName": {"type": "string", "description": "User's company"},
-                            "titleAtCompany": {"type": "string", "description": "User's job title"},
-                            "twitterUsername": {"type": "string", "description": "Twitter/X username (without @)"},
-                            "linkedinUrl": {"type": "string", "description": "LinkedIn profile URL"},
-                            "githubUsername": {"type": "string", "description": "GitHub username"},
-                            "discordUsername": {"type": "string", "description": "Discord username"},
-                            "slackUserId": {"type": "string", "description": "Slack user ID"},
-                            "location": {"type": "string", "description": "User location"},
-                            "bio": {"type": "string", "description": "User bio/description"}
-                        }
-                    }
+                "email": {
+                    "type": "string",
+                    "description": "User email address"
                 },
-                "required": ["user"],
-                "additionalProperties": False
-            }
-        ),
-        Tool(
-            name="commonroom_get_dashboard_urls",
-            description="Get URLs for all Common Room dashboard sections (home, segments, search, contacts, etc.). Requires COMMONROOM_BASE_URL in .env file.",
-            inputSchema={
-                "type": "object",
-                "properties": {},
-                "additionalProperties": False
-            }
-        ),
-        Tool(
-            name="commonroom_get_member_url",
-            description="Get URL for individual Common Room member page",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "user_id": {
-                        "type": "string",
-                        "description": "User ID for the member page"
-                    },
-                    "show_activity": {
-                        "type": "boolean",
-                        "description": "If true, returns URL to member's activity page instead of overview",
-                        "default": False
-                    }
+                "fullName": {
+                    "type": "string",
+                    "description": "User's full name"
                 },
-                "required": ["user_id"],
-                "additionalProperties": False
-            }
-        ),
-        Tool(
-            name="commonroom_get_member_activity_url",
-            description="Get URL for individual Common Room member activity page (more detailed than overview)",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "user_id": {
-                        "type": "string",
-                        "description": "User ID for the member activity page"
-                    }
+                "companyName": {
+                    "type": "string",
+                    "description": "User's company"
                 },
-                "required": ["user_id"],
-                "additionalProperties": False
-            }
-        ),
-        Tool(
-            name="commonroom_get_organization_url", 
-            description="Get URL for individual Common Room organization page",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "org_id": {
-                        "type": "string",
-                        "description": "Organization ID for the organization page"
-                    }
+                "titleAtCompany": {
+                    "type": "string",
+                    "description": "User's job title"
                 },
-                "required": ["org_id"],
-                "additionalProperties": False
-            }
-        ),
-        Tool(
-            name="commonroom_get_segment_url",
-            description="Get URL for individual Common Room segment page", 
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "segment_id": {
-                        "type": "string",
-                        "description": "Segment ID for the segment page"
-                    }
+                "twitterUsername": {
+                    "type": "string",
+                    "description": "Twitter/X username (without @)"
+                },
+                "linkedinUrl": {
+                    "type": "string",
+                    "description": "LinkedIn profile URL"
+                },
+                "githubUsername": {
+                    "type": "string",
+                    "description": "GitHub username"
+                },
+                "discordUsername": {
+                    "type": "string",
+                    "description": "Discord username"
                 },
-                "required": ["segment_id"],
-                "additionalProperties": False
+                "slackUserId": {
+                    "type": "string",
+                    "description": "Slack user ID"
+                },
+                "location": {
+                    "type": "string",
+                    "description": "User location"
+                },
+                "bio": {
+                    "type": "string",
+                    "description": "User bio/description"
+                }
             }
-        )
-    ]
+        },
+        "write_behind": {
+            "type": "boolean",
+            "description": "Queue the write durably and return a receipt immediately instead of waiting for the API (default from COMMONROOM_WRITE_MODE)"
+        }
+    },
+    required=["user"],
+    operations=("POST /source/{destinationSourceId}/user",),
+)
+async def add_user(client, arguments: dict):
+    from commonroom_client import generate_user_id
+    # Auto-generate user ID
+    user_data = arguments["user"].copy()
+    user_data["id"] = user_data.get("id") or generate_user_id(user_data)
+    registry.validate_body(USER_OPERATION, user_data, "user")
+    
+    result = {"user_id": user_data["id"]}
+    if write_behind(arguments):
+        result["receipt"] = queue_write(client, "user", arguments, user_data)
+        result["status"] = "queued"
+    else:
+        result["response"] = await client.add_user(arguments.get("destination_source_id"), user_data)
+    return result
+
+@registry.tool(
+    "commonroom_get_dashboard_urls",
+    "Get URLs for all Common Room dashboard sections (home, segments, search, contacts, etc.). Requires COMMONROOM_BASE_URL in .env file.",
+)
+async def get_dashboard_urls(client, arguments: dict):
+    return client.get_dashboard_urls()
+
+@registry.tool(
+    "commonroom_get_member_url",
+    "Get URL for individual Common Room member page",
+    properties={
+        "user_id": {
+            "type": "string",
+            "description": "User ID for the member page"
+        },
+        "show_activity": {
+            "type": "boolean",
+            "description": "If true, returns URL to member's activity page instead of overview",
+            "default": False
+        }
+    },
+    required=["user_id"],
+)
+async def get_member_url(client, arguments: dict):
+    show_activity = arguments.get("show_activity", False)
+    return {"url": client.get_member_url(arguments["user_id"], show_activity)}
+
+@registry.tool(
+    "commonroom_get_member_activity_url",
+    "Get URL for individual Common Room member activity page (more detailed than overview)",
+    properties={
+        "user_id": {
+            "type": "string",
+            "description": "User ID for the member activity page"
+        }
+    },
+    required=["user_id"],
+)
+async def get_member_activity_url(client, arguments: dict):
+    return {"url": client.get_member_activity_url(arguments["user_id"])}
+
+@registry.tool(
+    "commonroom_get_organization_url",
+    "Get URL for individual Common Room organization page",
+    properties={
+        "org_id": {
+            "type": "string",
+            "description": "Organization ID for the organization page"
+        }
+    },
+    required=["org_id"],
+)
+async def get_organization_url(client, arguments: dict):
+    return {"url": client.get_organization_url(arguments["org_id"])}
+
+@registry.tool(
+    "commonroom_get_segment_url",
+    "Get URL for individual Common Room segment page",
+    properties={
+        "segment_id": {
+            "type": "string",
+            "description": "Segment ID for the segment page"
+        }
+    },
+    required=["segment_id"],
+)
+async def get_segment_url(client, arguments: dict):
+    return {"url": client.get_segment_url(arguments["segment_id"])}
+
+# Tools for spec operations not covered above; hot paths below are plain dict lookups
+registry.load_spec()
+
+@app.list_tools()
+async def handle_list_tools():
+    return registry.list_tools()
 
-@app.call_tool()
+# Arguments are checked with the registry's precompiled validators instead of per call
+@app.call_tool(validate_input=False)
 async def handle_call_tool(name: str, arguments: dict) -> Sequence[TextContent]:
+    handler = registry.get_handler(name)
+    if handler is None:
+        return [TextContent(type="text", text=f"Unknown tool: {name}")]
+    global _tool_slots, _in_flight
+    if _tool_slots is None:
+        _tool_slots = asyncio.Semaphore(max(env_int("COMMONROOM_MAX_TOOL_CALLS", 64), 1))
+        # .env is loaded by now; apply any COMMONROOM_LOG_* settings it holds
+        configure_logging()
+    started = time.perf_counter()
+    token = new_request_id()
+    _in_flight += 1
     try:
-        client = CommonRoomClient()
-        
-        if name == "commonroom_get_activity_types":
-            result = client.get_activity_types()
-        elif name == "commonroom_get_segments":
-            result = client.get_segments()
-        elif name == "commonroom_get_tags":
-            result = client.get_tags()
-        elif name == "commonroom_get_user":
-            result = client.get_user_by_email(arguments["email"])
-        elif name == "commonroom_add_activity":
-            print(f"DEBUG: add_activity called with arguments: {arguments}", file=sys.stderr)
-            # Auto-generate activity ID and user ID
-            activity_data = arguments["activity"].copy()
-            activity_data["id"] = f"activity_{int(time.time())}_{str(uuid.uuid4())[:8]}"
-            
-            # Auto-generate user ID and prepare user data
-            user_data = activity_data["user"].copy()
-            user_data["id"] = f"user_{int(time.time())}_{str(uuid.uuid4())[:8]}"
-            activity_data["user"] = user_data
-            
-            print(f"DEBUG: Generated activity data: {activity_data}", file=sys.stderr)
-            result = client.add_activity(arguments.get("destination_source_id"), activity_data)
-        elif name == "commonroom_add_user":
-            # Auto-generate user ID
-            user_data = arguments["user"].copy()
-            user_data["id"] = f"user_{int(time.time())}_{str(uuid.uuid4())[:8]}"
-            
-            result = client.add_user(arguments.get("destination_source_id"), user_data)
-        elif name == "commonroom_get_api_sources_url":
-            result = {"url": client.get_api_sources_url()}
-        elif name == "commonroom_get_api_tokens_url":
-            result = {"url": client.get_api_tokens_url()}
-        elif name == "commonroom_get_sources_url":
-            result = {"url": client.get_sources_url()}
-        elif name == "commonroom_get_dashboard_urls":
-            result = client.get_dashboard_urls()
-        elif name == "commonroom_get_member_url":
-            show_activity = arguments.get("show_activity", False)
-            result = {"url": client.get_member_url(arguments["user_id"], show_activity)}
-        elif name == "commonroom_get_member_activity_url":
-            result = {"url": client.get_member_activity_url(arguments["user_id"])}
-        elif name == "commonroom_get_organization_url":
-            result = {"url": client.get_organization_url(arguments["org_id"])}
-        elif name == "commonroom_get_segment_url":
-            result = {"url": client.get_segment_url(arguments["segment_id"])}
-        else:
-            return [TextContent(type="text", text=f"Unknown tool: {name}")]
-        
-        return [TextContent(type="text", text=json.dumps(result, indent=2))]
+        arguments = arguments or {}
+        registry.validate_arguments(name, arguments)
+        from commonroom_client import get_async_client
+        async with _tool_slots:
+            result = await handler(get_async_client(arguments.get("tenant")), arguments)
+        encoding = time.perf_counter()
+        text = render(result, arguments, registry.outputs.get(name))
+        finished = time.perf_counter()
+        get_metrics().observe_tool(name, "ok", finished - started, finished - encoding, len(text))
+        if log.isEnabledFor(logging.INFO):
+            log.info("tool call", extra={"fields": {"tool": name, "outcome": "ok",
+                                                    "ms": round((finished - started) * 1000, 2), "bytes": len(text)}})
+        return [TextContent(type="text", text=text)]
     
+    except (ToolInputError, UnknownTenant) as e:
+        get_metrics().observe_tool(name, "invalid", time.perf_counter() - started)
+        log.info("tool call", extra={"fields": {"tool": name, "outcome": "invalid"}})
+        return [TextContent(type="text", text=f"Invalid arguments for {name}: {e}")]
     except Exception as e:
+        get_metrics().observe_tool(name, "error", time.perf_counter() - started)
+        # Only the error type: messages can quote contact details
+        log.warning("tool call failed", extra={"fields": {"tool": name, "outcome": "error",
+                                                          "error": type(e).__name__}})
         error_msg = f"Common Room API Error: {str(e)}"
         return [TextContent(type="text", text=error_msg)]
+    finally:
+        _in_flight -= 1
+        request_id.reset(token)
+
+async def resume_write_queue():
+    """Resume draining writes queued before a restart, off the startup path"""
+    await asyncio.sleep(0)
+    try:
+        # Opening the queue creates its file; leave it alone unless writes can have been queued
+        if not write_behind({}) and not os.path.exists(queue_path()):
+            return
+        if get_write_queue().next_due_in() is not None:
+            ensure_worker()
+    except Exception:
+        log.error("write queue resume failed", exc_info=True)
+
+async def check_spec_updates():
+    """Periodically check for a newer OpenAPI spec; new operations can be hot-loaded as tools"""
+    if not env_bool("COMMONROOM_SPEC_CHECK", True):
+        return
+    from version_checker import background_version_check
+    await background_version_check(reload=registry.load_spec)
+
+def start_background_tasks() -> List[asyncio.Task]:
+    """Write queue resume, spec check and metrics export; the list keeps references until shutdown"""
+    return [asyncio.create_task(resume_write_queue()),
+            asyncio.create_task(check_spec_updates()),
+            asyncio.create_task(export_metrics())]
+
+async def shutdown(tasks: List[asyncio.Task], timeout: Optional[float] = None):
+    """Let running tool calls finish, then stop background work and close pooled connections"""
+    from commonroom_client import close_async_client
+    deadline = time.monotonic() + (env_float("COMMONROOM_SHUTDOWN_TIMEOUT", 30.0) if timeout is None else timeout)
+    while _in_flight and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    if _in_flight:
+        log.warning("shutting down with tool calls still running", extra={"fields": {"in_flight": _in_flight}})
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await stop_worker()
+    await close_async_client()
+    metrics_file = getenv("COMMONROOM_METRICS_FILE")
+    if metrics_file:
+        get_metrics().write_textfile(metrics_file)
 
 async def main():
+    configure_logging()
     # Handle both stdio and potential other transports
     try:
         async with stdio_server() as (read_stream, write_stream):
-            await app.run(read_stream, write_stream, app.create_initialization_options())
-    except Exception as e:
-        import traceback
-        print(f"Server error: {e}", file=sys.stderr)
-        traceback.print_exc(file=sys.stderr)
+            tasks = start_background_tasks()
+            try:
+                await app.run(read_stream, write_stream, app.create_initialization_options())
+            finally:
+                await shutdown(tasks, timeout=5.0)
+    except Exception:
+        log.critical("server error", exc_info=True)
         sys.exit(1)
 
+def cli():
+    parser = argparse.ArgumentParser(description="Common Room MCP server")
+    parser.add_argument("--transport", choices=("stdio", "http"),
+                        help="stdio (one client, the default) or http (streamable HTTP and SSE, many clients)")
+    parser.add_argument("--host", help="HTTP bind address (default: COMMONROOM_HTTP_HOST or 127.0.0.1)")
+    parser.add_argument("--port", type=int, help="HTTP port (default: COMMONROOM_HTTP_PORT or 8000)")
+    parser.add_argument("--stateless", action="store_true", default=None,
+                        help="No session state between HTTP requests (for load-balanced deployments)")
+    parser.add_argument("--json-response", action="store_true", default=None,
+                        help="Answer streamable HTTP requests with JSON instead of an SSE stream")
+    args = parser.parse_args()
+    # The process environment, not .env: the transport is chosen before any settings are loaded,
+    # and HTTP settings are only read when the HTTP transport is selected
+    transport = args.transport or os.environ.get("COMMONROOM_TRANSPORT", "stdio").strip().lower()
+    if transport != "http":
+        asyncio.run(main())
+        return
+    configure_logging()
+    from http_transport import serve
+    try:
+        serve(app, start_background_tasks, shutdown,
+              host=args.host or getenv("COMMONROOM_HTTP_HOST", "127.0.0.1"),
+              port=args.port or env_int("COMMONROOM_HTTP_PORT", 8000),
+              stateless=env_bool("COMMONROOM_HTTP_STATELESS", False) if args.stateless is None else args.stateless,
+              json_response=env_bool("COMMONROOM_HTTP_JSON_RESPONSE", False) if args.json_response is None
+              else args.json_response,
+              max_sessions=env_int("COMMONROOM_HTTP_MAX_SESSIONS", 0) or None,
+              shutdown_timeout=env_float("COMMONROOM_SHUTDOWN_TIMEOUT", 30.0))
+    except ValueError as e:
+        parser.error(str(e))
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    cli()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+In-memory index of Common Room tags by name and id
+Built once from GET /tags, then kept current from the server's own tag writes
+"""
+
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+def tag_key(name: Any) -> str:
+    """Case- and whitespace-insensitive form of a tag name"""
+    return ' '.join(str(name).split()).casefold()
+
+class TagIndex:
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._by_name: Dict[str, Dict] = {}
+        self._by_id: Dict[str, Dict] = {}
+        self._source: Any = None
+        self.loaded_at: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def load(self, tags: Any):
+        """Replace the index with a GET /tags result ({"labels": [...]} or a list); no-op for the same object"""
+        if tags is self._source and self.loaded:
+            return
+        labels = tags.get('labels') if isinstance(tags, dict) else tags
+        self._by_name, self._by_id = {}, {}
+        for tag in labels if isinstance(labels, list) else []:
+            self.add(tag)
+        self._source = tags
+        self.loaded_at = self.clock()
+        self.loads += 1
+
+    def add(self, tag: Any) -> Any:
+        """Index a created or updated tag, replacing the entry under its old name"""
+        if not isinstance(tag, dict) or tag.get('id') is None or not tag.get('name'):
+            return tag
+        if tag.get('deletedAt'):
+            self.remove(tag['id'])
+            return tag
+        tag_id = str(tag['id'])
+        old = self._by_id.get(tag_id)
+        if old is not None and self._by_name.get(tag_key(old['name'])) is old:
+            del self._by_name[tag_key(old['name'])]
+        self._by_id[tag_id] = tag
+        self._by_name[tag_key(tag['name'])] = tag
+        return tag
+
+    def remove(self, tag_id: Any):
+        tag = self._by_id.pop(str(tag_id), None)
+        if tag is not None and self._by_name.get(tag_key(tag['name'])) is tag:
+            del self._by_name[tag_key(tag['name'])]
+
+    def lookup(self, name: str) -> Optional[Dict]:
+        tag = self._by_name.get(tag_key(name))
+        if tag is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return tag
+
+    def get(self, tag_id: Any) -> Optional[Dict]:
+        return self._by_id.get(str(tag_id))
+
+    def age(self) -> Optional[float]:
+        return None if self.loaded_at is None else self.clock() - self.loaded_at
+
+    def names(self) -> List[str]:
+        return sorted(tag['name'] for tag in self._by_name.values())
+
+    def snapshot(self) -> Dict[str, List[Dict]]:
+        """The indexed tags in GET /tags shape, adopted as the current source"""
+        self._source = {'labels': list(self._by_id.values())}
+        return self._source
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'tags': len(self._by_id),
+            'loaded': self.loaded,
+            'age_seconds': None if self.age() is None else round(self.age(), 1),
+            'loads': self.loads,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Tenant registry for serving several Common Room communities from one process
+Each tenant has its own API key, dashboard URL, destination source and signal
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import getenv
+
+DEFAULT_API_URL = "https://api.commonroom.io/community/v1"
+DEFAULT_TENANTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tenants.json')
+
+# Name of the tenant configured by COMMONROOM_KEY & co.
+ENV_TENANT = "default"
+
+class UnknownTenant(LookupError):
+    """No tenant with the requested name is configured"""
+
+class Tenant:
+    """Credentials and defaults for one community"""
+
+    def __init__(self, name: str, api_key: Optional[str], api_url: Optional[str] = None,
+                 base_url: Optional[str] = None, signal_id: Optional[str] = None,
+                 destination_id: Optional[str] = None, max_concurrency: Optional[int] = None,
+                 rate_limit_reserve: Optional[int] = None):
+        self.name = name
+        self.api_key = api_key
+        self.api_url = api_url or DEFAULT_API_URL
+        self.base_url = base_url
+        self.signal_id = signal_id
+        self.destination_id = destination_id
+        self.max_concurrency = max_concurrency
+        self.rate_limit_reserve = rate_limit_reserve
+
+    @classmethod
+    def from_env(cls) -> 'Tenant':
+        """The single tenant configured by COMMONROOM_KEY, _API_URL, _BASE_URL, _SIGNAL_ID, _DESTINATION_ID"""
+        return cls(ENV_TENANT, getenv('COMMONROOM_KEY'), getenv('COMMONROOM_API_URL', DEFAULT_API_URL),
+                   getenv('COMMONROOM_BASE_URL'), getenv('COMMONROOM_SIGNAL_ID'),
+                   getenv('COMMONROOM_DESTINATION_ID', '138683'))
+
+    @classmethod
+    def from_dict(cls, name: str, settings: Dict[str, Any]) -> 'Tenant':
+        """Tenant from a tenants file entry; key_env names the variable holding the key"""
+        api_key = settings.get('key') or (getenv(settings['key_env']) if settings.get('key_env') else None)
+        return cls(name, api_key, settings.get('api_url'), settings.get('base_url'),
+                   settings.get('signal_id'), settings.get('destination_id'),
+                   settings.get('max_concurrency'), settings.get('rate_limit_reserve'))
+
+    def credentials(self) -> Tuple[Optional[str], ...]:
+        """Settings that identify a client; a change in any of them requires a new client"""
+        return (self.api_key, self.api_url, self.base_url, self.signal_id, self.destination_id,
+                self.max_concurrency, self.rate_limit_reserve)
+
+    def describe(self) -> Dict[str, Any]:
+        """Tenant settings without the API key"""
+        return {
+            'name': self.name,
+            'api_url': self.api_url,
+            'base_url': self.base_url,
+            'destination_id': self.destination_id,
+            'signal_id': self.signal_id,
+            'has_key': bool(self.api_key),
+        }
+
+class TenantRegistry:
+    """Tenants from COMMONROOM_TENANTS_FILE, plus the environment-configured tenant
+
+    The file is re-read when it changes, so tenants can be added without a restart:
+
+        {"default": "acme",
+         "tenants": {"acme": {"key_env": "ACME_COMMONROOM_KEY", "destination_id": "123",
+                              "base_url": "https://app.commonroom.io/community/acme"},
+                     "globex": {"key": "...", "destination_id": "456"}}}
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded: Optional[Tuple[str, float]] = None
+        self._tenants: Dict[str, Dict[str, Any]] = {}
+        self._default: Optional[str] = None
+
+    def _file(self) -> Dict[str, Dict[str, Any]]:
+        """Tenant entries from the file, reloaded when its path or mtime changes"""
+        path = self.path or getenv('COMMONROOM_TENANTS_FILE', DEFAULT_TENANTS_PATH)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = None
+        with self._lock:
+            if mtime is None:
+                self._loaded, self._tenants, self._default = None, {}, None
+            elif self._loaded != (path, mtime):
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                self._tenants = dict(data.get('tenants') or {})
+                self._default = data.get('default')
+                self._loaded = (path, mtime)
+        return self._tenants
+
+    def names(self) -> List[str]:
+        """Configured tenant names; the environment tenant is listed when COMMONROOM_KEY is set"""
+        names = list(self._file())
+        if ENV_TENANT not in names and getenv('COMMONROOM_KEY'):
+            names.append(ENV_TENANT)
+        return names
+
+    def default_name(self) -> str:
+        """COMMONROOM_DEFAULT_TENANT, else the file's default, else the environment tenant"""
+        self._file()
+        return getenv('COMMONROOM_DEFAULT_TENANT') or self._default or ENV_TENANT
+
+    def get(self, name: Optional[str] = None) -> Tenant:
+        """Settings for a tenant (the default one when name is empty)"""
+        name = name or self.default_name()
+        settings = self._file().get(name)
+        if settings is not None:
+            return Tenant.from_dict(name, settings)
+        if name == ENV_TENANT:
+            return Tenant.from_env()
+        raise UnknownTenant(f"Unknown tenant {name!r} (configured: {', '.join(self.names()) or 'none'})")
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Every configured tenant, without API keys"""
+        default = self.default_name()
+        return [dict(self.get(name).describe(), default=name == default) for name in self.names()]
+
+_registry = TenantRegistry()
+
+def get_tenants() -> TenantRegistry:
+    """Process-wide tenant registry"""
+    return _registry
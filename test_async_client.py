@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Test the async Common Room client against an in-process mock transport
+"""
+
+import asyncio
+import json
+import os
+import time
+import httpx
+from commonroom_client import AsyncCommonRoomClient, RetryPolicy, with_generated_ids
+
+DELAY = 0.2
+
+async def slow_api(request: httpx.Request) -> httpx.Response:
+    """Mock API where every call takes DELAY seconds"""
+    await asyncio.sleep(DELAY)
+    email = request.url.path.rsplit('/', 1)[-1]
+    return httpx.Response(200, json=[{"id": 42, "fullName": "Ada", "email": email}])
+
+def make_client(**kwargs) -> AsyncCommonRoomClient:
+    os.environ['COMMONROOM_KEY'] = 'test_key'
+    os.environ['COMMONROOM_BASE_URL'] = 'https://app.commonroom.io/community/8683-amazon-developer'
+    return AsyncCommonRoomClient(transport=httpx.MockTransport(slow_api), **kwargs)
+
+def test_parallel_calls_overlap():
+    """N parallel lookups take about as long as the slowest one"""
+    async def run():
+        client = make_client(max_concurrency=8)
+        emails = [f"user{i}@example.com" for i in range(8)]
+        start = time.perf_counter()
+        results = await asyncio.gather(*(client.get_user_by_email(e) for e in emails))
+        elapsed = time.perf_counter() - start
+        await client.aclose()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(run())
+    assert [r[0]["email"] for r in results] == [f"user{i}@example.com" for i in range(8)]
+    assert results[0][0]["dashboard_url"].endswith("/member/42")
+    assert elapsed < DELAY * 3, f"Parallel calls took {elapsed:.2f}s"
+    print(f"✓ 8 parallel lookups in {elapsed:.2f}s")
+
+def test_concurrency_limit():
+    """Requests beyond max_concurrency wait for a free slot"""
+    async def run():
+        client = make_client(max_concurrency=2)
+        start = time.perf_counter()
+        await asyncio.gather(*(client.get_user_by_email(f"u{i}@example.com") for i in range(4)))
+        elapsed = time.perf_counter() - start
+        await client.aclose()
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    assert elapsed >= DELAY * 2 * 0.9, f"Concurrency limit not applied ({elapsed:.2f}s)"
+    print(f"✓ 4 lookups with concurrency 2 in {elapsed:.2f}s")
+
+def test_bulk_activities_statuses():
+    """Bulk ingestion reports created, retried and failed items"""
+    attempts = {}
+
+    def api(request: httpx.Request) -> httpx.Response:
+        activity = json.loads(request.content)
+        title = activity["activityTitle"]["value"]
+        attempts[title] = attempts.get(title, 0) + 1
+        if title == "flaky" and attempts[title] == 1:
+            return httpx.Response(502, text="Bad Gateway")
+        if title == "rejected":
+            return httpx.Response(400, json={"reason": "invalid-request-body"})
+        return httpx.Response(202, json={})
+
+    def activity(title):
+        return {"activityType": "attended_gathering", "user": {"email": f"{title}@example.com"},
+                "activityTitle": {"type": "text", "value": title}}
+
+    async def run():
+        os.environ['COMMONROOM_KEY'] = 'test_key'
+        client = AsyncCommonRoomClient(transport=httpx.MockTransport(api))
+        client.retry_policy = RetryPolicy(backoff_base=0.01)
+        result = await client.add_activities_bulk(
+            "123", [activity("ok"), activity("flaky"), activity("rejected"), {"activityType": "x"}],
+            concurrency=2)
+        await client.aclose()
+        return result
+
+    result = asyncio.run(run())
+    statuses = [item["status"] for item in result["results"]]
+    assert statuses == ["created", "retried", "failed", "failed"], statuses
+    assert result["results"][2]["reason"].startswith("400")
+    assert attempts == {"ok": 1, "flaky": 2, "rejected": 1}
+    assert (result["created"], result["retried"], result["failed"]) == (1, 1, 2)
+    print(f"✓ Bulk statuses: {statuses}")
+
+def test_retries_reuse_ids():
+    """Transient failures are retried with the same payload; client errors are not"""
+    posted = []
+
+    def api(request: httpx.Request) -> httpx.Response:
+        posted.append(json.loads(request.content))
+        if len(posted) < 3:
+            return httpx.Response(503 if len(posted) == 1 else 429, headers={'Retry-After': '0'})
+        return httpx.Response(202)
+
+    async def run():
+        os.environ['COMMONROOM_KEY'] = 'retry_test_key'
+        client = AsyncCommonRoomClient(transport=httpx.MockTransport(api))
+        client.retry_policy = RetryPolicy(max_attempts=3, backoff_base=0.01)
+        activity = with_generated_ids({"activityType": "attended_gathering", "user": {"email": "a@example.com"}})
+        result = await client.add_activity("123", activity)
+        await client.aclose()
+        return activity, result
+
+    activity, result = asyncio.run(run())
+    assert result == {}
+    assert len(posted) == 3
+    assert {p["id"] for p in posted} == {activity["id"]}
+    assert {p["user"]["id"] for p in posted} == {activity["user"]["id"]}
+    assert with_generated_ids(activity)["id"] == activity["id"]
+    print(f"✓ Retried {len(posted)} times with id {activity['id']}")
+
+def test_get_users_with_negative_cache():
+    """Batch lookups are cached, including 404s, and dashboard_url is filled in"""
+    requested = []
+
+    def api(request: httpx.Request) -> httpx.Response:
+        email = request.url.path.rsplit('/', 1)[-1]
+        requested.append(email)
+        if email.startswith("missing"):
+            return httpx.Response(404, json={"status": "not-found"})
+        return httpx.Response(200, json=[{"id": 7, "email": email}])
+
+    async def run():
+        client = make_client()
+        client.http._transport = httpx.MockTransport(api)
+        emails = ["a@example.com", "missing@example.com", "A@example.com", "b@example.com"]
+        first = await client.get_users(emails, concurrency=2)
+        second = await client.get_users(emails)
+        refreshed = await client.get_user_by_email("a@example.com", refresh=True)
+        await client.aclose()
+        return first, second, refreshed, client.cache_stats()["user_cache"]
+
+    first, second, refreshed, stats = asyncio.run(run())
+    assert [r["status"] for r in first["results"]] == ["found", "not_found", "found"]
+    assert first["results"][0]["user"][0]["dashboard_url"].endswith("/member/7")
+    assert second == first
+    assert sorted(requested) == ["a@example.com", "a@example.com", "b@example.com", "missing@example.com"]
+    assert refreshed[0]["email"] == "a@example.com"
+    assert stats["hits"] == 3
+    print(f"✓ get_users made {len(requested)} requests for 7 lookups")
+
+def test_add_contacts_to_segment_in_chunks():
+    """Large contact lists are split into chunks; failed chunks are reported for re-runs"""
+    bodies = []
+
+    def api(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        bodies.append(body)
+        if "user5@example.com" in body["value"].split(","):
+            return httpx.Response(400, json={"reason": "invalid-request-body"})
+        return httpx.Response(200)
+
+    async def run():
+        os.environ['COMMONROOM_KEY'] = 'segment_test_key'
+        client = AsyncCommonRoomClient(transport=httpx.MockTransport(api))
+        emails = [f"user{i}@example.com" for i in range(10)] + ["user0@example.com"]
+        result = await client.add_contacts_to_segment("42", emails, status_id=7, chunk_size=4)
+        await client.aclose()
+        return result
+
+    result = asyncio.run(run())
+    assert (result["contacts"], result["chunks"], result["added"], result["failed"]) == (10, 3, 6, 4)
+    assert result["failed_values"] == [f"user{i}@example.com" for i in range(4, 8)]
+    assert [r["status"] for r in result["results"]] == ["added", "failed", "added"]
+    assert all(b["socialType"] == "email" and b["statusId"] == 7 for b in bodies)
+    print(f"✓ Segment membership: {result['added']} added in {result['chunks']} chunks")
+
+def test_identical_reads_share_one_request():
+    """Concurrent identical GETs are sent once; a write stops reads before it from being shared"""
+    requests = []
+
+    async def api(request: httpx.Request) -> httpx.Response:
+        path = request.url.path.replace("/community/v1", "")
+        requests.append(f"{request.method} {path}?{request.url.query.decode()}")
+        await asyncio.sleep(DELAY / 4)
+        if request.method == "POST":
+            return httpx.Response(202)
+        return httpx.Response(200, json=[{"id": 1, "path": path}])
+
+    async def run():
+        os.environ['COMMONROOM_KEY'] = 'test_key'
+        client = AsyncCommonRoomClient(transport=httpx.MockTransport(api))
+        segments = [asyncio.create_task(client.get_segments()) for _ in range(10)]
+        await asyncio.sleep(0)
+        segments[0].cancel()  # the first caller gives up; the others still get the answer
+        users = [client.get_user_by_email("ada@example.com") for _ in range(5)]
+        members = [client.call_api("GET", "/members", params={"email": email})
+                   for email in ("a@example.com", "b@example.com", "a@example.com")]
+        results = await asyncio.gather(*segments[1:], *users, *members)
+
+        before_write = asyncio.create_task(client.call_api("GET", "/tags"))
+        await asyncio.sleep(0)
+        await client.call_api("POST", "/tags", body={"name": "beta"})
+        after_write = await client.call_api("GET", "/tags")
+        await before_write
+        await client.aclose()
+        return results, after_write
+
+    results, after_write = asyncio.run(run())
+    assert results[0] == [{"id": 1, "path": "/segments"}] and len(results) == 17
+    assert requests.count("GET /segments?") == 1
+    assert requests.count("GET /user/ada@example.com?") == 1
+    assert sorted(r for r in requests if r.startswith("GET /members")) == \
+        ["GET /members?email=a%40example.com", "GET /members?email=b%40example.com"]
+    assert requests.count("GET /tags?") == 2 and after_write[0]["path"] == "/tags"
+    print(f"✓ 18 concurrent reads sent as {len(requests) - 3} requests")
+
+if __name__ == "__main__":
+    test_parallel_calls_overlap()
+    test_concurrency_limit()
+    test_bulk_activities_statuses()
+    test_retries_reuse_ids()
+    test_get_users_with_negative_cache()
+    test_add_contacts_to_segment_in_chunks()
+    test_identical_reads_share_one_request()
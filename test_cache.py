@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test the TTL cache and reference data caching in the client
+"""
+
+import asyncio
+import os
+import httpx
+from cache import MISSING, TTLCache
+from commonroom_client import AsyncCommonRoomClient
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_ttl_and_lru():
+    """Entries expire after their TTL and the least recently used is evicted"""
+    clock = FakeClock()
+    cache = TTLCache(max_entries=2, default_ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=100)
+    assert cache.get("a") == 1
+
+    clock.now = 11
+    assert cache.get("a") is MISSING
+    assert cache.get("b") == 2
+
+    cache.set("c", 3)
+    cache.set("d", 4)
+    assert cache.get("b") is MISSING
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["hits"] == 2
+    print("✓ TTL expiry and LRU eviction")
+
+def test_reference_cache_and_invalidation():
+    """Repeated reads hit the cache; writes to the resource invalidate it"""
+    calls = []
+
+    def api(request: httpx.Request) -> httpx.Response:
+        calls.append((request.method, request.url.path))
+        return httpx.Response(200, json={"labels": [{"id": "1", "name": "vip"}]})
+
+    async def run():
+        os.environ['COMMONROOM_KEY'] = 'test_key'
+        client = AsyncCommonRoomClient(transport=httpx.MockTransport(api))
+        await client.get_tags()
+        await client.get_tags()
+        assert len(calls) == 1, calls
+
+        await client.get_tags(refresh=True)
+        assert len(calls) == 2, calls
+
+        await client._request("POST", "/tags/1", json={"name": "vip-2"})
+        await client.get_tags()
+        assert len(calls) == 4, calls
+
+        stats = client.cache_stats()
+        await client.aclose()
+        return stats
+
+    stats = asyncio.run(run())
+    assert stats["keys"]["/tags"] == {"hits": 1, "misses": 2}
+    print(f"✓ Reference cache stats: {stats['keys']['/tags']}")
+
+if __name__ == "__main__":
+    test_ttl_and_lru()
+    test_reference_cache_and_invalidation()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Test the local contact mirror: upserts from API responses, indexed and full-text search, lazy refresh
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+import httpx
+import fake_api
+import server
+from contact_store import ContactStore, summarize
+
+ADA = {"id": 7, "fullName": "Ada Lovelace", "emails": ["Ada@Acme.com"], "organization": "Acme",
+       "title": "Staff Engineer", "last_active": "2026-09-30", "bio": "Compilers and analytical engines",
+       "segments": [{"id": 1, "name": "Champions"}], "member_tags": [{"id": 3, "name": "Speaker"}]}
+GRACE = {"fullName": "Grace Hopper", "email": "grace@globex.com", "companyName": "Globex",
+         "titleAtCompany": "Admiral", "lastActive": "2025-01-01", "tags": ["COBOL"]}
+
+def test_summarize():
+    """Fields are read from /user/{email}, /members and ApiUser shapes alike"""
+    ada = summarize(ADA)
+    assert ada["key"] == "id:7" and ada["email"] == "ada@acme.com"
+    assert ada["segments"] == ["Champions"] and ada["tags"] == ["Speaker"]
+    grace = summarize(GRACE)
+    assert grace["key"] == "email:grace@globex.com" and grace["organization"] == "Globex"
+    assert grace["title"] == "Admiral" and grace["tags"] == ["COBOL"]
+    assert summarize({"fullName": "No One"})["key"] is None
+    assert summarize({"fullName": "Looked Up"}, "Who@Example.com")["key"] == "email:who@example.com"
+    assert summarize({"github": "https://github.com/Octo"})["key"] == "github:octo"
+    print("✓ Contact fields normalized")
+
+def test_upsert_and_search():
+    """Full-text, organization, segment, tag and recency filters; one row per contact and tenant"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ContactStore(os.path.join(tmp, "contacts.db"))
+        store.upsert([GRACE, {"fullName": "Ada L", "email": "ada@acme.com"}])
+        assert store.upsert([ADA, {"no": "identifier"}]) == 1
+        store.upsert([dict(ADA, title="Principal Engineer")], tenant="globex")
+        assert store.stats()["contacts"] == 3  # the email-only Ada row became the id row
+
+        assert [r["full_name"] for r in store.search(query="ada")[1]] == ["Ada Lovelace"]
+        assert store.search(query="engin")[0] == 1  # prefixes of bio words match
+        assert store.search(query="lovelace staff")[0] == 1 and store.search(query="lovelace admiral")[0] == 0
+        assert store.search(organization="acme")[1][0]["email"] == "ada@acme.com"
+        assert store.search(segment="champions")[0] == 1 and store.search(tag="cobol")[0] == 1
+        assert [r["email"] for r in store.search(active_since="2026-01-01")[1]] == ["ada@acme.com"]
+        assert [r["email"] for r in store.search()[1]] == ["ada@acme.com", "grace@globex.com"]
+        total, rows = store.search(tenant="globex", email="ADA@acme.com")
+        assert total == 1 and rows[0]["title"] == "Principal Engineer"
+        assert rows[0]["contact"]["bio"] == ADA["bio"] and not rows[0]["stale"]
+        assert store.delete("default", "ADA@acme.com") == 1 and store.search(query="ada")[0] == 0
+        assert store.search(tenant="globex", query="ada")[0] == 1
+        store.close()
+    print("✓ Indexed and full-text search")
+
+def test_members_rows_are_kept():
+    """/members rows carry no id or email; they are keyed on the member URL, then social handles"""
+    fake = fake_api.FakeCommonRoom()
+    httpd = fake_api.start(fake)
+    member = httpx.get(f"{httpd.api_url}/members", params={"github": "greg"},
+                       headers={"Authorization": "Bearer k"}).json()[0]
+    httpd.shutdown()
+    assert "id" not in member and "email" not in member
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ContactStore(os.path.join(tmp, "contacts.db"))
+        rows = [dict(member, fullName=f"Greg {i}", common_room_member_url=f"https://app.commonroom.io/m/{i}")
+                for i in range(3)]
+        assert store.upsert(rows) == 3
+        assert store.upsert([dict(rows[0], title="Maintainer")]) == 1
+        handles = [dict(member, common_room_member_url=None, github=f"greg{i}") for i in range(2)]
+        assert store.upsert(handles, email="shared@example.com") == 2  # two members behind one address
+        assert store.stats()["contacts"] == 5
+        assert store.search(query="maintainer")[0] == 1 and store.search(email="shared@example.com")[0] == 0
+        store.close()
+
+    async def run():
+        from commonroom_client import AsyncCommonRoomClient
+        client = AsyncCommonRoomClient()
+        try:
+            found = await client.resolve_contact(github="greg")
+            return found, await client.search_local(query="greg", refresh_stale=False)
+        finally:
+            await client.aclose()
+
+    httpd = fake_api.start(fake)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(COMMONROOM_KEY="contact_store_test_key", COMMONROOM_API_URL=httpd.api_url,
+                          COMMONROOM_CONTACT_STORE_ENABLED="true",
+                          COMMONROOM_CONTACT_STORE=os.path.join(tmp, "contacts.db"))
+        try:
+            found, local = asyncio.run(run())
+        finally:
+            for name in ("COMMONROOM_API_URL", "COMMONROOM_CONTACT_STORE_ENABLED", "COMMONROOM_CONTACT_STORE"):
+                del os.environ[name]
+            httpd.shutdown()
+    assert found["source"] == "members" and local["total"] == 1  # the fake's sample rows are one member
+    print("✓ /members rows mirrored by member URL and handle")
+
+def test_search_is_fast():
+    """Tens of thousands of contacts are searched in milliseconds"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ContactStore(os.path.join(tmp, "contacts.db"))
+        store.upsert({"id": i, "email": f"user{i}@org{i % 500}.com", "fullName": f"User {i}",
+                      "organization": f"Org {i % 500}", "title": "Engineer" if i % 10 else "VP Sales",
+                      "last_active": f"2026-{i % 12 + 1:02d}-01"} for i in range(20000))
+        started = time.perf_counter()
+        total, rows = store.search(query="vp sales", organization="Org 70", limit=10)
+        elapsed = time.perf_counter() - started
+        store.close()
+    assert total == 40 and len(rows) == 10
+    assert elapsed < 0.1, f"search took {elapsed * 1000:.1f}ms"
+    print(f"✓ Searched 20000 contacts in {elapsed * 1000:.1f}ms")
+
+def test_client_mirrors_and_refreshes():
+    """Lookups feed the store; local searches call the API only to refresh stale matches"""
+    requests = []
+
+    async def api(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        if request.method == "DELETE":
+            return httpx.Response(202)
+        email = request.url.path.rsplit("/", 1)[-1]
+        name = email.split("@")[0]
+        return httpx.Response(200, json=[{"id": name, "email": email, "fullName": name,
+                                          "organization": "Acme" if "acme" in email else "Globex"}])
+
+    async def run():
+        from commonroom_client import AsyncCommonRoomClient
+        client = AsyncCommonRoomClient(transport=httpx.MockTransport(api))
+        try:
+            await client.get_users(["ada@acme.com", "bob@acme.com", "cy@globex.com"])
+            fresh = await client.search_local(organization="acme")
+            client.contact_store.max_age = 0
+            stale = await client.search_local(organization="acme")
+            stats = client.cache_stats()["contact_store"]
+            await server.registry.get_handler("commonroom_delete_user")(client, {"email": "ada@acme.com"})
+            deleted = await client.search_local("ada", refresh_stale=False)
+            return fresh, stale, stats, deleted, client.contact_store.stats()["contacts"]
+        finally:
+            await client.aclose()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(COMMONROOM_KEY="contact_store_test_key", COMMONROOM_CONTACT_STORE_ENABLED="true",
+                          COMMONROOM_CONTACT_STORE=os.path.join(tmp, "contacts.db"))
+        try:
+            fresh, stale, stats, deleted, left = asyncio.run(run())
+        finally:
+            del os.environ["COMMONROOM_CONTACT_STORE_ENABLED"], os.environ["COMMONROOM_CONTACT_STORE"]
+
+    assert fresh["total"] == 2 and fresh["refreshed"] == 0
+    assert sorted(r["email"] for r in fresh["results"]) == ["ada@acme.com", "bob@acme.com"]
+    assert stale["refreshed"] == 2 and len(requests) == 6  # 3 lookups, 2 refreshes, 1 delete
+    assert stats["contacts"] == 3
+    assert deleted["total"] == 0 and left == 2  # an anonymized contact leaves the mirror
+    print(f"✓ Mirrored 3 lookups; searched in {fresh['ms']}ms, refreshed 2 stale rows and dropped a deleted one")
+
+if __name__ == "__main__":
+    test_summarize()
+    test_upsert_and_search()
+    test_members_rows_are_kept()
+    test_search_is_fast()
+    test_client_mirrors_and_refreshes()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test the local fake API and the load test harness
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import urllib.error
+import urllib.request
+import fake_api
+import load_test
+
+def call(httpd, method: str, path: str, body=None, auth: bool = True):
+    request = urllib.request.Request(httpd.api_url + path, method=method,
+                                     data=json.dumps(body).encode() if body is not None else None,
+                                     headers={"Authorization": "Bearer test"} if auth else {})
+    try:
+        with urllib.request.urlopen(request) as response:
+            data = response.read()
+            return response.status, json.loads(data) if data else None, response.headers
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"null"), e.headers
+
+def test_routes_from_spec():
+    """Every spec operation is served; users and tags keep state"""
+    fake = fake_api.FakeCommonRoom(contacts=2)
+    httpd = fake_api.start(fake)
+    try:
+        status, types, _ = call(httpd, "GET", "/activityTypes")
+        assert status == 200 and [t["id"] for t in types][:2] == ["started_training", "started_training_1"]
+        assert call(httpd, "GET", "/segments/7/status")[0] == 200
+        assert call(httpd, "GET", "/user/user1@example.com")[1][0]["email"] == "user1@example.com"
+        assert call(httpd, "GET", "/user/new@example.com")[0] == 404
+        assert call(httpd, "POST", "/source/1/user", {"id": "u1", "email": "new@example.com"})[0] == 202
+        assert call(httpd, "GET", "/user/new@example.com")[0] == 200
+        status, tag, _ = call(httpd, "POST", "/tags", {"name": "beta"})
+        assert call(httpd, "GET", "/tags")[1] == {"labels": [tag]}
+        assert call(httpd, "DELETE", f"/tags/{tag['id']}")[0] == 200
+        assert call(httpd, "GET", f"/tags/{tag['id']}")[0] == 404
+        assert call(httpd, "GET", "/tags", auth=False)[0] == 403
+        assert call(httpd, "GET", "/nope")[0] == 404
+    finally:
+        httpd.shutdown()
+    assert fake.stats()["requests"]["GET /user/{email}"] == 3
+    print("✓ Spec routes served with users and tags kept in memory")
+
+def test_rate_limit_and_errors():
+    """RateLimit headers on every response, 429 past the limit, injected failures"""
+    httpd = fake_api.start(fake_api.FakeCommonRoom(rate_limit=2, window=60))
+    try:
+        _, _, headers = call(httpd, "GET", "/segments")
+        assert headers["X-RateLimit-Limit"] == "2" and headers["RateLimit-Remaining"] == "1"
+        call(httpd, "GET", "/segments")
+        status, _, headers = call(httpd, "GET", "/segments")
+        assert status == 429 and int(headers["Retry-After"]) > 0
+    finally:
+        httpd.shutdown()
+    fake = fake_api.FakeCommonRoom(error_rate=1.0, error_status=500)
+    httpd = fake_api.start(fake)
+    try:
+        assert call(httpd, "GET", "/segments")[0] == 500
+    finally:
+        httpd.shutdown()
+    assert fake.stats()["injected_errors"] == 1
+    print("✓ Rate limiting and fault injection")
+
+def test_load_test_over_stdio():
+    """A short run through server.py reports every tool in the mix"""
+    parser = argparse.ArgumentParser()
+    fake_api.add_arguments(parser)
+    args = parser.parse_args(["--contacts", "10", "--seed", "1"])
+    args.__dict__.update(calls=40, concurrency=8, mix=None, timeout=30.0, python=sys.executable,
+                         env=[], api_url=None, server_log=None)
+    summary = asyncio.run(load_test.run(args))
+    assert summary["calls"] == 40
+    assert set(summary["tools"]) <= set(load_test.DEFAULT_MIX)
+    kinds = {kind for stats in summary["tools"].values() for kind in stats["error_kinds"]}
+    assert kinds <= {"not_found"}, kinds
+    assert summary["api"]["total"] > 0
+    print(f"✓ {summary['calls']} calls over stdio at {summary['throughput']:.0f} calls/s")
+
+if __name__ == "__main__":
+    test_routes_from_spec()
+    test_rate_limit_and_errors()
+    test_load_test_over_stdio()
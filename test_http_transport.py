@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Test the HTTP transport: many sessions sharing one server process
+"""
+
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+from mcp.client.streamable_http import streamablehttp_client
+import fake_api
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(port: int, env: dict) -> subprocess.Popen:
+    process = subprocess.Popen([sys.executable, os.path.join(HERE, "server.py"), "--transport", "http",
+                                "--port", str(port)], cwd=HERE, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(200):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=1)
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("HTTP server did not start")
+
+async def call_http(url: str, tool: str, arguments: dict) -> str:
+    async with streamablehttp_client(f"{url}/mcp") as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            return (await session.call_tool(tool, arguments)).content[0].text
+
+async def call_sse(url: str, tool: str, arguments: dict) -> str:
+    async with sse_client(f"{url}/sse") as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            return (await session.call_tool(tool, arguments)).content[0].text
+
+def test_sessions_share_one_process():
+    """Streamable HTTP and SSE sessions share the cache and metrics, and SIGTERM shuts down cleanly"""
+    fake = fake_api.FakeCommonRoom(latency_ms=10, contacts=5)
+    httpd = fake_api.start(fake)
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as tmp:
+        metrics_file = os.path.join(tmp, "commonroom.prom")
+        env = {k: v for k, v in os.environ.items() if not k.startswith("COMMONROOM_")}
+        env.update(COMMONROOM_KEY="http-test", COMMONROOM_API_URL=httpd.api_url, COMMONROOM_SPEC_CHECK="false",
+                   COMMONROOM_SENT_INDEX=os.path.join(tmp, "sent.db"),
+                   COMMONROOM_WRITE_QUEUE=os.path.join(tmp, "queue.db"),
+                   COMMONROOM_METRICS_FILE=metrics_file, COMMONROOM_METRICS_INTERVAL="3600")
+        process = start_server(port, env)
+        try:
+            async def run():
+                first = await call_http(url, "commonroom_get_activity_types", {"format": "compact"})
+                second = await call_sse(url, "commonroom_get_activity_types", {"format": "compact"})
+                users = await asyncio.gather(*(call_http(url, "commonroom_get_user", {"email": f"user{i}@example.com"})
+                                               for i in range(4)))
+                return first, second, users
+
+            first, second, users = asyncio.run(run())
+            assert first == second and "started_training" in first
+            assert all("@example.com" in text for text in users)
+            assert fake.stats()["requests"]["GET /activityTypes"] == 1  # second session hit the shared cache
+        finally:
+            process.send_signal(signal.SIGTERM)
+            returncode = process.wait(15)
+            httpd.shutdown()
+        assert returncode in (0, -signal.SIGTERM)
+        with open(metrics_file) as f:
+            metrics = f.read()  # written again on shutdown
+    assert 'commonroom_tool_calls_total{tool="commonroom_get_activity_types",outcome="ok"} 2' in metrics
+    assert 'commonroom_tool_calls_total{tool="commonroom_get_user",outcome="ok"} 4' in metrics
+    print("✓ HTTP and SSE sessions share one server; graceful shutdown")
+
+def test_exposed_binds_need_protection():
+    """A non-loopback bind is refused without allowed hosts or a token; a token guards every route but /healthz"""
+    import http_transport
+    import server
+    from starlette.testclient import TestClient
+    try:
+        http_transport.security_settings("0.0.0.0", 8000)
+        assert False, "expected ValueError"
+    except ValueError as e:
+        assert "COMMONROOM_HTTP_TOKEN" in str(e)
+    os.environ["COMMONROOM_HTTP_ALLOWED_HOSTS"] = "mcp.example.com"
+    try:
+        settings = http_transport.security_settings("0.0.0.0", 8000)
+    finally:
+        del os.environ["COMMONROOM_HTTP_ALLOWED_HOSTS"]
+    assert settings.enable_dns_rebinding_protection and settings.allowed_hosts == ["mcp.example.com"]
+
+    async def noop(state):
+        pass
+
+    os.environ["COMMONROOM_HTTP_TOKEN"] = "s3cret"
+    try:
+        app = http_transport.create_app(server.app, lambda: None, noop, host="0.0.0.0")
+    finally:
+        del os.environ["COMMONROOM_HTTP_TOKEN"]
+    client = TestClient(app)
+    assert client.get("/healthz").status_code == 200
+    assert client.post("/messages/").status_code == 401
+    assert client.post("/messages/", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.post("/messages/", headers={"Authorization": "Bearer s3cret"}).status_code == 400  # no session
+    result = subprocess.run([sys.executable, os.path.join(HERE, "server.py"), "--transport", "http",
+                             "--host", "0.0.0.0", "--port", str(free_port())], cwd=HERE, capture_output=True,
+                            text=True, env={k: v for k, v in os.environ.items() if not k.startswith("COMMONROOM_")})
+    assert result.returncode == 2 and "Refusing to serve on 0.0.0.0" in result.stderr
+    print("✓ Exposed binds refused without allowed hosts or a bearer token")
+
+if __name__ == "__main__":
+    test_sessions_share_one_process()
+    test_exposed_binds_need_protection()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test multi-identifier contact resolution and the identity index
+"""
+
+import asyncio
+import os
+import httpx
+from identity_index import IdentityIndex, normalize
+from commonroom_client import AsyncCommonRoomClient
+
+def test_normalize():
+    """Handles, URLs and case variants share one alias"""
+    assert normalize('twitter', '@Octo') == normalize('twitter', 'https://x.com/octo') == 'octo'
+    assert normalize('github', 'https://github.com/OctoCat/') == 'octocat'
+    assert normalize('linkedin', 'https://www.linkedin.com/in/octo/') == normalize('linkedin', 'octo') == 'in/octo'
+    assert normalize('email', ' Octo@Example.com ') == 'octo@example.com'
+    print("✓ Identifier normalization")
+
+def test_index_merges_aliases():
+    """A record learned under one alias is found by all of them"""
+    index = IdentityIndex()
+    contact = {"fullName": "Octo", "github": "octocat", "twitter": "octo"}
+    index.add(contact, {"email": "octo@example.com"})
+    assert index.lookup({"twitter": "@OCTO"}) is contact
+    assert index.lookup({"email": "octo@example.com"}) is contact
+    updated = {"fullName": "Octo Cat", "github": "octocat"}
+    index.add(updated)
+    assert index.lookup({"twitter": "octo"}) is updated
+    assert index.stats()["records"] == 1
+    print("✓ Aliases merge into one record")
+
+def test_resolve_contact_with_fallback():
+    """Resolution uses /members, then the index, then email once /members is gone"""
+    calls = []
+    members_gone = []
+
+    def api(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.url.path.endswith("/members"):
+            if members_gone:
+                return httpx.Response(410)
+            return httpx.Response(200, json=[{"fullName": "Octo", "github": "octocat",
+                                              "twitter": "octo", "linkedin": "in/octo"}])
+        return httpx.Response(200, json=[{"id": 99, "fullName": "Mona"}])
+
+    async def run():
+        os.environ['COMMONROOM_KEY'] = 'identity_test_key'
+        client = AsyncCommonRoomClient(transport=httpx.MockTransport(api))
+        first = await client.resolve_contact(github="octocat")
+        second = await client.resolve_contact(linkedin="https://www.linkedin.com/in/octo/")
+        members_gone.append(True)
+        third = await client.resolve_contact(email="mona@example.com", github="mona")
+        fourth = await client.resolve_contact(github="mona")
+        await client.aclose()
+        return first, second, third, fourth, client.members_endpoint_available
+
+    first, second, third, fourth, members_available = asyncio.run(run())
+    assert first["source"] == "members" and second["source"] == "index"
+    assert third["source"] == "user" and third["contact"]["fullName"] == "Mona"
+    assert fourth["source"] == "index"
+    assert not members_available
+    assert [c.rsplit("/", 1)[-1] for c in calls] == ["members", "members", "mona@example.com"]
+    print(f"✓ Resolved 4 lookups with {len(calls)} API calls")
+
+def test_email_lookups_feed_the_index():
+    """Members returned by GET /user/{email} are indexed under the email they were found by"""
+    def api(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=[{"id": 5, "fullName": "Hubot", "github": "hubot"}])
+
+    async def run():
+        os.environ['COMMONROOM_KEY'] = 'identity_test_key'
+        client = AsyncCommonRoomClient(transport=httpx.MockTransport(api))
+        await client.get_user_by_email("hubot@example.com")
+        client.members_endpoint_available = False
+        resolved = await client.resolve_contact(github="HUBOT")
+        await client.aclose()
+        return resolved, client.identity_index.stats()
+
+    resolved, stats = asyncio.run(run())
+    assert stats["records"] == 1
+    assert resolved["source"] == "index" and resolved["contact"]["id"] == 5
+    print("✓ Email lookups indexed")
+
+if __name__ == "__main__":
+    test_normalize()
+    test_index_merges_aliases()
+    test_resolve_contact_with_fallback()
+    test_email_lookups_feed_the_index()
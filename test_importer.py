@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Test streaming file import: mapping, bounded concurrency, rejects and resumable checkpoints
+"""
+
+import asyncio
+import csv
+import json
+import os
+import tempfile
+import tracemalloc
+import httpx
+from commonroom_client import AsyncCommonRoomClient
+from importer import Progress, check_path, import_file, map_row
+
+MAPPING = {"user.email": "Email", "user.fullName": "{First} {Last}", "activityTitle.value": "Session"}
+DEFAULTS = {"activityType": "webinar", "activityTitle": {"type": "text"}}
+
+def write_csv(path: str, rows: int, bad=()):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Email", "First", "Last", "Session"])
+        for i in range(rows):
+            writer.writerow(["" if i in bad else f"user{i}@example.com", "Ada", f"L{i}", f"Talk {i % 7}"])
+
+class Api:
+    """Mock API counting posts and concurrent requests"""
+
+    def __init__(self, fail=()):
+        self.posted = []
+        self.in_flight = self.max_in_flight = 0
+        self.fail = fail
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        payload = json.loads(request.content)
+        if payload["user"]["email"] in self.fail:
+            return httpx.Response(400, json={"reason": "invalid-request-body"})
+        self.posted.append(payload["id"])
+        return httpx.Response(202)
+
+def run_import(api: Api, path: str, **kwargs) -> dict:
+    def validate(kind, payload):
+        if "email" not in payload["user"]:
+            raise ValueError("user.email: required")
+
+    async def run():
+        client = AsyncCommonRoomClient(transport=httpx.MockTransport(api))
+        client.retry_policy.max_attempts = 1
+        try:
+            return await import_file(client, path, mapping=kwargs.pop("mapping", MAPPING), defaults=DEFAULTS,
+                                     destination_source_id="1", validate=validate, **kwargs)
+        finally:
+            await client.aclose()
+
+    os.environ["COMMONROOM_KEY"] = "importer_test_key"
+    os.environ["COMMONROOM_IMPORT_DIR"] = os.path.dirname(path)
+    try:
+        return asyncio.run(run())
+    finally:
+        del os.environ["COMMONROOM_IMPORT_DIR"]
+
+def test_map_row():
+    """Dotted targets, templates, defaults and identity mapping"""
+    row = {"Email": "ada@example.com", "First": "Ada", "Last": "Lovelace", "Session": ""}
+    payload = map_row(row, MAPPING, DEFAULTS)
+    assert payload == {"activityType": "webinar", "activityTitle": {"type": "text"},
+                       "user": {"email": "ada@example.com", "fullName": "Ada Lovelace"}}
+    assert map_row({"user.email": "a@b.c", "_row": 3}, None, None) == {"user": {"email": "a@b.c"}}
+    assert map_row({"person": {"mail": "a@b.c"}}, {"user.email": "person.mail"}, None) == {"user": {"email": "a@b.c"}}
+    assert map_row({"user.email": "a@b.c"}, {"user.email": "{user.email}"}, None) == {"user": {"email": "a@b.c"}}
+    assert map_row({"user.email": "a@b.c", None: ["extra"]}, None, None) == {"user": {"email": "a@b.c"}}
+    print("✓ Row mapping")
+
+def test_paths_are_confined():
+    """Import is off without COMMONROOM_IMPORT_DIR and never reads outside it"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "attendees.csv")
+        write_csv(path, 1)
+        os.environ.pop("COMMONROOM_IMPORT_DIR", None)
+        for attempt in (path, "/etc/passwd"):
+            try:
+                check_path(attempt)
+                assert False, "expected import to be disabled"
+            except ValueError as e:
+                assert "COMMONROOM_IMPORT_DIR" in str(e)
+        os.environ["COMMONROOM_IMPORT_DIR"] = tmp
+        try:
+            assert check_path("attendees.csv") == os.path.realpath(path)
+            for outside in ("/etc/passwd", "../etc/passwd"):
+                try:
+                    check_path(outside)
+                    assert False, f"{outside} was accepted"
+                except ValueError as e:
+                    assert "inside" in str(e)
+        finally:
+            del os.environ["COMMONROOM_IMPORT_DIR"]
+    print("✓ Import paths confined to COMMONROOM_IMPORT_DIR")
+
+def test_progress_counts_settled_rows():
+    """Counts only include rows below the low-water mark, which a resume never sends again"""
+    progress = Progress(10, {"created": 10})
+    progress.finish(12, "created")
+    progress.finish(11, "failed")
+    assert progress.done == 10 and progress.counts == {"created": 10}
+    progress.finish(10, "invalid")
+    assert progress.done == 13 and progress.counts == {"created": 11, "failed": 1, "invalid": 1}
+    print("✓ Checkpointed counts match the low-water mark")
+
+def test_import_with_rejects():
+    """Valid rows are posted with bounded concurrency; bad rows go to the rejects file"""
+    api = Api(fail={"user5@example.com"})
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "attendees.csv")
+        write_csv(path, 500, bad={3, 250})
+        summary = run_import(api, path, concurrency=4)
+        assert summary["complete"] and summary["rows_done"] == 500
+        assert summary["counts"] == {"created": 497, "skipped": 0, "invalid": 2, "failed": 1}
+        assert api.max_in_flight <= 4 and len(set(api.posted)) == 497
+        with open(summary["rejects"]) as f:
+            rejects = [json.loads(line) for line in f]
+        assert [r["_row"] for r in rejects if r["_error"].startswith("user.email")] == [3, 250]
+        assert any(r["Email"] == "user5@example.com" and r["_error"].startswith("400") for r in rejects)
+        assert sorted(os.listdir(tmp)) == [".import_state", "attendees.csv"]
+        again = run_import(api, path)
+        assert "already imported" in again["note"] and len(api.posted) == 497
+    print(f"✓ Imported 497 rows, 3 rejected, at most {api.max_in_flight} in flight")
+
+def test_bad_rows_do_not_stop_the_import():
+    """Ragged CSV rows and dotted templates map; a row that cannot be mapped is rejected, not fatal"""
+    api = Api()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ragged.csv")
+        with open(path, "w", newline="") as f:
+            f.write("user.email,Name\na@example.com,Ada\nb@example.com,Bob,extra,cells\n"
+                    "c@example.com,Cy\n")
+        summary = run_import(api, path, mapping=None)
+        assert summary["counts"] == {"created": 3, "skipped": 0, "invalid": 0, "failed": 0}
+        summary = run_import(api, path, restart=True,
+                             mapping={"user.email": "{user.email}", "user.fullName": "{Name}"})
+        assert summary["complete"] and summary["counts"]["created"] == 3
+        summary = run_import(api, path, restart=True, mapping={"user.email": "{user.email}",
+                                                              "activityType.name": "Name"})
+        assert summary["complete"] and summary["counts"]["invalid"] == 3
+        assert "activityType" in summary["failures"][0]["error"]
+    print("✓ Ragged rows and dotted templates import; unmappable rows are rejected")
+
+def test_resume_from_checkpoint():
+    """An import stopped part way continues from the checkpoint without re-posting finished rows"""
+    api = Api()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "attendees.csv")
+        write_csv(path, 1000)
+        first = run_import(api, path, max_rows=300)
+        assert not first["complete"] and first["rows_done"] == 300 and len(api.posted) == 300
+        second = run_import(api, path)
+        assert second["resumed_from"] == 300 and second["complete"]
+        assert len(api.posted) == len(set(api.posted)) == 1000
+        try:
+            run_import(api, path, mapping={"user.email": "Email"})
+            assert False, "expected a checkpoint mismatch"
+        except ValueError as e:
+            assert "restart" in str(e)
+        assert run_import(api, path, mapping={"user.email": "Email"}, restart=True)["counts"]["created"] == 1000
+    print("✓ Resumed from the checkpoint")
+
+def test_memory_is_flat():
+    """Peak memory does not grow with the number of rows"""
+    peaks = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in (2000, 20000):
+            path = os.path.join(tmp, f"rows{rows}.csv")
+            write_csv(path, rows)
+            tracemalloc.start()
+            run_import(Api(), path, dry_run=True)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    assert peaks[1] < peaks[0] * 1.5, peaks
+    print(f"✓ Peak memory {peaks[0] // 1024} KiB for 2k rows, {peaks[1] // 1024} KiB for 20k rows")
+
+if __name__ == "__main__":
+    test_map_row()
+    test_paths_are_confined()
+    test_progress_counts_settled_rows()
+    test_import_with_rejects()
+    test_bad_rows_do_not_stop_the_import()
+    test_resume_from_checkpoint()
+    test_memory_is_flat()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Test structured logging: levels, lazy formatting, sampling, redaction and request IDs
+"""
+
+import asyncio
+import io
+import json
+import os
+import httpx
+import commonroom_client
+from commonroom_client import AsyncCommonRoomClient
+import logs
+import server
+
+class Rendered:
+    """Counts how often it is turned into text"""
+    count = 0
+
+    def __str__(self):
+        Rendered.count += 1
+        return "rendered"
+
+def capture(**env) -> io.StringIO:
+    """Reconfigure the commonroom logger from env, writing to a buffer"""
+    for key, value in env.items():
+        os.environ[key] = value
+    logger = logs.configure_logging(force=True)
+    for key in env:
+        del os.environ[key]
+    stream = io.StringIO()
+    logger.handlers[0].setStream(stream)
+    return stream
+
+def records(stream: io.StringIO) -> list:
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+def test_levels_and_lazy_formatting():
+    """Nothing below the level is formatted or written"""
+    stream = capture(COMMONROOM_LOG_LEVEL="WARNING")
+    log = logs.get_logger("test")
+    log.debug("payload %s", Rendered())
+    log.info("payload %s", Rendered())
+    assert Rendered.count == 0 and stream.getvalue() == ""
+    log.warning("payload %s", Rendered())
+    assert Rendered.count == 1 and records(stream)[0]["event"] == "payload rendered"
+    print("✓ Level-gated, lazily formatted")
+
+def test_redaction():
+    """Contact fields are masked at any depth, plus COMMONROOM_LOG_REDACT names"""
+    stream = capture(COMMONROOM_LOG_LEVEL="DEBUG", COMMONROOM_LOG_REDACT="title")
+    logs.get_logger("test").debug("activity", extra={"fields": {"activity": {
+        "id": "a1", "title": "Secret launch", "user": {"email": "ada@example.com", "id": "u1"},
+        "users": [{"fullName": "Ada Lovelace"}]}}})
+    activity = records(stream)[0]["activity"]
+    assert activity["id"] == "a1" and activity["user"] == {"email": "[redacted]", "id": "u1"}
+    assert activity["title"] == "[redacted]" and activity["users"] == [{"fullName": "[redacted]"}]
+    print("✓ Fields redacted")
+
+def test_api_user_is_redacted():
+    """Every identifying field of a spec ApiUser is masked; ids and tags are kept"""
+    user = {"id": "u1", "email": "ada@example.com", "fullName": "Ada Lovelace", "username": "ada",
+            "avatarUrl": "https://example.com/ada.png", "bio": "Analytical engines", "companyName": "Acme",
+            "city": "London", "region": "England", "rawLocation": "London, UK",
+            "github": {"type": "handle", "value": "ada"}, "twitter": {"type": "handle", "value": "@ada"},
+            "linkedin": {"type": "url", "value": "https://linkedin.com/in/ada"},
+            "discord": {"type": "handle", "value": "ada#1815"}, "tags": [{"type": "name", "name": "VIP"}]}
+    redacted = logs.redact({"activityType": "webinar", "user": user})
+    assert redacted["activityType"] == "webinar"
+    assert redacted["user"]["id"] == "u1" and redacted["user"]["tags"] == user["tags"]
+    leaked = [key for key, value in redacted["user"].items() if key not in ("id", "tags") and value != "[redacted]"]
+    assert leaked == [], leaked
+    print("✓ Spec ApiUser redacted")
+
+def test_sampling():
+    """Sampling keeps or drops whole requests; warnings are always kept"""
+    stream = capture(COMMONROOM_LOG_LEVEL="DEBUG", COMMONROOM_LOG_SAMPLE_RATE="0.5")
+    log = logs.get_logger("test")
+    kept = 0
+    for _ in range(200):
+        token = logs.new_request_id()
+        log.debug("first")
+        log.debug("second")
+        log.warning("always")
+        logs.request_id.reset(token)
+    by_request = {}
+    for record in records(stream):
+        if record["level"] == "debug":
+            by_request[record["request_id"]] = by_request.get(record["request_id"], 0) + 1
+        else:
+            kept += 1
+    assert kept == 200
+    assert set(by_request.values()) == {2} and 50 < len(by_request) < 150
+    print(f"✓ Sampled {len(by_request)} of 200 requests")
+
+def test_request_id_correlates_http_calls():
+    """A tool call's API requests are logged with its request ID; payloads stay off stderr by default"""
+    def api(request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            return httpx.Response(200, json=[{"id": "webinar", "displayName": "Webinar"}])
+        return httpx.Response(202)
+
+    async def run():
+        os.environ['COMMONROOM_KEY'] = 'logs_test_key'
+        client = AsyncCommonRoomClient(transport=httpx.MockTransport(api))
+        shared = commonroom_client.get_async_client
+        commonroom_client.get_async_client = lambda tenant=None: client
+        try:
+            await server.handle_call_tool("commonroom_add_activity", {"activity": {
+                "activityType": "webinar", "user": {"email": "ada@example.com"}}})
+        finally:
+            commonroom_client.get_async_client = shared
+            await client.aclose()
+
+    quiet = capture()
+    asyncio.run(run())
+    assert quiet.getvalue() == ""
+
+    stream = capture(COMMONROOM_LOG_LEVEL="DEBUG")
+    asyncio.run(run())
+    entries = records(stream)
+    assert len({entry["request_id"] for entry in entries}) == 1
+    events = [entry["event"] for entry in entries]
+    assert events[0] == "add_activity prepared" and events[-1] == "tool call"
+    assert {"endpoint": "/source/{destinationSourceId}/activity", "status": 202}.items() <= \
+        next(entry for entry in entries if entry.get("method") == "POST").items()
+    assert "ada@example.com" not in stream.getvalue()
+    capture()
+    print("✓ Request ID shared by the tool call and its API requests")
+
+if __name__ == "__main__":
+    test_levels_and_lazy_formatting()
+    test_redaction()
+    test_api_user_is_redacted()
+    test_sampling()
+    test_request_id_correlates_http_calls()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test server and API call metrics
+"""
+
+import asyncio
+import json
+import os
+import httpx
+import commonroom_client
+from commonroom_client import AsyncCommonRoomClient
+from metrics import Histogram, Metrics, endpoint, get_metrics
+import server
+
+def test_histogram_and_endpoints():
+    """Bucketed percentiles and bounded endpoint labels"""
+    histogram = Histogram()
+    for ms in range(1, 101):
+        histogram.observe(ms / 1000)
+    summary = histogram.summary()
+    assert summary["count"] == 100 and summary["max_ms"] == 100.0
+    assert 40 <= summary["p50_ms"] <= 60 and 90 <= summary["p99_ms"] <= 100
+    assert endpoint("/user/a%40example.com") == "/user/{email}"
+    assert endpoint("/source/138683/activity") == "/source/{destinationSourceId}/activity"
+    assert endpoint("/segments/42/status") == "/segments/{id}/status"
+    assert endpoint("/members/customFields") == "/members/customFields"
+    print("✓ Histogram percentiles and endpoint templates")
+
+def test_prometheus_format():
+    """Cumulative buckets, escaped labels and rate limit gauges"""
+    metrics = Metrics()
+    metrics.observe_tool('commonroom_get_tags', 'ok', 0.02, 0.001, 120)
+    metrics.observe_request('GET', '/user/x@example.com', 404, 0.2, bytes_in=30)
+    metrics.observe_request('GET', '/user/y@example.com', None, 1.5, retry=True)
+    text = metrics.prometheus()
+    assert 'commonroom_tool_calls_total{tool="commonroom_get_tags",outcome="ok"} 1' in text
+    assert 'commonroom_api_requests_total{method="GET",endpoint="/user/{email}",status="404"} 1' in text
+    assert 'commonroom_api_requests_total{method="GET",endpoint="/user/{email}",status="error"} 1' in text
+    assert ('commonroom_api_request_duration_seconds_bucket'
+            '{method="GET",endpoint="/user/{email}",le="+Inf"} 2') in text
+    assert 'commonroom_api_retries_total{method="GET",endpoint="/user/{email}"} 1' in text
+    assert 'commonroom_rate_limit_wait_seconds_count 2' in text
+    metrics.reset()
+    assert metrics.snapshot()["api"] == {}
+    assert not Metrics(enabled=False).observe_tool('x', 'ok', 1.0)
+    print("✓ Prometheus text exposition")
+
+def test_tool_and_request_metrics():
+    """A tool call records tool latency, encode time and each API attempt"""
+    attempts = []
+
+    def api(request: httpx.Request) -> httpx.Response:
+        attempts.append(request.url.path)
+        if len(attempts) == 1:
+            return httpx.Response(503, json={"message": "busy"})
+        return httpx.Response(200, json=[{"id": 1, "name": "Champions"}],
+                              headers={"X-RateLimit-Limit": "100", "X-RateLimit-Remaining": "98"})
+
+    async def run():
+        os.environ['COMMONROOM_KEY'] = 'metrics_test_key'
+        os.environ['COMMONROOM_RETRY_BACKOFF'] = '0'
+        client = AsyncCommonRoomClient(transport=httpx.MockTransport(api))
+        shared = commonroom_client.get_async_client
+        commonroom_client.get_async_client = lambda tenant=None: client
+        try:
+            get_metrics().reset()
+            await server.handle_call_tool("commonroom_get_segments", {"refresh": True})
+            await server.handle_call_tool("commonroom_get_segments", {"limit": 0})
+            text = (await server.handle_call_tool("commonroom_server_stats", {"reset": True}))[0].text
+        finally:
+            commonroom_client.get_async_client = shared
+            del os.environ['COMMONROOM_RETRY_BACKOFF']
+            await client.aclose()
+        return json.loads(text)
+
+    stats = asyncio.run(run())
+    segments = stats["tools"]["commonroom_get_segments"]
+    assert segments["outcomes"] == {"ok": 1, "invalid": 1}
+    assert segments["encode"]["count"] == 1 and segments["response_bytes"] > 0
+    api = stats["api"]["GET /segments"]
+    assert api["statuses"] == {"503": 1, "200": 1} and api["retries"] == 1 and api["bytes_in"] > 0
+    assert any(limit["limit"] == 100 for limit in stats["rate_limits"])
+    assert list(get_metrics().snapshot()["tools"]) == ["commonroom_server_stats"]  # recorded after the reset
+    print("✓ Tool and API metrics through the stats tool")
+
+if __name__ == "__main__":
+    test_histogram_and_endpoints()
+    test_prometheus_format()
+    test_tool_and_request_metrics()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Test result projection, paging and output formats
+"""
+
+import json
+from output import project, render, shape, table
+import server
+
+SEGMENTS = [{"id": i, "name": f"Segment {i}", "description": "x" * 200,
+             "filters": {"tags": ["vip"], "created": "2024-01-01"}} for i in range(200)]
+
+def test_projection_and_paging():
+    """fields keeps only the named (dotted) fields; limit/offset page the list"""
+    assert project({"a": 1, "b": {"c": 2, "d": 3}}, ["a", "b.c", "missing.x"]) == {"a": 1, "b": {"c": 2}}
+
+    page = shape(SEGMENTS, "list", {"fields": ["id", "name"], "limit": 2, "offset": 10})
+    assert page == {"total": 200, "offset": 10, "returned": 2,
+                    "items": [{"id": 10, "name": "Segment 10"}, {"id": 11, "name": "Segment 11"}]}
+
+    tags = shape({"labels": [{"id": 1, "name": "vip", "color": "red"}]}, "labels", {"fields": ["name"]})
+    assert tags == {"labels": [{"name": "vip"}]}
+    assert shape(SEGMENTS, None, {}) is SEGMENTS
+    print("✓ Projection and paging")
+
+def test_formats_and_size():
+    """Compact and table output are much smaller than the default pretty JSON"""
+    pretty = render(SEGMENTS, {}, "list")
+    assert json.loads(pretty) == SEGMENTS
+    compact = render(SEGMENTS, {"format": "compact"}, "list")
+    assert json.loads(compact) == SEGMENTS and len(compact) < len(pretty)
+
+    small = render(SEGMENTS, {"fields": ["id", "name"], "format": "compact"}, "list")
+    assert len(small) < len(pretty) / 10
+    rows = render(SEGMENTS[:2], {"fields": ["id", "name"], "format": "table"}, "list")
+    assert rows == "id\tname\n0\tSegment 0\n1\tSegment 1"
+    assert table({"total": 1, "results": [{"email": "a@example.com"}]}) == "total\t1\n\nresults:\nemail\na@example.com"
+    print(f"✓ {len(pretty)} bytes pretty, {len(compact)} compact, {len(small)} with id,name")
+
+def test_tool_schemas():
+    """List and lookup tools accept the output options; write tools do not"""
+    segments = server.registry.tools["commonroom_get_segments"].inputSchema["properties"]
+    assert {"fields", "limit", "offset", "format"} <= set(segments)
+    user = server.registry.tools["commonroom_get_user"].inputSchema["properties"]
+    assert "fields" in user and "limit" not in user
+    assert "format" not in server.registry.tools["commonroom_add_user"].inputSchema["properties"]
+    assert server.registry.outputs["commonroom_get_tags"] == "labels"
+    server.registry.validate_arguments("commonroom_get_segments", {"fields": ["id", "name"], "format": "table"})
+    print("✓ Output options in tool schemas")
+
+if __name__ == "__main__":
+    test_projection_and_paging()
+    test_formats_and_size()
+    test_tool_schemas()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test rate limit tracking and request pacing
+"""
+
+import asyncio
+import os
+import time
+import httpx
+from rate_limiter import RateLimiter, parse_reset
+from commonroom_client import AsyncCommonRoomClient
+
+def test_headers_and_slots():
+    """Quota is read from headers and requests wait for the reset once exhausted"""
+    now = [1_700_000_000.0]
+    limiter = RateLimiter(clock=lambda: now[0])
+    assert limiter.reserve_slot() == 0.0  # unknown quota never blocks
+
+    limiter.update({'X-RateLimit-Limit': '10', 'X-RateLimit-Remaining': '1',
+                    'X-RateLimit-Reset': str(int(now[0]) + 30)}, 200)
+    assert limiter.reserve_slot() == 0.0
+    assert limiter.reserve_slot() == 30.0
+
+    now[0] += 30
+    assert limiter.reserve_slot() == 0.0
+    assert limiter.headroom()['remaining'] == 9
+    print("✓ Quota tracking and reset")
+
+def test_429_and_retry_after():
+    """A 429 exhausts the quota until Retry-After"""
+    now = [1_700_000_000.0]
+    limiter = RateLimiter(clock=lambda: now[0])
+    limiter.update({'Retry-After': '2023-11-14T22:13:40Z'}, 429)
+    assert limiter.reserve_slot() == 20.0
+    assert limiter.headroom()['throttled_responses'] == 1
+    assert parse_reset('5', now[0]) == now[0] + 5
+    print("✓ 429 handling")
+
+def test_client_waits_for_reset():
+    """The async client pauses instead of sending into an exhausted quota"""
+    sent = []
+
+    def api(request: httpx.Request) -> httpx.Response:
+        sent.append(time.monotonic())
+        return httpx.Response(200, json=[], headers={
+            'X-RateLimit-Limit': '5', 'X-RateLimit-Remaining': '0',
+            'X-RateLimit-Reset': str(time.time() + 0.3)})
+
+    async def run():
+        os.environ['COMMONROOM_KEY'] = 'rate_limit_test_key'
+        client = AsyncCommonRoomClient(transport=httpx.MockTransport(api))
+        await client.get_segment("1")
+        await client.get_segment("2")
+        headroom = client.rate_limiter.headroom()
+        await client.aclose()
+        return headroom
+
+    headroom = asyncio.run(run())
+    assert sent[1] - sent[0] >= 0.25, f"Second request was not paced ({sent[1] - sent[0]:.2f}s)"
+    assert headroom['waits'] == 1
+    print(f"✓ Client paced requests by {sent[1] - sent[0]:.2f}s")
+
+if __name__ == "__main__":
+    test_headers_and_slots()
+    test_429_and_retry_after()
+    test_client_waits_for_reset()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test deterministic IDs and skipping writes that were already sent
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import httpx
+from commonroom_client import AsyncCommonRoomClient, generate_user_id, with_generated_ids
+
+ACTIVITY = {
+    "activityType": "attended_gathering",
+    "user": {"email": "Kourtney@Example.com", "fullName": "Kourtney Meiss"},
+    "activityTitle": {"type": "text", "value": "AI/TX Meetup - August 2024"},
+    "url": "https://lu.ma/aitx-aug25",
+    "timestamp": "2024-08-26T23:00:00Z"
+}
+
+def test_deterministic_ids():
+    """Same identifying fields give the same IDs; other fields do not matter"""
+    first = with_generated_ids(ACTIVITY, mode="deterministic")
+    second = with_generated_ids(dict(ACTIVITY, content={"type": "text", "value": "notes"}), mode="deterministic")
+    assert first["id"] == second["id"]
+    assert first["user"]["id"] == generate_user_id({"email": "kourtney@example.com"}, mode="deterministic")
+    assert with_generated_ids(dict(ACTIVITY, url="https://other"), mode="deterministic")["id"] != first["id"]
+    assert with_generated_ids(ACTIVITY)["id"] != with_generated_ids(ACTIVITY)["id"]
+    print(f"✓ Deterministic activity ID: {first['id']}")
+
+def test_replay_skips_network():
+    """Re-sending an identical payload is skipped; a changed payload is sent"""
+    posted = []
+
+    def api(request: httpx.Request) -> httpx.Response:
+        posted.append(json.loads(request.content))
+        return httpx.Response(202)
+
+    async def run(index_path):
+        os.environ.update(COMMONROOM_KEY='sent_index_test_key', COMMONROOM_ID_MODE='deterministic',
+                          COMMONROOM_SENT_INDEX=index_path)
+        try:
+            client = AsyncCommonRoomClient(transport=httpx.MockTransport(api))
+            activity = with_generated_ids(ACTIVITY)
+            first = await client.add_activity("123", activity)
+            replay = await client.add_activity("123", with_generated_ids(ACTIVITY))
+            updated = dict(ACTIVITY, content={"type": "text", "value": "new"})
+            changed = await client.add_activity("123", with_generated_ids(updated))
+            bulk = await client.add_activities_bulk("123", [updated, dict(ACTIVITY, url="https://new")])
+            await client.aclose()
+        finally:
+            del os.environ['COMMONROOM_ID_MODE'], os.environ['COMMONROOM_SENT_INDEX']
+        return first, replay, changed, bulk
+
+    with tempfile.TemporaryDirectory() as tmp:
+        first, replay, changed, bulk = asyncio.run(run(os.path.join(tmp, "sent.db")))
+    assert first == {} and changed == {}
+    assert replay["status"] == "skipped"
+    assert [item["status"] for item in bulk["results"]] == ["skipped", "created"]
+    assert len(posted) == 3
+    print(f"✓ {len(posted)} posts for 5 writes")
+
+if __name__ == "__main__":
+    test_deterministic_ids()
+    test_replay_skips_network()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test that server startup stays light
+"""
+
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from bench_startup import spawn_once
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Loaded on the first tool call that needs them, never at startup
+LAZY_MODULES = ("commonroom_client", "requests", "version_checker")
+
+def test_import_defers_heavy_modules():
+    """Importing server.py loads neither the API client, requests nor .env"""
+    code = ("import json, os, sys, config, server; "
+            f"print(json.dumps([[m for m in {LAZY_MODULES!r} if m in sys.modules], config._env_loaded]))")
+    output = subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True,
+                            text=True, check=True).stdout
+    loaded, env_loaded = json.loads(output)
+    assert loaded == [], f"Loaded at startup: {loaded}"
+    assert env_loaded is False
+    print("✓ Heavy modules and .env deferred")
+
+def cli_state(*args: str) -> dict:
+    """What server.cli() has loaded by the time it hands over to a transport (stubbed out)"""
+    code = ("import asyncio, json, os, sys, config, server, http_transport\n"
+            "def state(**kwargs):\n"
+            f"    return dict(kwargs, loaded=[m for m in {LAZY_MODULES!r} if m in sys.modules], "
+            "env_loaded=config._env_loaded)\n"
+            "async def main():\n"
+            "    print(json.dumps(state(transport='stdio')))\n"
+            "def serve(app, startup, shutdown, **kwargs):\n"
+            "    print(json.dumps(state(transport='http', **kwargs)))\n"
+            "server.main, http_transport.serve = main, serve\n"
+            f"sys.argv = ['server.py', *{list(args)!r}]\n"
+            "server.cli()\n")
+    env = {k: v for k, v in os.environ.items() if not k.startswith("COMMONROOM_")}
+    env["COMMONROOM_HTTP_PORT"] = "8123"
+    output = subprocess.run([sys.executable, "-c", code], cwd=HERE, env=env, capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output)
+
+def test_cli_reads_settings_only_for_http():
+    """Choosing a transport loads nothing; HTTP settings are read once HTTP is selected"""
+    stdio = cli_state()
+    assert stdio["transport"] == "stdio" and not stdio["env_loaded"] and stdio["loaded"] == []
+    http = cli_state("--transport", "http", "--stateless")
+    assert http["transport"] == "http" and http["env_loaded"] and http["loaded"] == []
+    assert http["port"] == 8123 and http["host"] == "127.0.0.1" and http["stateless"] is True
+    assert http["json_response"] is False
+    print("✓ HTTP settings read only for --transport http")
+
+def test_stdio_main_defers_env():
+    """The real stdio main() starts without reading .env; the first tool call loads it and its log settings"""
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, ".env"), "w") as f:
+            f.write("COMMONROOM_POISON=1\nCOMMONROOM_LOG_LEVEL=DEBUG\n")
+        code = ("import asyncio, contextlib, json, logging, os, sys, config, server\n"
+                f"config.__file__ = {os.path.join(tmp, 'config.py')!r}  # .env is read from this directory\n"
+                "def state():\n"
+                "    return {'env_loaded': config._env_loaded, 'poisoned': 'COMMONROOM_POISON' in os.environ,\n"
+                "            'level': logging.getLogger('commonroom').level}\n"
+                "@contextlib.asynccontextmanager\n"
+                "async def stdio_server():\n"
+                "    yield None, None\n"
+                "async def run(read_stream, write_stream, options):\n"
+                "    started = state()\n"
+                "    await server.handle_call_tool('commonroom_create_tag', {})\n"
+                "    print(json.dumps([started, state()]))\n"
+                "server.stdio_server, server.app.run = stdio_server, run\n"
+                "asyncio.run(server.main())\n")
+        env = {k: v for k, v in os.environ.items() if not k.startswith("COMMONROOM_")}
+        env.update(COMMONROOM_SPEC_CHECK="false", COMMONROOM_WRITE_QUEUE=os.path.join(tmp, "queue.db"))
+        output = subprocess.run([sys.executable, "-c", code], cwd=HERE, env=env, capture_output=True,
+                                text=True, check=True).stdout
+    started, after_call = json.loads(output)
+    assert started == {"env_loaded": False, "poisoned": False, "level": logging.WARNING}, started
+    assert after_call == {"env_loaded": True, "poisoned": True, "level": logging.DEBUG}, after_call
+    print("✓ stdio main() starts without .env; the first tool call applies it")
+
+def test_cold_start_lists_tools():
+    """A spawned server answers initialize and tools/list without credentials"""
+    env = {k: v for k, v in os.environ.items() if not k.startswith("COMMONROOM_")}
+    with tempfile.TemporaryDirectory() as tmp:
+        env["COMMONROOM_WRITE_QUEUE"] = os.path.join(tmp, "queue.db")
+        run = spawn_once(sys.executable, env)
+        assert os.listdir(tmp) == [], "write queue opened without write-behind"
+    assert run["tools"] > 20
+    print(f"✓ tools/list {run['tools_list']:.0f}ms after spawn")
+
+if __name__ == "__main__":
+    test_import_defers_heavy_modules()
+    test_cli_reads_settings_only_for_http()
+    test_stdio_main_defers_env()
+    test_cold_start_lists_tools()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test tag management: the name -> id index, tag CRUD tools and bulk tagging by name
+"""
+
+import asyncio
+import json
+import os
+import httpx
+import fake_api
+import server
+from tag_index import TagIndex
+from tool_registry import ToolInputError
+
+def test_tag_index():
+    """Case-insensitive names, renames, deletes and reloads"""
+    index = TagIndex()
+    tags = {"labels": [{"id": "1", "name": "Speaker"}, {"id": "2", "name": "Champion"}]}
+    index.load(tags)
+    assert index.lookup("  speaker ")["id"] == "1" and index.lookup("Advocate") is None
+    index.add({"id": "1", "name": "Keynote Speaker"})
+    assert index.lookup("speaker") is None and index.lookup("keynote  speaker")["id"] == "1"
+    index.remove("2")
+    index.add({"id": "3", "name": "Old", "deletedAt": "2026-01-01T00:00:00Z"})
+    assert index.names() == ["Keynote Speaker"]
+    index.load(tags)  # the same list object: the incremental state is kept
+    assert index.loads == 1 and index.snapshot() == {"labels": [{"id": "1", "name": "Keynote Speaker"}]}
+    print("✓ Tag index")
+
+def test_tag_tools_share_one_listing():
+    """CRUD and bulk tagging keep the index current with a single GET /tags"""
+    fake = fake_api.FakeCommonRoom()
+    httpd = fake_api.start(fake)
+
+    def tool(name: str):
+        return server.registry.get_handler(name)
+
+    async def run():
+        from commonroom_client import AsyncCommonRoomClient
+        client = AsyncCommonRoomClient()
+        try:
+            speaker = await tool("commonroom_create_tag")(client, {"name": "Speaker"})
+            found = await tool("commonroom_get_or_create_tag")(client, {"name": "speaker"})
+            renamed = await tool("commonroom_update_tag")(client, {"tag_id": speaker["id"], "name": "Keynote"})
+            created = await asyncio.gather(*(tool("commonroom_get_or_create_tag")(client, {"name": "Champion"})
+                                             for _ in range(20)))
+            doomed = await client.create_tag("Doomed")
+            await tool("commonroom_delete_tag")(client, {"tag_id": doomed["id"]})
+            bulk = await tool("commonroom_tag_users")(client, {
+                "emails": [f"user{i}@example.com" for i in range(300)], "tags": ["keynote", "Champion", "VIP"]})
+            try:
+                await tool("commonroom_tag_users")(client, {"emails": ["a@b.c"], "tags": ["Nope"],
+                                                           "create_missing": False})
+                assert False, "expected ToolInputError"
+            except ToolInputError as e:
+                assert "Nope" in str(e)
+            listed = await tool("commonroom_get_tags")(client, {})
+            return speaker, found, renamed, created, bulk, listed, client.cache_stats()["tag_index"]
+        finally:
+            await client.aclose()
+
+    os.environ.update(COMMONROOM_KEY="tags_test_key", COMMONROOM_API_URL=httpd.api_url)
+    try:
+        speaker, found, renamed, created, bulk, listed, stats = asyncio.run(run())
+    finally:
+        del os.environ["COMMONROOM_API_URL"]
+        httpd.shutdown()
+
+    requests = fake.stats()["requests"]
+    assert found == {"status": "existing", "tag": speaker}
+    assert renamed["name"] == "Keynote"
+    assert [item["status"] for item in created].count("created") == 1
+    assert bulk["tagged"] == 300 and bulk["created_tags"] == ["VIP"]
+    assert sorted(tag["name"] for tag in listed["labels"]) == ["Champion", "Keynote", "VIP"]
+    assert requests["GET /tags"] == 1, requests
+    assert requests["POST /tags"] == 4  # Speaker, Champion, Doomed, VIP
+    assert requests["POST /source/{destinationSourceId}/user"] == 300
+    assert stats["tags"] == 3 and stats["loads"] == 1
+    print(f"✓ Tagged 300 contacts with {requests['GET /tags']} tag listing and {requests['POST /tags']} creates")
+
+def test_tag_users_is_idempotent():
+    """Bulk tagging an email again sends the same contact ID, whatever COMMONROOM_ID_MODE is"""
+    ids = []
+
+    async def api(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/tags"):
+            return httpx.Response(200, json={"labels": [{"id": "1", "name": "Speaker"}]})
+        ids.append(json.loads(request.content)["id"])
+        return httpx.Response(200, json={})
+
+    async def run():
+        from commonroom_client import AsyncCommonRoomClient
+        client = AsyncCommonRoomClient(transport=httpx.MockTransport(api))
+        try:
+            await client.tag_users("source", ["ada@example.com"], ["Speaker"])
+        finally:
+            await client.aclose()
+
+    os.environ.update(COMMONROOM_KEY="tags_test_key", COMMONROOM_SENT_INDEX_ENABLED="false")
+    for mode in ("random", "random", "deterministic"):
+        os.environ["COMMONROOM_ID_MODE"] = mode
+        try:
+            asyncio.run(run())
+        finally:
+            del os.environ["COMMONROOM_ID_MODE"]
+    del os.environ["COMMONROOM_SENT_INDEX_ENABLED"]
+    assert len(ids) == 3 and len(set(ids)) == 1, ids
+    print("✓ Bulk tagging reuses one contact ID per email")
+
+if __name__ == "__main__":
+    test_tag_index()
+    test_tag_tools_share_one_listing()
+    test_tag_users_is_idempotent()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test multi-tenant mode: per-tenant credentials, clients, caches and rate limits
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import fake_api
+import server
+from tenants import TenantRegistry, UnknownTenant
+from write_queue import WriteQueue
+
+def write_tenants(path: str, tenants: dict, default: str = None):
+    with open(path, "w") as f:
+        json.dump({"default": default, "tenants": tenants}, f)
+
+def test_registry():
+    """File tenants, key_env indirection, the environment tenant and unknown names"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tenants.json")
+        os.environ["ACME_TEST_KEY"] = "acme-key"
+        os.environ["COMMONROOM_KEY"] = "tenants_test_key"
+        write_tenants(path, {"acme": {"key_env": "ACME_TEST_KEY", "destination_id": "1"},
+                             "globex": {"key": "globex-key", "base_url": "https://app.example/globex"}}, "acme")
+        registry = TenantRegistry(path)
+        assert registry.get().name == "acme" and registry.get().api_key == "acme-key"
+        assert registry.get("globex").base_url == "https://app.example/globex"
+        assert registry.names() == ["acme", "globex", "default"]
+        assert registry.get("default").api_key == "tenants_test_key"
+        try:
+            registry.get("initech")
+            assert False, "expected UnknownTenant"
+        except UnknownTenant as e:
+            assert "acme" in str(e)
+        listed = {tenant["name"]: tenant for tenant in registry.list()}
+        assert listed["acme"]["default"] and "acme-key" not in json.dumps(listed)
+        del os.environ["ACME_TEST_KEY"]
+    print("✓ Tenant registry")
+
+def test_tenants_are_isolated():
+    """Each tenant gets its own API, pool, cache and rate limiter"""
+    acme = fake_api.FakeCommonRoom(rate_limit=3, window=60)
+    globex = fake_api.FakeCommonRoom()
+    acme_httpd, globex_httpd = fake_api.start(acme), fake_api.start(globex)
+
+    async def call(name: str, arguments: dict) -> str:
+        return (await server.handle_call_tool(name, arguments))[0].text
+
+    async def run():
+        from commonroom_client import close_async_client, get_async_client
+        try:
+            for _ in range(3):
+                await call("commonroom_get_activity_types", {"tenant": "acme"})
+                await call("commonroom_get_activity_types", {"tenant": "globex"})
+            # acme spends its quota; globex's is untouched
+            await call("commonroom_get_user", {"tenant": "acme", "email": "user0@example.com"})
+            await call("commonroom_get_user", {"tenant": "acme", "email": "user1@example.com"})
+            urls = json.loads(await call("commonroom_get_dashboard_urls", {"tenant": "globex"}))
+            unknown = await call("commonroom_get_tags", {"tenant": "initech"})
+            clients = get_async_client("acme"), get_async_client("globex")
+            return urls, unknown, clients, [client.rate_limiter.headroom() for client in clients]
+        finally:
+            await close_async_client()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tenants.json")
+        write_tenants(path, {
+            "acme": {"key": "acme-key", "api_url": acme_httpd.api_url, "destination_id": "1"},
+            "globex": {"key": "globex-key", "api_url": globex_httpd.api_url, "destination_id": "2",
+                       "base_url": "https://app.example/globex", "max_concurrency": 2},
+        })
+        os.environ["COMMONROOM_TENANTS_FILE"] = path
+        try:
+            urls, unknown, (acme_client, globex_client), (acme_limit, globex_limit) = asyncio.run(run())
+        finally:
+            del os.environ["COMMONROOM_TENANTS_FILE"]
+            acme_httpd.shutdown()
+            globex_httpd.shutdown()
+
+    assert acme.stats()["requests"]["GET /activityTypes"] == 1
+    assert globex.stats()["requests"]["GET /activityTypes"] == 1
+    assert acme_client.http is not globex_client.http and globex_client.max_concurrency == 2
+    assert acme_limit["tenant"] == "acme" and acme_limit["remaining"] == 0
+    assert globex_limit["tenant"] == "globex" and globex_limit["remaining"] is None
+    assert urls["home"] == "https://app.example/globex/home"
+    assert unknown.startswith("Invalid arguments for commonroom_get_tags: Unknown tenant 'initech'")
+    print("✓ Tenants use separate APIs, caches and rate limits")
+
+def test_queued_writes_keep_their_tenant():
+    """Queued writes are sent with the tenant that queued them"""
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = WriteQueue(os.path.join(tmp, "queue.db"))
+        queue.enqueue("user", "2", {"id": "user_1"}, "globex")
+        queue.enqueue("user", "1", {"id": "user_2"})
+        assert [item["tenant"] for item in queue.claim(10)] == ["globex", None]
+    print("✓ Write queue records the tenant")
+
+if __name__ == "__main__":
+    test_registry()
+    test_tenants_are_isolated()
+    test_queued_writes_keep_their_tenant()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test the OpenAPI-driven tool registry and dispatch
+"""
+
+import asyncio
+import json
+import os
+import httpx
+from commonroom_client import AsyncCommonRoomClient
+from tool_registry import ToolInputError, ToolRegistry, operation_key, tool_name
+import server
+
+def test_generated_tools():
+    """Spec operations without a hand-written tool get one; covered operations do not"""
+    tools = server.registry.tools
+    for name in ("commonroom_get_tag", "commonroom_delete_user", "commonroom_get_api_token_status"):
+        assert name in tools, f"{name} was not generated"
+    assert "commonroom_list_tags" not in tools  # covered by commonroom_get_tags
+    assert "commonroom_get_segment_statuses" in tools
+    assert server.registry.operations["POST /segments/{id}"] == "commonroom_add_contacts_to_segment"
+    assert server.registry.operations["POST /tags/{id}"] == "commonroom_update_tag"
+    assert tools["commonroom_update_tag"].inputSchema["required"] == ["tag_id"]
+
+    # Without hand-written tools every operation is generated, request bodies included
+    generated = ToolRegistry()
+    generated.load_spec()
+    update = generated.tools["commonroom_update_tag"].inputSchema
+    assert update["required"] == ["id", "body"]
+    assert "$ref" not in json.dumps(update)
+    assert operation_key("get", "/segments/:id/status") == "GET /segments/{id}/status"
+    assert tool_name("delete", "/user/{email}", {}) == "commonroom_delete_user"
+    print(f"✓ {len(tools)} tools, {len(tools) - len(server.registry._curated)} generated from openapi.json")
+
+def test_listing_is_cached():
+    """tools/list is built once and rebuilt only when the registry changes"""
+    registry = ToolRegistry()
+
+    @registry.tool("example_tool", "Example", properties={"x": {"type": "string"}}, required=["x"])
+    async def example(client, arguments):
+        return arguments["x"]
+
+    first = asyncio.run(server.handle_list_tools())
+    assert asyncio.run(server.handle_list_tools()) is first
+    assert registry.list_tools() is registry.list_tools()
+    assert registry.load_spec("/nonexistent/openapi.json") == 0
+    assert [tool.name for tool in registry.list_tools().tools] == ["example_tool"]
+    print("✓ tools/list response cached")
+
+def test_generated_handler_dispatch():
+    """Generated tools map arguments onto the path, query and JSON body"""
+    sent = []
+
+    def api(request: httpx.Request) -> httpx.Response:
+        sent.append((request.method, request.url.raw_path.decode(),
+                     json.loads(request.content) if request.content else None))
+        return httpx.Response(200, json={"id": 7, "name": "renamed"})
+
+    async def run():
+        os.environ['COMMONROOM_KEY'] = 'tool_registry_test_key'
+        client = AsyncCommonRoomClient(transport=httpx.MockTransport(api))
+        generated = ToolRegistry()
+        generated.load_spec()
+        update = generated.get_handler("commonroom_update_tag")
+        result = await update(client, {"id": "7", "body": {"name": "renamed"}})
+        await server.registry.get_handler("commonroom_delete_user")(client, {"email": "a b@example.com"})
+        await client.aclose()
+        return result
+
+    result = asyncio.run(run())
+    assert result == {"id": 7, "name": "renamed"}
+    assert sent[0] == ("POST", "/community/v1/tags/7", {"name": "renamed"})
+    assert sent[1] == ("DELETE", "/community/v1/user/a%20b%40example.com", None)
+    print("✓ Generated handlers call the API")
+
+def test_invalid_input_rejected_before_io():
+    """Bad arguments and payloads fail locally with the path of the problem"""
+    sent = []
+
+    def api(request: httpx.Request) -> httpx.Response:
+        sent.append((request.method, request.url.path))
+        if request.url.path.endswith("/activityTypes"):
+            return httpx.Response(200, json=[{"id": "webinar", "displayName": "Webinar"}])
+        return httpx.Response(202)
+
+    def error(call) -> str:
+        try:
+            call()
+        except ToolInputError as e:
+            return str(e)
+        raise AssertionError("input was accepted")
+
+    assert error(lambda: server.registry.validate_arguments(
+        "commonroom_add_activity", {"activity": {"activityType": "webinar"}})) == "activity: 'user' is a required property"
+    assert error(lambda: server.registry.validate_arguments(
+        "commonroom_get_users", {"emails": []})).startswith("emails: [] should be non-empty")
+
+    async def run():
+        os.environ['COMMONROOM_KEY'] = 'tool_validation_test_key'
+        client = AsyncCommonRoomClient(transport=httpx.MockTransport(api))
+        add_activity = server.registry.get_handler("commonroom_add_activity")
+        add_user = server.registry.get_handler("commonroom_add_user")
+        bulk = server.registry.get_handler("commonroom_add_activities_bulk")
+        errors = []
+        for handler, arguments in (
+            (add_activity, {"destination_source_id": "1",
+                            "activity": {"activityType": "webnar", "user": {"email": "a@example.com"}}}),
+            (add_user, {"destination_source_id": "1",
+                        "user": {"email": "a@example.com", "github": {"type": "handle"}}}),
+        ):
+            try:
+                await handler(client, arguments)
+            except ToolInputError as e:
+                errors.append(str(e))
+        result = await bulk(client, {"destination_source_id": "1", "activities": [
+            {"activityType": "webinar", "user": {"email": "a@example.com"}},
+            {"activityType": "webinar", "user": {"email": "b@example.com"}, "timestamp": 5},
+        ]})
+        await client.aclose()
+        return errors, result
+
+    errors, result = asyncio.run(run())
+    assert errors[0].startswith("activity.activityType: 'webnar' is not a known activity type")
+    assert errors[1] == "user.github: 'value' is a required property"
+    assert (result["created"], result["failed"]) == (1, 1)
+    assert result["results"][1]["reason"] == "invalid activity: timestamp: 5 is not of type 'string'"
+    assert [method for method, _ in sent].count("POST") == 1, sent
+    print("✓ Invalid input rejected before any write")
+
+def test_unknown_tool():
+    content = asyncio.run(server.handle_call_tool("commonroom_nope", {}))
+    assert content[0].text == "Unknown tool: commonroom_nope"
+    print("✓ Unknown tool rejected")
+
+if __name__ == "__main__":
+    test_generated_tools()
+    test_listing_is_cached()
+    test_generated_handler_dispatch()
+    test_invalid_input_rejected_before_io()
+    test_unknown_tool()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test the OpenAPI spec update checker
+"""
+
+import asyncio
+import copy
+import json
+import os
+import tempfile
+import httpx
+from tool_registry import ToolRegistry
+from version_checker import VersionChecker, canonical_hash, check_once, diff_specs, extract_spec
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "openapi.json")) as f:
+    SPEC = json.load(f)
+
+def docs_page(spec: dict) -> str:
+    state = json.dumps({"spec": {"data": spec}, "options": {}})
+    return f"<html><script>const __redoc_state = {state};</script></html>"
+
+def docs_api(spec: dict, etag: str, requests: list):
+    """Docs page that honours If-None-Match"""
+    def api(request: httpx.Request) -> httpx.Response:
+        requests.append(dict(request.headers))
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        return httpx.Response(200, text=docs_page(spec), headers={"ETag": etag})
+    return api
+
+def test_canonical_hash_and_diff():
+    """Formatting and key order do not count as a change; operations do"""
+    reordered = json.loads(json.dumps(SPEC, indent=4, sort_keys=True))
+    assert canonical_hash(reordered) == canonical_hash(SPEC)
+    assert extract_spec(docs_page(SPEC) + "<script>x = {};</script>") == SPEC
+
+    newer = copy.deepcopy(SPEC)
+    newer["paths"]["/widgets"] = {"get": {"operationId": "listWidgets", "summary": "List widgets"}}
+    newer["paths"]["/tags"]["get"]["summary"] = "List all tags"
+    del newer["paths"]["/api-token-status"]
+    diff = diff_specs(SPEC, newer)
+    assert diff["added"] == ["GET /widgets"]
+    assert diff["removed"] == ["GET /api-token-status"]
+    assert diff["changed"] == ["GET /tags"]
+    print("✓ Canonical hashing and structural diff")
+
+def test_conditional_requests():
+    """The page is downloaded once; later checks send the ETag and get a 304"""
+    requests = []
+    with tempfile.TemporaryDirectory() as tmp:
+        spec_path = os.path.join(tmp, "openapi.json")
+        with open(spec_path, "w") as f:
+            json.dump(SPEC, f)  # different formatting than the page, same content
+        checker = VersionChecker(spec_path, os.path.join(tmp, "check.json"),
+                                 transport=httpx.MockTransport(docs_api(SPEC, '"v1"', requests)))
+        first = asyncio.run(checker.check_for_updates())
+        second = asyncio.run(checker.check_for_updates())
+    assert first["status"] == second["status"] == "up_to_date"
+    assert "if-none-match" not in requests[0] and requests[1]["if-none-match"] == '"v1"'
+    assert checker.not_modified == 1
+    print("✓ Up to date, second check answered with 304")
+
+def test_hot_reload():
+    """An automatic update rewrites the spec and new operations become tools"""
+    newer = copy.deepcopy(SPEC)
+    newer["paths"]["/widgets"] = {"get": {"operationId": "listWidgets", "summary": "List widgets"}}
+    with tempfile.TemporaryDirectory() as tmp:
+        spec_path = os.path.join(tmp, "openapi.json")
+        with open(spec_path, "w") as f:
+            json.dump(SPEC, f)
+        registry = ToolRegistry()
+        registry.load_spec(spec_path)
+        listing = registry.list_tools()
+        assert "commonroom_list_widgets" not in registry.tools
+
+        checker = VersionChecker(spec_path, os.path.join(tmp, "check.json"),
+                                 transport=httpx.MockTransport(docs_api(newer, '"v2"', [])))
+        result = asyncio.run(check_once(checker, registry.load_spec, auto_update=True))
+        backups = [name for name in os.listdir(tmp) if name.startswith("openapi.json.backup.")]
+        assert result["status"] == "updated" and result["diff"]["added"] == ["GET /widgets"]
+        assert "commonroom_list_widgets" in registry.tools
+        assert registry.list_tools() is not listing
+        assert len(backups) == 1
+        assert asyncio.run(checker.check_for_updates())["status"] == "up_to_date"
+    print("✓ Spec updated and registry reloaded without restart")
+
+if __name__ == "__main__":
+    test_canonical_hash_and_diff()
+    test_conditional_requests()
+    test_hot_reload()
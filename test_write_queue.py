@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test the durable write-behind queue
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import httpx
+from commonroom_client import AsyncCommonRoomClient, RetryPolicy
+from write_queue import WriteBehindWorker, WriteQueue
+
+def test_queue_survives_restart():
+    """Writes claimed but not acknowledged before a crash are pending again"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "queue.db")
+        queue = WriteQueue(path)
+        receipt = queue.enqueue("user", "123", {"id": "user_1", "email": "a@example.com"})
+        assert [item["receipt"] for item in queue.claim(10)] == [receipt]
+        assert queue.claim(10) == []
+
+        reopened = WriteQueue(path)
+        status = reopened.status([receipt])
+        assert status["counts"]["pending"] == 1
+        assert status["receipts"][0]["status"] == "pending"
+    print("✓ In-flight writes resume after restart")
+
+def test_worker_drains_and_records_failures():
+    """The worker posts queued payloads unchanged and records permanent failures"""
+    posted = []
+
+    def api(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        posted.append(payload)
+        if payload["id"] == "user_bad":
+            return httpx.Response(400, json={"reason": "invalid-request-body"})
+        return httpx.Response(202)
+
+    async def run(path):
+        os.environ['COMMONROOM_KEY'] = 'write_queue_test_key'
+        client = AsyncCommonRoomClient(transport=httpx.MockTransport(api))
+        client.retry_policy = RetryPolicy(max_attempts=1)
+        queue = WriteQueue(path)
+        good = queue.enqueue("user", "123", {"id": "user_good", "email": "good@example.com"})
+        bad = queue.enqueue("user", "123", {"id": "user_bad"})
+        worker = WriteBehindWorker(queue, client_factory=lambda tenant: client)
+        await worker.drain_once()
+        await client.aclose()
+        return queue.status([good, bad])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        status = asyncio.run(run(os.path.join(tmp, "queue.db")))
+    assert [p["id"] for p in posted] == ["user_good", "user_bad"]
+    assert status["depth"] == 0
+    assert status["counts"]["sent"] == 1 and status["counts"]["failed"] == 1
+    assert status["recent_failures"][0]["error"].startswith("400")
+    print(f"✓ Queue status: {status['counts']}")
+
+if __name__ == "__main__":
+    test_queue_survives_restart()
+    test_worker_drains_and_records_failures()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Tool registry for the Common Room MCP server
+Hand-written tools plus tools generated from openapi.json, indexed once for O(1) dispatch
+"""
+
+import json
+import os
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+from mcp.types import ListToolsResult, Tool
+from logs import get_logger
+from output import OUTPUT_PROPERTIES, RECORD_PROPERTIES
+
+log = get_logger("tool_registry")
+
+DEFAULT_SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'openapi.json')
+
+HTTP_METHODS = ('get', 'post', 'put', 'patch', 'delete')
+
+# OpenAPI keywords that only document a schema; dropped from generated input schemas
+DOC_ONLY_KEYWORDS = ('example', 'examples', 'xml', 'externalDocs', 'discriminator')
+
+JSON_TYPES = ('string', 'number', 'integer', 'boolean', 'array', 'object', 'null')
+
+Handler = Callable[[Any, Dict], Awaitable[Any]]
+
+# Accepted by every tool; picks whose client (credentials, pool, caches, rate limit) serves the call
+TENANT_PROPERTIES = {
+    "tenant": {
+        "type": "string",
+        "description": "Tenant (community) to act on, from COMMONROOM_TENANTS_FILE; the default tenant when omitted"
+    }
+}
+
+class ToolInputError(ValueError):
+    """Tool arguments rejected locally, before any API call"""
+
+def compile_schema(schema: Dict) -> Any:
+    """Check a schema once and build the validator reused for every call"""
+    from jsonschema import Draft202012Validator
+    from jsonschema.validators import validator_for
+    cls = validator_for(schema, default=Draft202012Validator)
+    cls.check_schema(schema)
+    return cls(schema)
+
+def check(validator: Any, instance: Any, root: str = ''):
+    """Raise ToolInputError naming the path of the most relevant schema violation"""
+    from jsonschema.exceptions import best_match
+    error = best_match(validator.iter_errors(instance))
+    if error is None:
+        return
+    path = root
+    for part in error.absolute_path:
+        if isinstance(part, int):
+            path += f"[{part}]"
+        else:
+            path += f".{part}" if path else str(part)
+    raise ToolInputError(f"{path}: {error.message}" if path else error.message)
+
+def operation_key(method: str, path: str) -> str:
+    """Canonical "METHOD /path/{param}" key (the spec also writes parameters as :param)"""
+    path = re.sub(r':(\w+)', r'{\1}', path)
+    return f"{method.upper()} {path}"
+
+def tool_name(method: str, path: str, operation: Dict) -> str:
+    """commonroom_<operationId in snake case>, or method and path words when there is none"""
+    operation_id = operation.get('operationId')
+    if operation_id:
+        words = re.sub(r'(?<=[a-z0-9])(?=[A-Z])', '_', operation_id)
+    else:
+        words = ' '.join([method] + [part for part in re.split(r'[/{}:]', path)
+                                     if part and f"{{{part}}}" not in path and f":{part}" not in path])
+    return 'commonroom_' + re.sub(r'[^a-z0-9]+', '_', words.lower()).strip('_')
+
+def request_body_schema(operation: Dict) -> Optional[Dict]:
+    """Schema of an operation's JSON request body, if it has one"""
+    content = (operation.get('requestBody') or {}).get('content') or {}
+    return (content.get('application/json') or {}).get('schema')
+
+def result_kind(operation: Dict, spec: Dict) -> str:
+    """How output.shape treats a GET result: a list, the key of an enveloped list, or a record"""
+    response = resolve_refs((operation.get('responses') or {}).get('200') or {}, spec)
+    content = (response.get('content') or {}).get('application/json') or {}
+    schema = content.get('schema') or {}
+    if schema.get('type') == 'array':
+        return 'list'
+    lists = [name for name, prop in (schema.get('properties') or {}).items() if prop.get('type') == 'array']
+    return lists[0] if len(lists) == 1 else 'record'
+
+def resolve_refs(schema: Any, spec: Dict, seen: Tuple[str, ...] = ()) -> Any:
+    """Inline #/components $refs so a tool schema stands on its own"""
+    if isinstance(schema, list):
+        return [resolve_refs(item, spec, seen) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    ref = schema.get('$ref')
+    if isinstance(ref, str) and ref.startswith('#/'):
+        if ref in seen:
+            return {'type': 'object'}  # recursive schema: stop expanding
+        target = spec
+        for part in ref[2:].split('/'):
+            target = target.get(part, {}) if isinstance(target, dict) else {}
+        return resolve_refs(target, spec, seen + (ref,))
+    resolved = {key: resolve_refs(value, spec, seen) for key, value in schema.items()
+                if key not in DOC_ONLY_KEYWORDS}
+    # The spec uses some non-standard types (e.g. "url"), all sent as strings
+    if isinstance(resolved.get('type'), str) and resolved['type'] not in JSON_TYPES:
+        resolved['type'] = 'string'
+    # OpenAPI 3.0 "nullable" is not JSON Schema; spell it as a null type
+    if resolved.pop('nullable', False):
+        if any(key in resolved for key in ('oneOf', 'anyOf', 'allOf', 'enum')):
+            return {'description': resolved.get('description', ''), 'anyOf': [resolved, {'type': 'null'}]}
+        if isinstance(resolved.get('type'), str):
+            resolved['type'] = [resolved['type'], 'null']
+    return resolved
+
+class ToolRegistry:
+    def __init__(self):
+        self.tools: Dict[str, Tool] = {}
+        self.handlers: Dict[str, Handler] = {}
+        # "METHOD /path" -> tool name, for operations already covered by a tool
+        self.operations: Dict[str, str] = {}
+        # "METHOD /path" -> resolved JSON request body schema
+        self.body_schemas: Dict[str, Dict] = {}
+        # Validators compiled on first use (checking a schema is slow, so not at startup)
+        self.validators: Dict[str, Any] = {}
+        self.body_validators: Dict[str, Any] = {}
+        # Tool name -> result kind for fields/limit/offset (see output.shape)
+        self.outputs: Dict[str, str] = {}
+        self._curated: Dict[str, Tuple[Tool, Handler, Tuple[str, ...], Optional[str]]] = {}
+        self._listing: Optional[ListToolsResult] = None
+
+    def tool(self, name: str, description: str, properties: Optional[Dict] = None,
+             required: Optional[List[str]] = None, operations: Tuple[str, ...] = (),
+             output: Optional[str] = None, **schema):
+        """Decorator registering a hand-written tool handler(client, arguments)
+
+        operations lists the "METHOD /path" API operations the tool covers, so
+        no duplicate tool is generated for them from the spec. output ("list",
+        "record" or the key of an enveloped list) adds fields/limit/offset/format.
+        """
+        properties = dict(properties or {})
+        if output is not None:
+            properties.update(RECORD_PROPERTIES if output == "record" else OUTPUT_PROPERTIES)
+        properties.update(TENANT_PROPERTIES)
+        input_schema = {"type": "object", "properties": properties}
+        if required:
+            input_schema["required"] = required
+        input_schema.update(schema)
+        input_schema.setdefault("additionalProperties", False)
+
+        def decorator(handler: Handler) -> Handler:
+            tool = Tool(name=name, description=description, inputSchema=input_schema)
+            keys = tuple(operation_key(*op.split(' ', 1)) for op in operations)
+            self._curated[name] = (tool, handler, keys, output)
+            self._add(tool, handler, keys, output)
+            return handler
+        return decorator
+
+    def _add(self, tool: Tool, handler: Handler, operations: Tuple[str, ...] = (),
+             output: Optional[str] = None):
+        self.tools[tool.name] = tool
+        self.handlers[tool.name] = handler
+        if output is not None:
+            self.outputs[tool.name] = output
+        self.validators.pop(tool.name, None)
+        for key in operations:
+            self.operations[key] = tool.name
+        self._listing = None
+
+    def load_spec(self, path: str = DEFAULT_SPEC_PATH) -> int:
+        """Rebuild the tool table: curated tools plus one tool per uncovered spec operation"""
+        try:
+            with open(path, 'r') as f:
+                spec = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning("could not load %s, serving hand-written tools only: %s", path, e)
+            spec = {}
+        self.tools, self.handlers, self.operations, self.validators = {}, {}, {}, {}
+        self.body_schemas, self.body_validators, self.outputs = {}, {}, {}
+        for tool, handler, keys, output in self._curated.values():
+            self._add(tool, handler, keys, output)
+
+        generated = 0
+        for path_template, item in (spec.get('paths') or {}).items():
+            for method in HTTP_METHODS:
+                operation = item.get(method)
+                if operation is None:
+                    continue
+                body_schema = request_body_schema(operation)
+                if body_schema is not None:
+                    self.body_schemas[operation_key(method, path_template)] = resolve_refs(body_schema, spec)
+                if operation_key(method, path_template) in self.operations:
+                    continue
+                tool, handler, output = self._generate(method, path_template, item, operation, spec)
+                if tool.name in self.tools:
+                    continue
+                self._add(tool, handler, (operation_key(method, path_template),), output)
+                generated += 1
+        return generated
+
+    def _generate(self, method: str, path_template: str, item: Dict, operation: Dict,
+                  spec: Dict) -> Tuple[Tool, Handler, Optional[str]]:
+        """Tool definition and handler for one OpenAPI operation"""
+        path_template = operation_key(method, path_template).split(' ', 1)[1]
+        properties: Dict[str, Any] = {}
+        required: List[str] = []
+        path_params: List[str] = re.findall(r'{(\w+)}', path_template)
+        query_params: List[str] = []
+
+        for param in item.get('parameters', []) + operation.get('parameters', []):
+            param = resolve_refs(param, spec)
+            name, location = param.get('name'), param.get('in')
+            if location not in ('path', 'query') or not name:
+                continue
+            prop = dict(param.get('schema') or {'type': 'string'})
+            if param.get('description'):
+                prop['description'] = param['description']
+            properties[name] = prop
+            if location == 'query':
+                query_params.append(name)
+            if location == 'path' or param.get('required'):
+                required.append(name)
+        for name in path_params:
+            properties.setdefault(name, {'type': 'string'})
+            if name not in required:
+                required.append(name)
+
+        body_schema = request_body_schema(operation)
+        if body_schema is not None:
+            properties['body'] = resolve_refs(body_schema, spec)
+            properties['body'].setdefault('description', 'JSON request body')
+            if (operation.get('requestBody') or {}).get('required'):
+                required.append('body')
+
+        # Reads take the output options; lists also page
+        output = None
+        if method == 'get':
+            output = result_kind(operation, spec)
+            for name, prop in (RECORD_PROPERTIES if output == 'record' else OUTPUT_PROPERTIES).items():
+                properties.setdefault(name, prop)
+        for name, prop in TENANT_PROPERTIES.items():
+            properties.setdefault(name, prop)
+
+        summary = operation.get('summary') or operation_key(method, path_template)
+        description = f"{summary} ({method.upper()} {path_template}, generated from openapi.json)"
+        if operation.get('deprecated'):
+            description = f"[Deprecated] {description}"
+        input_schema = {"type": "object", "properties": properties, "additionalProperties": False}
+        if required:
+            input_schema["required"] = list(dict.fromkeys(required))
+        tool = Tool(name=tool_name(method, path_template, operation), description=description,
+                    inputSchema=input_schema)
+
+        async def handler(client, arguments: Dict) -> Any:
+            path = path_template.format(**{name: quote(str(arguments[name]), safe='')
+                                           for name in path_params})
+            params = {name: arguments[name] for name in query_params if name in arguments}
+            return await client.call_api(method.upper(), path, params=params or None,
+                                         body=arguments.get('body'))
+        return tool, handler, output
+
+    def list_tools(self) -> ListToolsResult:
+        """tools/list response, built once per registry change"""
+        if self._listing is None:
+            self._listing = ListToolsResult(tools=list(self.tools.values()))
+        return self._listing
+
+    def get_handler(self, name: str) -> Optional[Handler]:
+        return self.handlers.get(name)
+
+    def validate_arguments(self, name: str, arguments: Dict):
+        """Check tool arguments against the tool's input schema"""
+        validator = self.validators.get(name)
+        if validator is None:
+            if name not in self.tools:
+                return
+            validator = self.validators[name] = compile_schema(self.tools[name].inputSchema)
+        check(validator, arguments)
+
+    def validate_body(self, operation: str, body: Any, root: str = ''):
+        """Check a request body against the openapi.json schema of an operation ("POST /tags")"""
+        key = operation_key(*operation.split(' ', 1))
+        validator = self.body_validators.get(key)
+        if validator is None:
+            if key not in self.body_schemas:
+                return
+            from jsonschema.exceptions import SchemaError
+            try:
+                validator = compile_schema(self.body_schemas[key])
+            except SchemaError as e:
+                log.warning("not validating %s bodies: %s", key, e.message)
+                validator = False
+            self.body_validators[key] = validator
+        if validator:
+            check(validator, body, root)
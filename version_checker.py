@@ -1,88 +1,200 @@
 #!/usr/bin/env python3
 """
 Common Room API Version Checker
-Checks for updates to the OpenAPI spec after server startup
+Checks for updates to the OpenAPI spec in the background, using conditional requests
 """
 
 import asyncio
-import json
-import re
-import requests
 import hashlib
+import json
+import os
+import shutil
+import time
 from datetime import datetime
-from typing import Optional
+from typing import Any, Callable, Dict, Optional
+
+from config import env_bool, env_float
+from logs import get_logger
+
+log = get_logger("spec")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DOCS_URL = "https://api.commonroom.io/docs/community.html"
+HTTP_METHODS = ('get', 'post', 'put', 'patch', 'delete')
+STATE_MARKER = '__redoc_state = '
+
+def canonical_hash(spec: Any) -> str:
+    """SHA-256 of canonical JSON, so formatting and key order never count as a change"""
+    canonical = json.dumps(spec, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def extract_spec(html: str) -> Optional[Dict]:
+    """OpenAPI spec embedded in the Redoc page as __redoc_state"""
+    start = html.find(STATE_MARKER)
+    if start < 0:
+        return None
+    try:
+        state, _ = json.JSONDecoder().raw_decode(html, start + len(STATE_MARKER))
+    except ValueError:
+        return None
+    return state.get('spec', {}).get('data')
+
+def operations(spec: Dict) -> Dict[str, Any]:
+    """"METHOD /path" -> operation object for every operation in a spec"""
+    found = {}
+    for path, item in (spec.get('paths') or {}).items():
+        for method in HTTP_METHODS:
+            if isinstance(item, dict) and method in item:
+                found[f"{method.upper()} {path}"] = item[method]
+    return found
+
+def diff_specs(old: Optional[Dict], new: Dict) -> Dict[str, Any]:
+    """Operations added, removed or changed between two specs"""
+    before, after = operations(old or {}), operations(new)
+    return {
+        'added': sorted(after.keys() - before.keys()),
+        'removed': sorted(before.keys() - after.keys()),
+        'changed': sorted(key for key in before.keys() & after.keys()
+                          if canonical_hash(before[key]) != canonical_hash(after[key])),
+        'version': {'current': ((old or {}).get('info') or {}).get('version'),
+                    'latest': (new.get('info') or {}).get('version')},
+    }
 
 class VersionChecker:
-    def __init__(self, current_spec_path: str = "openapi.json"):
+    def __init__(self, current_spec_path: str = os.path.join(HERE, "openapi.json"),
+                 cache_path: Optional[str] = None, docs_url: str = DOCS_URL, transport=None):
         self.current_spec_path = current_spec_path
-        self.docs_url = "https://api.commonroom.io/docs/community.html"
-    
-    def get_current_spec_hash(self) -> Optional[str]:
-        """Get hash of current OpenAPI spec"""
+        # ETag / Last-Modified and the last downloaded spec, for conditional requests
+        self.cache_path = cache_path or os.path.join(HERE, ".openapi_check.json")
+        self.docs_url = docs_url
+        self.transport = transport
+        self.not_modified = 0
+
+    def get_current_spec(self) -> Optional[Dict]:
         try:
             with open(self.current_spec_path, 'r') as f:
-                content = f.read()
-                return hashlib.md5(content.encode()).hexdigest()
-        except FileNotFoundError:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
             return None
-    
-    def fetch_latest_spec(self) -> Optional[dict]:
-        """Extract latest OpenAPI spec from Common Room docs"""
+
+    def get_current_spec_hash(self) -> Optional[str]:
+        """Canonical hash of the current OpenAPI spec"""
+        spec = self.get_current_spec()
+        return canonical_hash(spec) if spec is not None else None
+
+    def _load_cache(self) -> Dict:
         try:
-            response = requests.get(self.docs_url, timeout=10)
+            with open(self.cache_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_cache(self, cache: Dict):
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, self.cache_path)
+
+    async def fetch_latest_spec(self) -> Optional[Dict]:
+        """Latest spec; a 304 reuses the cached copy instead of downloading the page again"""
+        import httpx
+        cache = await asyncio.to_thread(self._load_cache)
+        headers = {}
+        if cache.get('spec') is not None:
+            if cache.get('etag'):
+                headers['If-None-Match'] = cache['etag']
+            if cache.get('last_modified'):
+                headers['If-Modified-Since'] = cache['last_modified']
+        try:
+            async with httpx.AsyncClient(timeout=10, transport=self.transport) as http:
+                response = await http.get(self.docs_url, headers=headers)
+            if response.status_code == 304:
+                self.not_modified += 1
+                return cache['spec']
             response.raise_for_status()
-            
-            # Extract __redoc_state from HTML
-            match = re.search(r'__redoc_state = ({.*?});', response.text, re.DOTALL)
-            if not match:
-                return None
-            
-            state = json.loads(match.group(1))
-            return state.get('spec', {}).get('data')
-        
-        except Exception:
+        except httpx.HTTPError:
             return None
-    
-    def check_for_updates(self) -> dict:
-        """Check if there's a newer version available"""
-        current_hash = self.get_current_spec_hash()
-        latest_spec = self.fetch_latest_spec()
-        
+        # Parsing a large page is CPU work; keep it off the event loop
+        spec = await asyncio.to_thread(extract_spec, response.text)
+        if spec is not None:
+            await asyncio.to_thread(self._save_cache, {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'checked_at': time.time(),
+                'spec': spec,
+            })
+        return spec
+
+    async def check_for_updates(self) -> Dict[str, Any]:
+        """Compare the latest spec with the current file"""
+        latest_spec = await self.fetch_latest_spec()
         if not latest_spec:
             return {"status": "error", "message": "Could not fetch latest spec"}
-        
-        latest_hash = hashlib.md5(json.dumps(latest_spec, sort_keys=True).encode()).hexdigest()
-        
-        if current_hash != latest_hash:
-            return {
-                "status": "update_available",
-                "message": "New Common Room API spec available",
-                "current_hash": current_hash,
-                "latest_hash": latest_hash,
-                "update_command": "curl -s 'https://api.commonroom.io/docs/community.html' | grep -o '__redoc_state = {.*};' | sed 's/__redoc_state = //' | sed 's/;$//' | jq '.spec.data' > openapi.json"
-            }
-        
-        return {"status": "up_to_date", "message": "OpenAPI spec is current"}
-
-async def background_version_check():
-    """Background task to check for updates periodically"""
-    await asyncio.sleep(30)  # Wait 30s after server start
-    
-    checker = VersionChecker()
-    result = checker.check_for_updates()
-    
+
+        current_spec = await asyncio.to_thread(self.get_current_spec)
+        current_hash = canonical_hash(current_spec) if current_spec is not None else None
+        latest_hash = canonical_hash(latest_spec)
+        if current_hash == latest_hash:
+            return {"status": "up_to_date", "message": "OpenAPI spec is current", "hash": current_hash}
+        return {
+            "status": "update_available",
+            "message": "New Common Room API spec available",
+            "current_hash": current_hash,
+            "latest_hash": latest_hash,
+            "diff": diff_specs(current_spec, latest_spec),
+            "update_command": "./update_spec.sh",
+            "spec": latest_spec,
+        }
+
+    def apply_update(self, spec: Dict):
+        """Replace the current spec file, keeping a timestamped backup like update_spec.sh"""
+        if os.path.exists(self.current_spec_path):
+            shutil.copy2(self.current_spec_path,
+                         f"{self.current_spec_path}.backup.{datetime.now():%Y%m%d_%H%M%S}")
+        tmp_path = f"{self.current_spec_path}.new"
+        with open(tmp_path, 'w') as f:
+            json.dump(spec, f, indent=2)
+        os.replace(tmp_path, self.current_spec_path)
+
+async def check_once(checker: VersionChecker, reload: Optional[Callable[[str], Any]] = None,
+                     auto_update: bool = False) -> Dict[str, Any]:
+    """One check; applies the update and reloads the tool registry when auto_update is on"""
+    result = await checker.check_for_updates()
     if result["status"] == "update_available":
-        print(f"🔄 UPDATE AVAILABLE: {result['message']}")
-        print(f"   Current: {result['current_hash'][:8]}...")
-        print(f"   Latest:  {result['latest_hash'][:8]}...")
-        print(f"   Update:  {result['update_command']}")
-    elif result["status"] == "up_to_date":
-        print(f"✅ OpenAPI spec is up to date")
-    else:
-        print(f"⚠️  Could not check for updates: {result['message']}")
+        diff = result["diff"]
+        fields = {"message": result["message"], **{key: diff[key] for key in ('added', 'removed', 'changed')}}
+        if auto_update and reload is not None:
+            await asyncio.to_thread(checker.apply_update, result["spec"])
+            reload(checker.current_spec_path)
+            result["status"] = "updated"
+            log.warning("openapi spec updated and tools reloaded", extra={"fields": fields})
+        else:
+            fields["update_command"] = result["update_command"]
+            log.warning("openapi spec update available", extra={"fields": fields})
+    elif result["status"] == "error":
+        log.warning("could not check for spec updates", extra={"fields": {"error": result["message"]}})
+    return result
+
+async def background_version_check(reload: Optional[Callable[[str], Any]] = None):
+    """Background task to check for updates periodically
+
+    reload(spec_path) is called after an automatic update (COMMONROOM_SPEC_AUTO_UPDATE)
+    so new operations become tools without a restart.
+    """
+    await asyncio.sleep(env_float('COMMONROOM_SPEC_CHECK_DELAY', 30.0))  # Wait after server start
+    checker = VersionChecker()
+    interval = env_float('COMMONROOM_SPEC_CHECK_INTERVAL', 86400.0)
+    while True:
+        try:
+            await check_once(checker, reload, env_bool('COMMONROOM_SPEC_AUTO_UPDATE', False))
+        except Exception as e:
+            log.warning("could not check for spec updates", extra={"fields": {"error": str(e)}})
+        if interval <= 0:
+            return
+        await asyncio.sleep(interval)
 
 if __name__ == "__main__":
     # Test the checker
-    checker = VersionChecker()
-    result = checker.check_for_updates()
+    result = asyncio.run(VersionChecker().check_for_updates())
+    result.pop("spec", None)
     print(json.dumps(result, indent=2))
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Durable write-behind queue for activity and user writes
+Prepared payloads are stored on disk and drained by a background asyncio worker
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from config import env_float, env_int, getenv
+from logs import get_logger, request_id
+
+log = get_logger("write_queue")
+
+DEFAULT_QUEUE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.commonroom_queue.db')
+
+class WriteQueue:
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, max_attempts: int = 5):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS writes (
+                receipt TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                destination TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                next_attempt_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS writes_pending ON writes (status, next_attempt_at)")
+        # Queues created before tenants existed: NULL means the default tenant
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(writes)")}
+        if 'tenant' not in columns:
+            self._db.execute("ALTER TABLE writes ADD COLUMN tenant TEXT")
+        # Writes in flight when the process died are sent again (IDs make that idempotent)
+        self._db.execute("UPDATE writes SET status = 'pending' WHERE status = 'sending'")
+
+    def enqueue(self, kind: str, destination: str, payload: Dict, tenant: Optional[str] = None) -> str:
+        """Persist a prepared write and return its receipt"""
+        receipt = f"wq_{uuid.uuid4().hex[:16]}"
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO writes (receipt, kind, destination, payload, tenant, status, next_attempt_at, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, 'pending', ?, ?, ?)",
+                (receipt, kind, str(destination), json.dumps(payload), tenant, now, now, now),
+            )
+        return receipt
+
+    def claim(self, limit: int) -> List[Dict[str, Any]]:
+        """Mark up to limit due writes as sending and return them"""
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT receipt, kind, destination, payload, attempts, tenant FROM writes "
+                "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY created_at LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            self._db.executemany(
+                "UPDATE writes SET status = 'sending', updated_at = ? WHERE receipt = ?",
+                [(now, row[0]) for row in rows],
+            )
+        return [{'receipt': r[0], 'kind': r[1], 'destination': r[2], 'payload': json.loads(r[3]),
+                 'attempts': r[4], 'tenant': r[5]} for r in rows]
+
+    def mark_sent(self, receipt: str):
+        with self._lock:
+            self._db.execute(
+                "UPDATE writes SET status = 'sent', attempts = attempts + 1, last_error = NULL, "
+                "updated_at = ? WHERE receipt = ?", (time.time(), receipt))
+
+    def mark_failed(self, receipt: str, attempts: int, error: str, retryable: bool):
+        """Schedule a retry with backoff, or give up once attempts are exhausted"""
+        now = time.time()
+        attempts += 1
+        status = 'pending' if retryable and attempts < self.max_attempts else 'failed'
+        with self._lock:
+            self._db.execute(
+                "UPDATE writes SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ?, "
+                "updated_at = ? WHERE receipt = ?",
+                (status, attempts, error, now + min(300.0, 2.0 ** attempts), now, receipt))
+
+    def next_due_in(self) -> Optional[float]:
+        """Seconds until the next pending write is due, or None if nothing is pending"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MIN(next_attempt_at) FROM writes WHERE status = 'pending'").fetchone()
+        return None if row[0] is None else max(row[0] - time.time(), 0.0)
+
+    def status(self, receipts: Optional[List[str]] = None, failures: int = 10) -> Dict[str, Any]:
+        """Queue depth by status, recent failures and the state of given receipts"""
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM writes GROUP BY status").fetchall())
+            failed = self._db.execute(
+                "SELECT receipt, kind, attempts, last_error, updated_at FROM writes "
+                "WHERE status = 'failed' ORDER BY updated_at DESC LIMIT ?", (failures,)).fetchall()
+            tracked = []
+            if receipts:
+                marks = ','.join('?' * len(receipts))
+                tracked = self._db.execute(
+                    f"SELECT receipt, kind, status, attempts, last_error FROM writes WHERE receipt IN ({marks})",
+                    receipts).fetchall()
+        return {
+            'path': self.path,
+            'depth': counts.get('pending', 0) + counts.get('sending', 0),
+            'counts': {s: counts.get(s, 0) for s in ('pending', 'sending', 'sent', 'failed')},
+            'recent_failures': [
+                {'receipt': r[0], 'kind': r[1], 'attempts': r[2], 'error': r[3], 'failed_at': r[4]}
+                for r in failed
+            ],
+            'receipts': [
+                {'receipt': r[0], 'kind': r[1], 'status': r[2], 'attempts': r[3], 'error': r[4]}
+                for r in tracked
+            ],
+        }
+
+class WriteBehindWorker:
+    """Background task that drains the queue in concurrent batches"""
+
+    def __init__(self, queue: WriteQueue, batch_size: int = 8, idle_interval: float = 5.0,
+                 client_factory: Optional[Callable] = None):
+        self.queue = queue
+        # client_factory(tenant); defaults to the shared async clients, imported on the first send
+        self.client_factory = client_factory
+        self.batch_size = batch_size
+        self.idle_interval = idle_interval
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    def notify(self):
+        """Wake the worker after an enqueue"""
+        self._wakeup.set()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _send(self, item: Dict[str, Any]):
+        from commonroom_client import describe_error, get_async_client, is_retryable_error
+        # Runs in its own task; log records and API calls carry the receipt
+        request_id.set(f"write-{item['receipt']}")
+        try:
+            # Sent with the credentials of the tenant that queued it
+            client = (self.client_factory or get_async_client)(item.get('tenant'))
+            if item['kind'] == 'activity':
+                await client.add_activity(item['destination'], item['payload'])
+            else:
+                await client.add_user(item['destination'], item['payload'])
+        except Exception as e:
+            log.warning("queued write failed", extra={"fields": {
+                "receipt": item['receipt'], "kind": item['kind'], "attempt": item['attempts'],
+                "error": type(e).__name__}})
+            self.queue.mark_failed(item['receipt'], item['attempts'], describe_error(e), is_retryable_error(e))
+        else:
+            self.queue.mark_sent(item['receipt'])
+
+    async def drain_once(self) -> int:
+        """Send one batch of due writes; returns how many were attempted"""
+        batch = self.queue.claim(self.batch_size)
+        # The client's concurrency limit and rate limiter pace these
+        await asyncio.gather(*(self._send(item) for item in batch))
+        return len(batch)
+
+    async def _run(self):
+        while True:
+            try:
+                if await self.drain_once():
+                    continue
+            except Exception:
+                log.error("write queue drain failed", exc_info=True)
+            due_in = self.queue.next_due_in()
+            timeout = self.idle_interval if due_in is None else min(due_in, self.idle_interval)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+_queue: Optional[WriteQueue] = None
+_worker: Optional[WriteBehindWorker] = None
+
+def queue_path() -> str:
+    """Database file of the process-wide queue"""
+    return getenv('COMMONROOM_WRITE_QUEUE', DEFAULT_QUEUE_PATH)
+
+def get_write_queue() -> WriteQueue:
+    """Process-wide queue at COMMONROOM_WRITE_QUEUE"""
+    global _queue
+    if _queue is None:
+        _queue = WriteQueue(queue_path(),
+                            max_attempts=env_int('COMMONROOM_WRITE_QUEUE_MAX_ATTEMPTS', 5))
+    return _queue
+
+def ensure_worker() -> WriteBehindWorker:
+    """Start the background worker on the running event loop if it is not running"""
+    global _worker
+    if _worker is None:
+        _worker = WriteBehindWorker(get_write_queue(),
+                                    batch_size=env_int('COMMONROOM_WRITE_QUEUE_BATCH', 8),
+                                    idle_interval=env_float('COMMONROOM_WRITE_QUEUE_POLL', 5.0))
+    _worker.start()
+    return _worker
+
+async def stop_worker():
+    """Stop the background worker; writes it was sending are resent after the next start"""
+    global _worker
+    worker, _worker = _worker, None
+    if worker is not None:
+        await worker.stop()
+
+def enqueue_write(kind: str, destination: str, payload: Dict, tenant: Optional[str] = None) -> str:
+    """Queue a prepared write and wake the worker"""
+    receipt = get_write_queue().enqueue(kind, destination, payload, tenant)
+    ensure_worker().notify()
+    return receipt